@@ -1,6 +1,7 @@
 import os
 
 from camstack.core.utilities import DependentProcess, RemoteDependentProcess
+from camstack.core.probes import SHMFileProbe, TCPListenProbe
 from camstack.cams.cred1 import Apapane, CRED1
 from camstack.cams.cred2 import ApapaneButItsGLINT, CRED2
 
@@ -67,7 +68,33 @@ def main():
     Klass: type = type_lookup[cam_flag]
     mode = 3
 
+    if cam_flag == 'A':
+        utr_cmdline = (
+                'milk-exec "mload milkimageformat;'
+                'readshmim apapane_raw; imgformat.cred_cds_utr ..procinfo 1; '
+                'imgformat.cred_cds_utr ..triggermode 3; '
+                'imgformat.cred_cds_utr ..loopcntMax -1; '
+                'imgformat.cred_cds_utr apapane_raw apapane 37000"')
+    elif cam_flag == 'G':
+        utr_cmdline = (
+                'milk-exec "mload milkimageformat;'
+                'readshmim apapane_raw; imgformat.cred_cds_utr ..procinfo 1; '
+                'imgformat.cred_cds_utr ..triggermode 3; '
+                'imgformat.cred_cds_utr ..loopcntMax -1; '
+                'imgformat.cred_cds_utr apapane_raw apapane 37000"')
+
     # Prepare dependent processes
+    # Started / stopped in parallel along depends_on - see DependentMultiManager
+    utr_red = DependentProcess(
+            tmux_name='apapane_utr',
+            cli_cmd=utr_cmdline,
+            cli_args=(),
+            kill_upon_create=True,
+            cset='a_utr',
+            rtprio=45,
+            ready_probes=[SHMFileProbe('apapane')],
+    )
+
     tcp_recv = RemoteDependentProcess(
             tmux_name=f'streamTCPreceive_{scxconf.TCPPORT_APAPANE}',
             # Urrrrrh this is getting messy
@@ -77,13 +104,15 @@ def main():
             cli_args=('apapane', MAGIC_HW_STR.HEIGHT, MAGIC_HW_STR.WIDTH),
             remote_host=scxconf.IP_SC6,
             kill_upon_create=False,
+            ready_probes=[
+                    TCPListenProbe(scxconf.TCPPORT_APAPANE,
+                                   host=scxconf.IP_SC6)
+            ],
     )
-    tcp_recv.start_order = 1
-    tcp_recv.kill_order = 1
 
     tcp_send = DependentProcess(
             tmux_name='apapane_tcp',
-            cli_cmd='sleep 3; OMP_NUM_THREADS=1 shmimTCPtransmit %s %s %u',
+            cli_cmd='OMP_NUM_THREADS=1 shmimTCPtransmit %s %s %u',
             cli_args=('apapane', scxconf.IPP2P_SC6FROM5,
                       scxconf.TCPPORT_APAPANE),
             # Sender is kill_upon_create - rather than when starting. that ensures it dies well before the receiver
@@ -91,9 +120,8 @@ def main():
             kill_upon_create=True,
             cset='a_tcp',
             rtprio=46,
+            depends_on=[tcp_recv, utr_red],
     )
-    tcp_send.start_order = 2
-    tcp_send.kill_order = 0
 
     # TODO register those 2 to the "Apapane" object and make csets for them ?
     # Prepare dependent processes
@@ -106,13 +134,15 @@ def main():
             cli_args=('apapane_raw', MAGIC_HW_STR.HEIGHT, MAGIC_HW_STR.WIDTH),
             remote_host=scxconf.IP_SC6,
             kill_upon_create=False,
+            ready_probes=[
+                    TCPListenProbe(scxconf.TCPPORT_APAPANE_RAW,
+                                   host=scxconf.IP_SC6)
+            ],
     )
-    tcp_recv.start_order = 3
-    tcp_recv.kill_order = 4
 
     tcp_send_raw = DependentProcess(
             tmux_name='apapane_raw_tcp',
-            cli_cmd='sleep 3; OMP_NUM_THREADS=1 shmimTCPtransmit %s %s %u',
+            cli_cmd='OMP_NUM_THREADS=1 shmimTCPtransmit %s %s %u',
             cli_args=('apapane_raw', scxconf.IP_SC6,
                       scxconf.TCPPORT_APAPANE_RAW),
             # Sender is kill_upon_create - rather than when starting. that ensures it dies well before the receiver
@@ -120,35 +150,8 @@ def main():
             kill_upon_create=True,
             cset='a_tcp',
             rtprio=45,
+            depends_on=[tcp_recv_raw],
     )
-    tcp_send.start_order = 4
-    tcp_send.kill_order = 3
-
-    if cam_flag == 'A':
-        utr_cmdline = (
-                'milk-exec "mload milkimageformat;'
-                'readshmim apapane_raw; imgformat.cred_cds_utr ..procinfo 1; '
-                'imgformat.cred_cds_utr ..triggermode 3; '
-                'imgformat.cred_cds_utr ..loopcntMax -1; '
-                'imgformat.cred_cds_utr apapane_raw apapane 37000"')
-    elif cam_flag == 'G':
-        utr_cmdline = (
-                'milk-exec "mload milkimageformat;'
-                'readshmim apapane_raw; imgformat.cred_cds_utr ..procinfo 1; '
-                'imgformat.cred_cds_utr ..triggermode 3; '
-                'imgformat.cred_cds_utr ..loopcntMax -1; '
-                'imgformat.cred_cds_utr apapane_raw apapane 37000"')
-
-    utr_red = DependentProcess(
-            tmux_name='apapane_utr',
-            cli_cmd=utr_cmdline,
-            cli_args=(),
-            kill_upon_create=True,
-            cset='a_utr',
-            rtprio=45,
-    )
-    utr_red.start_order = 0
-    utr_red.kill_order = 2
 
     # PIPE over ZMQ into the LAN until we find a better solution (receiver)
     zmq_recv = RemoteDependentProcess(
@@ -158,8 +161,6 @@ def main():
             remote_host=f'scexao@{scxconf.IP_SC2}',
             kill_upon_create=False,
     )
-    zmq_recv.start_order = 5
-    zmq_recv.kill_order = 6
 
     # PIPE over ZMQ into the LAN until we find a better solution (sender)
     zmq_send = DependentProcess(
@@ -167,9 +168,8 @@ def main():
             cli_cmd='zmq_send.py %s:%u %s -f 100',
             cli_args=(scxconf.IPLAN_SC5, scxconf.ZMQPORT_APAPANE, 'apapane'),
             kill_upon_create=True,
+            depends_on=[utr_red],
     )
-    zmq_send.start_order = 6
-    zmq_send.kill_order = 5
 
     cam = Klass('apapane', 'apapane_raw', unit=1, channel=0, mode_id=mode,
                 taker_cset_prio=('a_edt', 48), dependent_processes=[
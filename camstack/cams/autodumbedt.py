@@ -15,9 +15,9 @@
 '''
 
 import logging as logg
-import time
 
 from camstack.cams.edtcam import EDTCamera
+from camstack.core import shmwatch
 
 from pyMilk.interfacing.shm import SHM
 
@@ -92,18 +92,9 @@ class AutoDumbEDTCamera(EDTCamera):
 
     def _get_SHM(self) -> SHM:
 
-        while True:
-            # In case the SHM doesn't exist yet
-            try:
-                shm = SHM(self.STREAMNAME, symcode=0)
-                break
-            except:
-                time.sleep(0.1)
-
         # Difference from the superclass: we don't wait forever til a semaphore is posted
         # Otherwise, we get stuck if the edttake is stuck into perpetual timeouts
-        shm.IMAGE.semflush(shm.semID)
-        # Rather than a forever-wait. No biggie cause edt fgrab start is pretty quick.
-        time.sleep(5.0)
-
-        return shm
+        # No biggie cause edt fgrab start is pretty quick.
+        return shmwatch.wait_for_shm(self.STREAMNAME, self.SHM_READY_TIMEOUT,
+                                     frame_timeout=5.0,
+                                     raise_on_no_frame=False)
@@ -2,16 +2,19 @@ from __future__ import annotations
 import typing as typ
 from typing import Optional as t_Op
 
-import os
-import atexit
 import time
-import subprocess
+import atexit
+import contextlib
 import threading
 import logging as logg
 
 from camstack.core import utilities as util
 from camstack.core.thread import HackedExitJoinThread
 from camstack.core import tmux as tmux_util, thread as threadutil
+from camstack.core.scheduler import PollScheduler, Lockable
+from camstack.core.rtsupervisor import RTSupervisor
+from camstack.core import shmwatch
+from camstack.core.param_cache import ParamCache
 
 from camstack.core.wcs import wcs_dummy_dict
 
@@ -50,6 +53,9 @@ class BaseCamera:
 
     REDIS_PUSH_ENABLED: bool = False
     REDIS_PREFIX: t_Op[str] = None
+    # redis_push_values only pushes changed values, except every N-th call which pushes all
+    # (in case the DB was flushed or restarted under our feet).
+    REDIS_FULL_PUSH_EVERY: int = 6
 
     INTERACTIVE_SHELL_METHODS = [
             'close',
@@ -58,8 +64,34 @@ class BaseCamera:
             '_stop',
             'set_camera_mode',
             'set_camera_size',
+            'get_keyword_stats',
+            'get_auxiliary_stats',
+            'get_param_cache_stats',
+            'invalidate_param_cache',
+            'get_mode_change_stats',
     ]
 
+    # Periods [s] of the auxiliary thread tasks (see register_auxiliary_tasks)
+    AUX_PERIOD_TAKER_CHECK: float = 5.0
+    AUX_PERIOD_DEPENDENTS_RT: float = 10.0
+    AUX_PERIOD_POLL_KEYWORDS: float = 10.0
+    AUX_PERIOD_REDIS_PUSH: float = 2.0  # Cheap: only changed values get pushed
+
+    # Deadline for the taker to create the SHM and publish a first frame. None: forever.
+    SHM_READY_TIMEOUT: t_Op[float] = 60.0
+    # [s] Then, for the taker to be done writing its own keywords - see grab_shm_fill_keywords
+    SHM_KEYWORDS_SETTLE_TIME: float = 0.3
+
+    # [s] Lifetime of the cached parameter values (see ParamCache). 0 disables the cache.
+    PARAM_CACHE_TTL: float = 1.0
+
+    # set_camera_mode may skip the full restart (see _mode_change_path).
+    # Requires a taker that supports reuse_shm, and _apply_mode_parameters.
+    FAST_MODE_CHANGE: bool = False
+    # CameraMode fields that are the sensor geometry - vs. parameters that can be set live.
+    MODE_GEOMETRY_FIELDS: typ.FrozenSet[str] = frozenset(
+            ('x0', 'x1', 'y0', 'y1', 'binx', 'biny'))
+
     MODES: typ.Dict[util.Typ_mode_id, util.CameraMode] = {}
 
     # yapf: disable
@@ -122,6 +154,21 @@ class BaseCamera:
         #=======================
         self.RDB, self.HAS_REDIS = redis_check_enabled()
 
+        # Parameter getters (fps, tint, gain...) that are called over and over by
+        # viewers and Pyro clients don't all need to go to the camera.
+        self.param_cache = ParamCache(self.PARAM_CACHE_TTL)
+
+        self.mode_change_stats: typ.Dict[str, typ.Dict[str, typ.Any]] = {
+                path: {
+                        'n': 0,
+                        'last_duration': 0.0,
+                        'max_duration': 0.0
+                }
+                for path in (util.ModeChangePath.PARAMS,
+                             util.ModeChangePath.REUSE_SHM,
+                             util.ModeChangePath.FULL)
+        }
+
         if isinstance(mode_id_or_hw, tuple):  # Allow (width, height) fallback
             width, height = mode_id_or_hw
             self.current_mode_id: typ.Union[str, int] = 'CUSTOM'
@@ -139,10 +186,31 @@ class BaseCamera:
         self.dependent_processes_manager.initialize_tmux()
 
         self.taker_cset_prio = taker_cset_prio
+        self.taker_rt_supervisor = RTSupervisor()
 
         # Thread:
         self.event: t_Op[threading.Event] = None
         self.thread: t_Op[threadutil.HackedExitJoinThread] = None
+        self.aux_scheduler: t_Op[PollScheduler] = None
+
+        # Keyword transactions (see keyword_transaction):
+        # staging is per-thread, so that the polling thread and user calls don't mix.
+        self._kw_txn_local = threading.local()
+        self._kw_write_lock = threading.Lock()
+        self._kw_slot_index: typ.Dict[str, int] = {}
+        self._kw_slot_index_shm: t_Op[SHM] = None
+        # Keyword name -> compiled formatter, see _compile_keyword_formatters
+        self._kw_formatters: typ.Dict[str, util.Typ_kw_formatter] = {}
+        # Change detection: last formatted values pushed to redis.
+        # SHM writes compare against the SHM content itself, see _commit_keywords.
+        self._redis_shadow: typ.Dict[str, util.Typ_shm_kw_nobool] = {}
+        self._redis_push_count = 0
+        self.keyword_stats = {
+                'shm_written': 0,
+                'shm_skipped': 0,
+                'redis_written': 0,
+                'redis_skipped': 0,
+        }
 
         # LIFO... we first close the daemonized thread, then release all.
         # (which will also try to re-join... but we'd rather that goes fast).
@@ -253,11 +321,55 @@ class BaseCamera:
                 'Calling prepare_camera_finalize on generic BaseCameraClass. '
                 'Nothing happens here.')
 
-    def set_camera_mode(self, mode_id: util.Typ_mode_id) -> None:
+    def set_camera_mode(self, mode_id: util.Typ_mode_id,
+                        full_restart: bool = False) -> None:
         '''
             Quite same as above - but mostly meant to be called by subclasses that do have defined modes.
+
+            Takes the cheapest path from the current mode (see _mode_change_path),
+            unless full_restart. Setting the current mode again is a full restart.
         '''
         logg.debug('set_camera_mode @ BaseCamera')
+        t_start = time.monotonic()
+
+        path = util.ModeChangePath.FULL
+        if not full_restart:
+            path = self._mode_change_path(mode_id)
+
+        if path == util.ModeChangePath.PARAMS:
+            self._set_camera_mode_params(mode_id)
+        elif path == util.ModeChangePath.REUSE_SHM:
+            self._set_camera_mode_reuse_shm(mode_id)
+        else:
+            self._set_camera_mode_full(mode_id)
+
+        duration = time.monotonic() - t_start
+        stats = self.mode_change_stats[path]
+        stats['n'] += 1
+        stats['last_duration'] = duration
+        stats['max_duration'] = max(stats['max_duration'], duration)
+        logg.info(f'set_camera_mode: {mode_id} - {path} path in '
+                  f'{duration:.3f} s')
+
+    def _mode_change_path(self, mode_id: util.Typ_mode_id) -> str:
+        '''
+            Cheapest way from the current mode to mode_id, from the diff of the modes.
+            The fast paths are only taken by cameras that declare FAST_MODE_CHANGE,
+            with their taker running.
+        '''
+        if (not self.FAST_MODE_CHANGE or mode_id == self.current_mode_id or
+                    not self.is_taker_running()):
+            return util.ModeChangePath.FULL
+
+        if self._fg_size_from_mode(mode_id) != (self.width, self.height):
+            return util.ModeChangePath.FULL
+
+        changed = self.current_mode.diff(self.MODES[mode_id])
+        if not (changed & self.MODE_GEOMETRY_FIELDS):
+            return util.ModeChangePath.PARAMS
+        return util.ModeChangePath.REUSE_SHM
+
+    def _set_camera_mode_full(self, mode_id: util.Typ_mode_id) -> None:
         self.kill_taker_and_dependents()
 
         self.current_mode_id = mode_id
@@ -267,6 +379,8 @@ class BaseCamera:
         self.init_framegrab_backend()
 
         self.prepare_camera_for_size()
+        # Cached values may be from the previous mode (max fps, crop-dependent settings...)
+        self.param_cache.invalidate()
 
         self.start_frame_taker_and_dependents()
 
@@ -274,6 +388,51 @@ class BaseCamera:
 
         self.prepare_camera_finalize()
 
+    def _set_camera_mode_reuse_shm(self, mode_id: util.Typ_mode_id) -> None:
+        '''
+            Same frame size: the framegrabber config, the SHM, and the dependents reading it
+            are all good as they are. Only the taker is restarted around the new crop.
+        '''
+        self._kill_taker_no_dependents()
+
+        self.current_mode_id = mode_id
+        self.current_mode = self.MODES[mode_id]
+
+        self.prepare_camera_for_size()
+        self.param_cache.invalidate()
+
+        # Also refills the keywords and finalizes.
+        self._start_taker_no_dependents(reuse_shm=True)
+
+    def _set_camera_mode_params(self, mode_id: util.Typ_mode_id) -> None:
+        '''
+            Same geometry: no restart, the mode parameters are set live.
+        '''
+        self.current_mode_id = mode_id
+        self.current_mode = self.MODES[mode_id]
+
+        self._apply_mode_parameters()
+
+        # Mode dependent keywords (CROPPED...)
+        with self.keyword_transaction():
+            self._fill_keywords()
+
+    def _apply_mode_parameters(self) -> None:
+        '''
+            Set the fps / tint of self.current_mode on a running camera.
+            Subclasses with FAST_MODE_CHANGE must make sure this does it.
+        '''
+        self.prepare_camera_finalize()
+
+    def get_mode_change_stats(self) -> typ.Dict[str, typ.Dict[str, typ.Any]]:
+        '''
+            Per set_camera_mode path: number of changes, last and max duration [s].
+        '''
+        return {
+                path: dict(stats)
+                for path, stats in self.mode_change_stats.items()
+        }
+
     def set_mode(self, mode_id: util.Typ_mode_id) -> None:
         '''
         Alias
@@ -366,16 +525,11 @@ class BaseCamera:
                 count += 1
 
         if self.taker_cset_prio[1] is not None:  # Set rtprio !
-            subprocess.run(
-                    [
-                            'milk-makecsetandrt',
-                            str(
-                                    tmux_util.find_pane_running_pid(
-                                            self.take_tmux_pane)),  # PID
-                            self.taker_cset_prio[0],  # CPUSET
-                            str(self.taker_cset_prio[1])  # PRIORITY
-                    ],
-                    stdout=subprocess.PIPE)
+            taker_pid = tmux_util.find_pane_running_pid(self.take_tmux_pane)
+            if taker_pid is not None:
+                self.taker_rt_supervisor.place(taker_pid,
+                                               self.taker_cset_prio[0],
+                                               self.taker_cset_prio[1])
             print(f'Calling rtset w/ {self.taker_cset_prio}')
 
         self.grab_shm_fill_keywords()
@@ -419,42 +573,135 @@ class BaseCamera:
         # pointer to the SHM before the re-creation
         self.camera_shm = self._get_SHM()
 
-        time.sleep(0.3)  # Avoid initial race condition on keywords
-        self._fill_keywords()
+        # Avoid initial race condition on keywords: the taker may still be writing
+        # its own (MFRATE, _MACQTIME...) after its first frame - and would overwrite ours.
+        time.sleep(self.SHM_KEYWORDS_SETTLE_TIME)
+        with self.keyword_transaction():
+            self._fill_keywords()
 
     def _get_SHM(self) -> SHM:
         # Separated to be overloaded if need be (thinking of you, OCAM !)
+        # Wakes up on the SHM file creation (inotify), then on the first frame (semaphore).
+        # Raises shmwatch.SHMReadyTimeout after SHM_READY_TIMEOUT.
+        return shmwatch.wait_for_shm(self.STREAMNAME, self.SHM_READY_TIMEOUT)
 
-        while True:
-            # In case the SHM doesn't exist yet
-            if os.path.isfile(os.environ['MILK_SHM_DIR'] + '/' +
-                              self.STREAMNAME + '.im.shm'):
-                try:
-                    shm = SHM(self.STREAMNAME, symcode=0)
-                    break
-                except:
-                    pass
+    def set_keyword(self, key: str, value: typ.Union[str, int, float]) -> None:
+        return self._set_formatted_keyword(key, value)
 
-            time.sleep(0.1)
+    def _set_formatted_keyword(self, key: str, value: util.Typ_shm_kw) -> None:
 
-        shm.IMAGE.semflush(shm.semID)
-        while shm.IMAGE.semtrywait(shm.semID):
-            # We don't want to break a semaphore
-            # So wait til the first frame is published
-            time.sleep(0.1)
+        assert self.camera_shm is not None  # mypy happy assert
 
-        return shm
+        formatter = self._kw_formatters.get(key)
+        if formatter is None:
+            formatter = self._kw_formatters[key] = \
+                    util.compile_keyword_formatter(self.KEYWORDS[key][2])
+        try:
+            val = formatter(value)
+        except:  # Sometime garbage values cannot be formatted properly...
+            logg.error(f"_set_formatted_keyword: formatting error on {key}: "
+                       f"{value}, {self.KEYWORDS[key][2]}")
+            raise
+
+        staging = getattr(self._kw_txn_local, 'staging', None)
+        if staging is not None:
+            # Change detection happens on commit, against the actual SHM content.
+            staging[key] = val
+        else:
+            # A transaction of one: the taker or another process may have overwritten
+            # the keyword since our last write, only the SHM content tells.
+            self._commit_keywords({key: val})
 
-    def set_keyword(self, key: str, value: typ.Union[str, int, float]) -> None:
-        return self._set_formatted_keyword(key, value)
+    def get_keyword_stats(self) -> typ.Dict[str, int]:
+        '''
+            Counters of SHM keyword and redis writes, issued vs. skipped because unchanged.
+        '''
+        return dict(self.keyword_stats)
 
-    def _set_formatted_keyword(self, key: str, value: util.Typ_shm_kw) -> None:
+    def get_param_cache_stats(self) -> typ.Dict[str, int]:
+        '''
+            Hits and misses of the parameter getters on the cache, and invalidations.
+        '''
+        return self.param_cache.get_stats()
 
+    def invalidate_param_cache(self) -> None:
+        '''
+            Force the next parameter gets to query the camera, e.g. after it was
+            configured behind our back.
+        '''
+        self.param_cache.invalidate()
+
+    @contextlib.contextmanager
+    def keyword_transaction(self) -> typ.Iterator[None]:
+        '''
+            Batch keyword writes.
+            Within the block, _set_formatted_keyword (and set_keyword) only stage the formatted
+            values, and they are written to the SHM in one pass when the block exits -
+            instead of one full read-modify-write of the keyword table per keyword.
+
+            Nestable, the outermost block commits.
+            Staged values are committed even if the block raises, as they would have been
+            written one by one before the exception.
+            Staging is per-thread: other threads keep writing through.
+        '''
+        local = self._kw_txn_local
+        if getattr(local, 'staging', None) is not None:  # Nested
+            yield
+            return
+
+        local.staging = {}
+        try:
+            yield
+        finally:
+            staged, local.staging = local.staging, None
+            if staged:
+                self._commit_keywords(staged)
+
+    def _get_kw_slot_index(
+            self, shm_keywords: typ.Dict[str, typ.Any]) -> typ.Dict[str, int]:
+        '''
+            Keyword name -> slot in the SHM keyword table.
+            Cached per SHM instance: the table layout is fixed once _fill_keywords has run,
+            and a new SHM instance (mode change) gets a new index.
+        '''
+        if (self._kw_slot_index_shm is not self.camera_shm or
+                    len(self._kw_slot_index) != len(shm_keywords)):
+            self._kw_slot_index = {
+                    key: slot
+                    for slot, key in enumerate(shm_keywords)
+            }
+            self._kw_slot_index_shm = self.camera_shm
+        return self._kw_slot_index
+
+    def _commit_keywords(self,
+                         staged: typ.Dict[str, util.Typ_shm_kw_nobool]) -> None:
+        '''
+            Write pre-formatted keyword values to the SHM: one read, one bulk write.
+            Values identical to the SHM content are dropped, and if none is left, nothing is written.
+        '''
         assert self.camera_shm is not None  # mypy happy assert
 
-        format = self.KEYWORDS[key][2]
-        val = util.keyword_camstack_to_pyMilk(value, format)
-        self.camera_shm.update_keyword(key, val)
+        with self._kw_write_lock:
+            shm_keywords = self.camera_shm.get_keywords(True)
+            slots = self._get_kw_slot_index(shm_keywords)
+
+            table = list(shm_keywords.items())
+            n_changed = 0
+            for key, val in staged.items():
+                if key not in slots:
+                    raise KeyError(f'Keyword {key} is not allocated in SHM '
+                                   f'{self.STREAMNAME}.')
+                slot = slots[key]
+                if table[slot][1][0] == val:
+                    continue
+                table[slot] = (key, (val, table[slot][1][1]))
+                n_changed += 1
+
+            if n_changed > 0:
+                self.camera_shm.set_keywords(dict(table))
+
+            self.keyword_stats['shm_written'] += n_changed
+            self.keyword_stats['shm_skipped'] += len(staged) - n_changed
 
     def _fill_keywords(self) -> None:
 
@@ -470,6 +717,10 @@ class BaseCamera:
             preex_keywords.update(
                     util.keyword_dictionary_camstack_to_pyMilk(wcs_dict))
             self.KEYWORDS.update(wcs_dict)
+        self._kw_formatters = {
+                key: util.compile_keyword_formatter(tup[2])
+                for key, tup in self.KEYWORDS.items()
+        }
         self.camera_shm.set_keywords(preex_keywords)  # Initialize comments
         # Second pass to enforce formatting...
         # Don't do it on the preex from the framegrabber (MFRATE, _MACQTIME) cause they don't
@@ -515,19 +766,34 @@ class BaseCamera:
 
         if self.REDIS_PUSH_ENABLED and self.HAS_REDIS:
             assert self.REDIS_PREFIX is not None  # mypy
+
+            if self._redis_push_count % self.REDIS_FULL_PUSH_EVERY == 0:
+                self._redis_shadow = {}
+            self._redis_push_count += 1
+
             try:
                 keywords_shm = self.camera_shm.get_keywords(False)
+                n_pushed, n_skipped = 0, 0
                 with self.RDB.pipeline() as pipe:
                     for kw in keywords_shm:
                         if (kw in self.KEYWORDS and
                                     self.KEYWORDS[kw][3] is not None):
+                            if self._redis_shadow.get(kw) == keywords_shm[kw]:
+                                n_skipped += 1
+                                continue
                             pipe.hset(self.REDIS_PREFIX + self.KEYWORDS[kw][3],
                                       'value', keywords_shm[kw])
-                    pipe.execute()
+                            n_pushed += 1
+                    if n_pushed > 0:
+                        pipe.execute()
+                self._redis_shadow = keywords_shm
+                self.keyword_stats['redis_written'] += n_pushed
+                self.keyword_stats['redis_skipped'] += n_skipped
             except:  #TODO
                 # In case there's a transient unavailability of the DB
                 # Or get_keyword failed or whatnot
                 logg.error('Exception in redis_push_values @ BaseCamera')
+                self._redis_shadow = {}  # Don't know what made it: push all next time
 
     def start_auxiliary_thread(self) -> None:
         logg.info('start_auxiliary_thread')
@@ -535,6 +801,8 @@ class BaseCamera:
         if self.thread is not None:
             logg.error(
                     'start_auxiliary_thread @ Basecamera - something wrong???')
+        self.aux_scheduler = PollScheduler(self.event)
+        self.register_auxiliary_tasks()
         self.thread = HackedExitJoinThread(
                 event=self.event, daemon=True,
                 target=self.auxiliary_thread_run_function)
@@ -555,34 +823,57 @@ class BaseCamera:
             self.thread = None
 
     def auxiliary_thread_run_function(self) -> None:
-        assert self.event is not None  # mypy happy assert
+        assert self.aux_scheduler is not None  # mypy happy assert
 
-        event_count = 0
-        while True:
-            ret = self.event.wait(1)
-            if ret:  # Signal to break the loop
-                break
-            event_count += 1
-            if event_count % 10 > 0:
-                continue
+        self.aux_scheduler.run()
 
-            self.auxiliary_thread_inner_function()
+    def _auxiliary_lock(self) -> t_Op[Lockable]:
+        '''
+            Lock to own (non-blockingly) for running the base auxiliary tasks.
+        '''
+        return None
 
-    def auxiliary_thread_inner_function(self) -> None:
+    def register_auxiliary_tasks(self) -> None:
+        '''
+            Called on every start of the auxiliary thread.
+            Subclasses can extend this to add their own tasks with their own cadence,
+            e.g. cheap sensors often and slow serial queries rarely:
+                self.aux_scheduler.add_task('temperature', self.get_temperature, 30.0)
+        '''
+        assert self.aux_scheduler is not None  # mypy happy assert
+        sched = self.aux_scheduler
+        lock = self._auxiliary_lock()
+
+        sched.add_task('taker_check', self._aux_check_taker,
+                       self.AUX_PERIOD_TAKER_CHECK,
+                       first_delay=self.AUX_PERIOD_TAKER_CHECK, lock=lock)
+        # Dependents cset + RTprio checking
+        sched.add_task('dependents_rt', self._aux_make_dependents_rt,
+                       self.AUX_PERIOD_DEPENDENTS_RT,
+                       first_delay=self.AUX_PERIOD_DEPENDENTS_RT, lock=lock)
+        # Camera specifics !
+        sched.add_task('poll_keywords', self._aux_poll_keywords,
+                       self.AUX_PERIOD_POLL_KEYWORDS,
+                       first_delay=self.AUX_PERIOD_POLL_KEYWORDS, lock=lock)
+        sched.add_task('redis_push', self.redis_push_values,
+                       self.AUX_PERIOD_REDIS_PUSH, lock=lock)
+
+    def _aux_check_taker(self) -> None:
         if not self.is_taker_running():
             logg.critical('take_tmux_pane contains no live PID.')
 
-        # Dependents cset + RTprio checking
+    def _aux_make_dependents_rt(self) -> None:
         for proc in self.dependent_processes:
             proc.make_children_rt()
 
-        # Camera specifics !
-        try:
+    def _aux_poll_keywords(self) -> None:
+        with self.keyword_transaction():
             self.poll_camera_for_keywords()
-        except Exception as e:
-            logg.error(f"Polling thread: error [{e!r}]")
 
-        try:
-            self.redis_push_values()
-        except Exception as e:
-            logg.error(f"Polling thread: error [{e!r}]")
+    def get_auxiliary_stats(self) -> typ.Dict[str, typ.Dict[str, typ.Any]]:
+        '''
+            Per auxiliary task: runs, errors, overruns, last and max duration...
+        '''
+        if self.aux_scheduler is None:
+            return {}
+        return self.aux_scheduler.get_stats()
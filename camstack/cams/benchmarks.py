@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+'''
+    Camera micro-benchmarks
+
+    benchmarks.py [keywords]: keyword throughput.
+        Formats every BaseCamera.KEYWORDS entry (+ <n_wcs> WCS sets) with:
+        - legacy: the per-call format dispatch, allocating a FormattedFloat per float
+        - dispatch: util.keyword_camstack_to_pyMilk
+        - compiled: the precompiled formatter table, as used by BaseCamera._set_formatted_keyword
+
+    benchmarks.py params: params SHM round trip latency of ParamsSHMCamera, against the
+        Python stand-in taker (no hardware), for the legacy (frame-synchronous) and the
+        sequence/ack protocols, at several exposure times (= frame periods).
+
+    Usage:
+        benchmarks.py params [-r <n_requests>] [-e <exptimes>] [-s <service_time>]
+        benchmarks.py [keywords] [-n <n_rounds>] [-w <n_wcs>]
+
+    Options:
+        -n <n_rounds>       Number of passes over the keyword table [default: 2000]
+        -w <n_wcs>          Number of WCS keyword sets [default: 2]
+        -r <n_requests>     Number of round trips per configuration [default: 10]
+        -e <exptimes>       Exposure times [s], comma separated [default: 0.001,0.1,1.5]
+        -s <service_time>   Time the stand-in taker takes to service a request [s] [default: 0.001]
+'''
+from __future__ import annotations
+
+import typing as typ
+
+import time
+import threading
+
+from scxkw.config import MAGIC_BOOL_STR
+
+from camstack.core import utilities as util
+from camstack.core.wcs import wcs_dummy_dict
+from camstack.cams.base import BaseCamera
+from camstack.cams.params_shm_backend import ParamsSHMCamera, WrappingVerboseRLock
+from camstack.cams.params_shm_standin import (FakeParamsSHM,
+                                              ParamsSHMStandInTaker)
+
+
+def _legacy_keyword_camstack_to_pyMilk(
+        value: util.Typ_shm_kw, format: str) -> util.Typ_shm_kw_nobool:
+    # Reference: the per-call dispatch that the compiled formatters replace.
+    val = value
+    if format == 'BOOLEAN':
+        if isinstance(value, bool):
+            val = MAGIC_BOOL_STR.TUPLE[value]
+        else:
+            assert val in MAGIC_BOOL_STR.TUPLE
+    elif format[-1] == 'd':
+        val = int(format % value)
+    elif format[-1] == 'f':
+        val = util.FormattedFloat(format % value, format)
+    elif format[-1] == 's':
+        val = format % value
+    return val
+
+
+def bench_keyword_formatting(
+        keywords: typ.Dict[str, typ.Tuple[util.Typ_shm_kw, str, str, str]],
+        n_rounds: int) -> typ.Dict[str, float]:
+    '''
+    Returns the keyword formatting throughput of each method, in keywords/s.
+    '''
+    items = [(key, tup[0], tup[2]) for key, tup in keywords.items()]
+    formatters = {
+            key: util.compile_keyword_formatter(fmt)
+            for key, _, fmt in items
+    }
+
+    results = {}
+
+    t_start = time.perf_counter()
+    for _ in range(n_rounds):
+        for key, value, fmt in items:
+            _legacy_keyword_camstack_to_pyMilk(value, fmt)
+    results['legacy'] = time.perf_counter() - t_start
+
+    t_start = time.perf_counter()
+    for _ in range(n_rounds):
+        for key, value, fmt in items:
+            util.keyword_camstack_to_pyMilk(value, fmt)
+    results['dispatch'] = time.perf_counter() - t_start
+
+    t_start = time.perf_counter()
+    for _ in range(n_rounds):
+        for key, value, fmt in items:
+            formatters[key](value)
+    results['compiled'] = time.perf_counter() - t_start
+
+    n_kw = n_rounds * len(items)
+    return {name: n_kw / dt for name, dt in results.items()}
+
+
+def main_keyword_formatting(n_rounds: int, n_wcs: int) -> None:
+    keywords = dict(BaseCamera.KEYWORDS)
+    for i in range(n_wcs):
+        keywords.update(wcs_dummy_dict(i))
+
+    print(f'{len(keywords)} keywords x {n_rounds} rounds')
+    results = bench_keyword_formatting(keywords, n_rounds)
+    for name, kw_per_s in results.items():
+        print(f'{name:>10s}: {kw_per_s / 1e6:6.3f} Mkw/s - '
+              f'{1e9 / kw_per_s:6.0f} ns/kw - '
+              f'x{kw_per_s / results["legacy"]:.2f}')
+
+
+class BenchParamsCamera(ParamsSHMCamera):
+    '''
+    Only the params SHM client of a ParamsSHMCamera: no taker, no camera SHM.
+    '''
+
+    def __init__(self, control_shm: typ.Any, exptime: float) -> None:
+        self.NAME = 'bench'
+        self.control_shm = control_shm
+        self.control_shm_lock = WrappingVerboseRLock()
+        self._prm_pending = []
+        self._prm_pending_lock = threading.Lock()
+        self._prm_batch_local = threading.local()
+        self._prm_delivered = {}
+        self.params_stats = {
+                'requests': 0,
+                'exchanges': 0,
+                'keys': 0,
+                'retries': 0,
+                'legacy_exchanges': 0,
+        }
+        self.prm_exptime_hint = exptime
+
+
+def bench_params_round_trip(exptime: float, seqack: bool, n_requests: int,
+                            service_time: float) -> typ.Tuple[float, float]:
+    '''
+    Returns the median and max round trip time of a 3-key get, in s.
+    '''
+    storage = FakeParamsSHM()
+    taker = ParamsSHMStandInTaker(storage.handle(), {1: 1.0, 2: 2.0, 3: 3.0},
+                                  frame_period=exptime, seqack=seqack,
+                                  service_time=service_time)
+    cam = BenchParamsCamera(storage.handle(), exptime)
+    taker.start()
+
+    times = []
+    try:
+        for _ in range(n_requests):
+            t_start = time.perf_counter()
+            values = cam._prm_getmultivalue([None, None, None], [1, 2, 3])
+            times += [time.perf_counter() - t_start]
+            assert values == [1.0, 2.0, 3.0], values
+    finally:
+        taker.stop()
+
+    times.sort()
+    return times[len(times) // 2], times[-1]
+
+
+def main_params_round_trip(exptimes: typ.List[float], n_requests: int,
+                           service_time: float) -> None:
+    print(f'{"exptime":>8s} | {"legacy p50":>10s} {"max":>8s} | '
+          f'{"seqack p50":>10s} {"max":>8s}  (ms)')
+    for exptime in exptimes:
+        results = [
+                bench_params_round_trip(exptime, seqack, n_requests,
+                                        service_time)
+                for seqack in (False, True)
+        ]
+        print(f'{exptime:8.3f} | ' + ' | '.join(
+                f'{p50 * 1e3:10.2f} {t_max * 1e3:8.2f}'
+                for p50, t_max in results))
+
+
+if __name__ == '__main__':
+    import docopt
+
+    args = docopt.docopt(__doc__)
+
+    if args['params']:
+        main_params_round_trip([float(e) for e in args['-e'].split(',')],
+                               int(args['-r']), float(args['-s']))
+    else:
+        main_keyword_formatting(int(args['-n']), int(args['-w']))
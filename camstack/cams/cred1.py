@@ -10,6 +10,7 @@ import time
 import numpy as np
 
 from camstack.cams.edtcam import EDTCamera
+from camstack.core.param_cache import cached_param
 
 from camstack.core.utilities import (
         CameraMode,
@@ -84,6 +85,9 @@ class CRED1(EDTCamera):
     EDTTAKE_UNSIGNED = True
     EDTTAKE_EMBEDMICROSECOND = True
 
+    # Same size crops: taker restart only. fps only: set live. See BaseCamera._mode_change_path
+    FAST_MODE_CHANGE = True
+
     def __init__(
             self,
             name: str,
@@ -225,9 +229,7 @@ class CRED1(EDTCamera):
 
     def poll_camera_for_keywords(self, shm_write: bool = True) -> None:
         self.get_temperature(shm_write=shm_write)  # Sets DET-TMP
-        time.sleep(0.1)
         self.get_cryo_pressure(shm_write=shm_write)  # Sets DET-PRES
-        time.sleep(0.1)
         water_temp = self.get_water_temperature()
         if water_temp > 40.0:
             self._emergency_abort()
@@ -281,6 +283,7 @@ class CRED1(EDTCamera):
     def set_synchro(self, synchro: bool) -> bool:
         val = ("off", "on")[synchro]
         _ = self.send_command(f"set extsynchro {val}")
+        self.param_cache.invalidate("fps")
         res = self.send_command("extsynchro raw")
         self.synchro = {"off": False, "on": True}[res]
         self._set_formatted_keyword("EXTTRIG", self.synchro)
@@ -364,27 +367,38 @@ class CRED1(EDTCamera):
 
     def set_readout_mode(self, mode: str) -> str:
         self.send_command(f"set mode {mode}")
+        # Mode changes may rescale the fps and the NDR.
+        self.param_cache.invalidate()
         return self.get_readout_mode()
 
     def get_readout_mode(self) -> str:
-        res = self.send_command("mode raw")
-        res = (
-                res[:6] + res[11:]
-        )  # Removing "reset" after "global", otherwise too long for shm keywords
+        # Keywords out of the cached query: they're due on a fresh SHM too.
+        res = self._query_readout_mode()
         self._set_formatted_keyword("DET-SMPL", res)
         logg.info(f"get_readout_mode: {res}")
         return res
 
+    @cached_param("readout_mode")
+    def _query_readout_mode(self) -> str:
+        res = self.send_command("mode raw")
+        # Removing "reset" after "global", otherwise too long for shm keywords
+        return res[:6] + res[11:]
+
     def set_gain(self, gain: int) -> int:
         self.send_command(f"set gain {gain}")
+        self.param_cache.invalidate("gain")
         return self.get_gain()
 
     def get_gain(self) -> int:
-        res = int(self.send_command("gain raw"))
+        res = self._query_gain()
         self._set_formatted_keyword("DETGAIN", res)
         logg.info(f"get_gain: {res}")
         return res
 
+    @cached_param("gain")
+    def _query_gain(self) -> int:
+        return int(self.send_command("gain raw"))
+
     def get_maxpossiblegain(self) -> int:
         return int(self.send_command("maxpossiblegain raw"))
 
@@ -405,6 +419,7 @@ class CRED1(EDTCamera):
 
         # DO NOT set the mode, this reverts setting the NDR... or does it ? Getting the mode seems to unlock the weird behavior.
         self.send_command(f"set nbreadworeset {NDR}")
+        self.param_cache.invalidate()
 
         if readout_mode != curr_readout_mode:
             # These two lines to help iron out firmware glitches at mode/ndr changes
@@ -429,24 +444,33 @@ class CRED1(EDTCamera):
         return self.get_NDR()
 
     def get_NDR(self) -> int:
-        self.NDR = int(self.send_command("nbreadworeset raw"))
+        self.NDR = self._query_NDR()
         self._set_formatted_keyword("DET-NSMP", self.NDR)
         self._set_formatted_keyword("DET-SMPL",
                                     ("globalsingle", "globalcds")[self.NDR > 1])
         logg.info(f"get_NDR: {self.NDR}")
         return self.NDR
 
+    @cached_param("NDR")
+    def _query_NDR(self) -> int:
+        return int(self.send_command("nbreadworeset raw"))
+
     def set_fps(self, fps: float) -> float:
         self.send_command(f"set fps {fps}")
+        self.param_cache.invalidate("fps")
         return self.get_fps()
 
     def get_fps(self) -> float:
-        fps = float(self.send_command("fps raw"))
+        fps = self._query_fps()
         self._set_formatted_keyword("FRATE", fps)
         self._set_formatted_keyword("EXPTIME", 1.0 / fps)
         logg.info(f"get_fps: {fps}")
         return fps
 
+    @cached_param("fps")
+    def _query_fps(self) -> float:
+        return float(self.send_command("fps raw"))
+
     def max_fps(self) -> float:
         return float(self.send_command("maxfps raw"))
 
@@ -671,7 +695,8 @@ class IiwiButItsApapane(Apapane):
         self.send_command('set rawimages off')
         self.send_command('set aduoffset 1000')
 
-    def set_camera_mode(self, mode_id: Typ_mode_id) -> None:
+    def set_camera_mode(self, mode_id: Typ_mode_id,
+                        full_restart: bool = False) -> None:
         if mode_id == self.IIWI:
             for i in range(2):  # Just a bit of forcing
                 self.set_NDR(2)
@@ -686,7 +711,7 @@ class IiwiButItsApapane(Apapane):
             for i in range(2):  # Just a bit of forcing
                 self.set_NDR(8)
 
-        return Apapane.set_camera_mode(self, mode_id)
+        return Apapane.set_camera_mode(self, mode_id, full_restart)
 
     def _fill_keywords(self) -> None:
         Apapane._fill_keywords(self)
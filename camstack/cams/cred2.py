@@ -12,6 +12,7 @@ import numpy as np
 from camstack.cams.edtcam import EDTCamera
 
 from camstack.core import utilities as util
+from camstack.core.param_cache import cached_param
 from camstack.core.wcs import wcs_dict_init
 
 
@@ -67,6 +68,9 @@ class CRED2(EDTCamera):
 
     EDTTAKE_UNSIGNED = False
 
+    # Same size crops: taker restart only. fps / tint only: set live. See BaseCamera._mode_change_path
+    FAST_MODE_CHANGE = True
+
     def __init__(self, name: str, stream_name: str, mode_id: int = 0,
                  unit: int = 0, channel: int = 0,
                  taker_cset_prio: util.Typ_tuple_cset_prio = ('system', None),
@@ -219,6 +223,7 @@ class CRED2(EDTCamera):
     def set_synchro(self, synchro: bool) -> bool:
         val = ('off', 'on')[synchro]
         _ = self.send_command(f'set extsynchro {val}')
+        self.param_cache.invalidate('fps')
         res = self.send_command('extsynchro raw')
         self.synchro = {'off': False, 'on': True}[res]
         self._set_formatted_keyword('EXTTRIG', self.synchro)
@@ -230,53 +235,76 @@ class CRED2(EDTCamera):
         if type(gain) is int:
             gain = CRED2_GAINENUM.STR2INT_MAP[gain]
         self.send_command(f'set sensibility {gain}')
+        self.param_cache.invalidate('gain')
         return self.get_gain()
 
     def set_sensibility(self, sensibility: Union[int, str]) -> int:
         return self.set_gain(sensibility)
 
     def get_gain(self) -> int:
-        res = CRED2_GAINENUM.INT2STR_MAP[self.send_command('sensibility raw')]
+        # Keywords out of the cached query: they're due on a fresh SHM too.
+        res = self._query_gain()
         # res is high, medium or low
         self._set_formatted_keyword('DETGAIN', res)
         logg.info(f'get_gain: {res}')
         return res
 
+    @cached_param('gain')
+    def _query_gain(self) -> int:
+        return CRED2_GAINENUM.INT2STR_MAP[self.send_command('sensibility raw')]
+
     def set_NDR(self, NDR: int) -> int:
         self.send_command(f'set nbreadworeset {NDR}')
+        # May rescale the fps and tint
+        self.param_cache.invalidate()
         return self.get_NDR()
 
     def get_NDR(self) -> int:
-        self.NDR = int(self.send_command(f'nbreadworeset raw'))
+        self.NDR = self._query_NDR()
         self._set_formatted_keyword('DET-NSMP', self.NDR)
         self._set_formatted_keyword('DET-SMPL',
                                     ('Single', 'IMRO')[self.NDR > 1])
         logg.info(f'get_NDR: {self.NDR}')
         return self.NDR
 
+    @cached_param('NDR')
+    def _query_NDR(self) -> int:
+        return int(self.send_command(f'nbreadworeset raw'))
+
     def set_fps(self, fps: float) -> float:
         self.send_command(f'set fps {fps}')
+        # fps and tint constrain each other
+        self.param_cache.invalidate('fps', 'tint')
         return self.get_fps()
 
     def get_fps(self) -> float:
-        fps = float(self.send_command('fps raw'))
+        fps = self._query_fps()
         self._set_formatted_keyword('FRATE', fps)
         logg.info(f'get_fps: {fps}')
         return fps
 
+    @cached_param('fps')
+    def _query_fps(self) -> float:
+        return float(self.send_command('fps raw'))
+
     def max_fps(self) -> float:
         return float(self.send_command('maxfps raw'))
 
     def set_tint(self, tint: float) -> float:
         self.send_command(f'set tint {tint}')
+        self.param_cache.invalidate('fps', 'tint')
         return self.get_tint()
 
     def get_tint(self) -> float:
-        tint = float(self.send_command('tint raw'))
+        tint = self._query_tint()
         self._set_formatted_keyword('EXPTIME', tint)
         logg.info(f'get_tint: {tint}')
         return tint
 
+    @cached_param('tint')
+    def _query_tint(self) -> float:
+        return float(self.send_command('tint raw'))
+
     def max_tint(self) -> float:
         return float(self.send_command('maxtint raw'))
 
@@ -3,8 +3,9 @@ from typing import Union, Tuple, List, Any, Optional as Op, Dict
 import os
 import logging as logg
 
-from camstack.cams.params_shm_backend import ParamsSHMCamera
+from camstack.cams.params_shm_backend import ParamsSHMCamera, ParamsFuture
 from camstack.core import utilities as util
+from camstack.core.param_cache import cached_param
 
 from hwmain.dcam import dcamprop
 
@@ -115,11 +116,14 @@ class DCAMCamera(ParamsSHMCamera):
         dump_params = {f"{k:08x}": 1.0 * params[k] for k in params}
 
         self.control_shm.reset_keywords(dump_params)
-        self.control_shm.set_data(self.control_shm.get_data() * 0 + len(params))
+        self._prm_reset_control_data(len(params))
         while self.control_shm.check_sem_trywait(
         ):  # semflush the post we just made.
             pass
 
+        # The taker (re)starts with these params: exposure, readout speed... may have changed.
+        self.param_cache.invalidate()
+
     def abort_exposure(self) -> None:
         # Basically restart the stack. Hacky way to abort a very long exposure.
         # This will kill the fgrab process, and re-init
@@ -196,6 +200,9 @@ class OrcaQuest(DCAMCamera):
 
     IS_WATER_COOLED = False
 
+    # Same size crops: taker restart only, like abort_exposure. tint only: set live.
+    FAST_MODE_CHANGE = True
+
     def __init__(
             self,
             name: str,
@@ -217,65 +224,115 @@ class OrcaQuest(DCAMCamera):
         )
 
     def _fill_keywords(self) -> None:
-        super()._fill_keywords()
-
-        # Override detector name
-        self._set_formatted_keyword("DETECTOR", "Orca Quest")
-        self._set_formatted_keyword("CROPPED", self.current_mode_id
-                                    != self.FULL)
-        # pixel pitch is 4.6 micron
-        self._set_formatted_keyword("DETPXSZ1", 0.0046)
-        self._set_formatted_keyword("DETPXSZ2", 0.0046)
-
-        # Detector specs from instruction manual
-        self._prm_getvalue("GAIN", dcamprop.EProp.CONVERSIONFACTOR_COEFF)
-        self._prm_getvalue("DETBIAS", dcamprop.EProp.CONVERSIONFACTOR_OFFSET)
+        # Subclasses too: all params SHM gets in a single round trip.
+        with self.batch():
+            super()._fill_keywords()
+
+            # Override detector name
+            self._set_formatted_keyword("DETECTOR", "Orca Quest")
+            self._set_formatted_keyword("CROPPED", self.current_mode_id
+                                        != self.FULL)
+            # pixel pitch is 4.6 micron
+            self._set_formatted_keyword("DETPXSZ1", 0.0046)
+            self._set_formatted_keyword("DETPXSZ2", 0.0046)
+
+            # Detector specs from instruction manual
+            self._prm_getvalue_async("GAIN",
+                                     dcamprop.EProp.CONVERSIONFACTOR_COEFF)
+            self._prm_getvalue_async("DETBIAS",
+                                     dcamprop.EProp.CONVERSIONFACTOR_OFFSET)
 
     def poll_camera_for_keywords(self) -> None:
-        self.get_temperature()
+        with self.batch():
+            self._get_temperature_async()
+
+    def _apply_mode_parameters(self) -> None:
+        # There's no prepare_camera_finalize: the mode tint is usually set at taker start.
+        if self.current_mode.fps is not None:
+            self.set_fps(self.current_mode.fps)
+        if self.current_mode.tint is not None:
+            self.set_tint(self.current_mode.tint)
 
     def get_temperature(self) -> float:
+        return self._get_temperature_async().result()
+
+    def _get_temperature_async(self) -> ParamsFuture:
         # Let's try and play: it's readonly
         # but should trigger the cam calling back home
-        temp_C = self._prm_getvalue(None, dcamprop.EProp.SENSORTEMPERATURE)
-        temp_K = temp_C + 273.15
-        # convert celsius to kelvin
-        self._set_formatted_keyword("DET-TMP", temp_K)
-        logg.info(f"get_temperature {temp_K} K")
-        return temp_K
+        def to_kelvin(temp_C: float) -> float:
+            temp_K = temp_C + 273.15
+            self._set_formatted_keyword("DET-TMP", temp_K)
+            logg.info(f"get_temperature {temp_K} K")
+            return temp_K
+
+        return self._prm_getvalue_async(
+                None, dcamprop.EProp.SENSORTEMPERATURE).then(to_kelvin)
 
     # And now we fill up... FAN, LIQUID
 
     def get_tint(self) -> float:
-        val = self._prm_getvalue("EXPTIME", dcamprop.EProp.EXPOSURETIME)
-        logg.info(f"get_tint {val}")
-        return val
+        # The feedback of a query sets the keyword, but a cache hit has to as well.
+        tint = self._query_tint()
+        self._set_formatted_keyword("EXPTIME", tint)
+        return tint
+
+    @cached_param("tint")
+    def _query_tint(self) -> float:
+        return self._get_tint_async().result()
+
+    def _get_tint_async(self) -> ParamsFuture:
+
+        def log(val: float) -> float:
+            logg.info(f"get_tint {val}")
+            self.prm_exptime_hint = val
+            return val
+
+        return self._prm_getvalue_async("EXPTIME",
+                                        dcamprop.EProp.EXPOSURETIME).then(log)
 
     def set_tint(self, tint: float) -> float:
+        # Before: the camera may have to finish the current exposure for the ack.
+        self.prm_exptime_hint = max(self.prm_exptime_hint, tint)
         tint = self._prm_setvalue(float(tint), "EXPTIME",
                                   dcamprop.EProp.EXPOSURETIME)
+        self.prm_exptime_hint = tint
+        self.param_cache.invalidate("fps")
+        self.param_cache.put("tint", tint)
         # update FRATE and EXPTIME
         self.get_fps()
         return tint
 
     def get_fps(self) -> float:
-        exp_time, read_time, ext_trig = self._prm_getmultivalue(
+        fps = self._query_fps()
+        self._set_formatted_keyword("FRATE", fps)
+        return fps
+
+    @cached_param("fps")
+    def _query_fps(self) -> float:
+        return self._get_fps_async().result()
+
+    def _get_fps_async(self) -> ParamsFuture:
+
+        def compute_fps(values: List[float]) -> float:
+            exp_time, read_time, ext_trig = values
+            if ext_trig == dcamprop.ETriggerSource.INTERNAL:
+                fps = 1 / max(exp_time, read_time)
+            else:
+                fps = 1 / (
+                        exp_time + read_time
+                )  # Rolling shutter for the currently used trigger mode. FIXME when we deploy continuous external trigger mode.
+            self._set_formatted_keyword("FRATE", fps)
+            logg.info(f"get_fps {fps}")
+            return fps
+
+        return self._prm_getmultivalue_async(
                 ["EXPTIME", None, None],
                 [
                         dcamprop.EProp.EXPOSURETIME,
                         dcamprop.EProp.TIMING_READOUTTIME,
                         dcamprop.EProp.TRIGGERSOURCE
                 ],
-        )
-        if ext_trig == dcamprop.ETriggerSource.INTERNAL:
-            fps = 1 / max(exp_time, read_time)
-        else:
-            fps = 1 / (
-                    exp_time + read_time
-            )  # Rolling shutter for the currently used trigger mode. FIXME when we deploy continuous external trigger mode.
-        self._set_formatted_keyword("FRATE", fps)
-        logg.info(f"get_fps {fps}")
-        return fps
+        ).then(compute_fps)
 
     def set_fps(self, fps: float) -> float:
         self.set_tint(1 / fps)
@@ -310,16 +367,24 @@ class OrcaQuest(DCAMCamera):
             })
             self._start_taker_no_dependents(reuse_shm=True)
 
+    @cached_param("readout_mode")
     def get_readout_mode(self) -> str:
-        readmode = self._prm_getvalue(None, dcamprop.EProp.READOUTSPEED)
-        if readmode == dcamprop.EReadoutSpeed.READOUT_ULTRAQUIET:
-            mode = "SLOW"
-        elif readmode == dcamprop.EReadoutSpeed.READOUT_FAST:
-            mode = "FAST"
-        else:
-            # should never get here
-            mode = "Unknown"
-        return mode
+        return self._get_readout_mode_async().result()
+
+    def _get_readout_mode_async(self) -> ParamsFuture:
+
+        def to_mode(readmode: float) -> str:
+            if readmode == dcamprop.EReadoutSpeed.READOUT_ULTRAQUIET:
+                mode = "SLOW"
+            elif readmode == dcamprop.EReadoutSpeed.READOUT_FAST:
+                mode = "FAST"
+            else:
+                # should never get here
+                mode = "Unknown"
+            return mode
+
+        return self._prm_getvalue_async(
+                None, dcamprop.EProp.READOUTSPEED).then(to_mode)
 
     def get_external_trigger(self) -> bool:
         val = (self._prm_getvalue(None, dcamprop.EProp.TRIGGERSOURCE) ==
@@ -346,6 +411,7 @@ class OrcaQuest(DCAMCamera):
 
         ext_trig = result == dcamprop.ETriggerSource.EXTERNAL
         self._set_formatted_keyword("EXTTRIG", ext_trig)
+        self.param_cache.invalidate("fps")
         self.get_fps()  # fps has to be refreshed after changing trigger mode.
         return ext_trig
 
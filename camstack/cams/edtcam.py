@@ -6,8 +6,10 @@ import os
 import subprocess
 import time
 import logging as logg
+from concurrent.futures import Future
 
 from camstack.cams.base import BaseCamera
+from camstack.core.serial_worker import SerialWorker, SerialPriority
 from hwmain.edt.edtinterface import EdtInterfaceSerial
 
 from camstack.core.utilities import (Typ_mode_id_or_heightwidth,
@@ -16,7 +18,7 @@ from camstack.core.utilities import (Typ_mode_id_or_heightwidth,
 
 class EDTCamera(BaseCamera):
 
-    INTERACTIVE_SHELL_METHODS = ['send_command'] + \
+    INTERACTIVE_SHELL_METHODS = ['send_command', 'get_serial_stats'] + \
         BaseCamera.INTERACTIVE_SHELL_METHODS
 
     MODES = {}
@@ -29,6 +31,9 @@ class EDTCamera(BaseCamera):
     EDTTAKE_UNSIGNED = True
     EDTTAKE_EMBEDMICROSECOND = False  # We want this for CRED1 / 2 but not elsewhere
 
+    # [s] Serial commands not started by then (queued behind others) fail - see SerialWorker
+    SERIAL_QUEUE_TIMEOUT = 10.0
+
     def __init__(self, name: str, stream_name: str,
                  mode_id_or_hw: Typ_mode_id_or_heightwidth, pdv_unit: int,
                  pdv_channel: int, pdv_basefile: str, no_start: bool = False,
@@ -41,8 +46,10 @@ class EDTCamera(BaseCamera):
         self.pdv_basefile: str = pdv_basefile
         self.pdv_taps: int = 1  # We will retrive this from the FG.
 
-        # See self.init_framegrab_backend
-        self.edt_iface: EdtInterfaceSerial | None = None
+        # Owns the EdtInterfaceSerial - opened in self.init_framegrab_backend.
+        # All serial I/O goes through it: shell, Pyro and polling threads don't interleave,
+        # and user commands jump ahead of the polls.
+        self.serial_worker = SerialWorker(name)
 
         BaseCamera.__init__(self, name, stream_name, mode_id_or_hw,
                             no_start=no_start, taker_cset_prio=taker_cset_prio,
@@ -91,7 +98,8 @@ class EDTCamera(BaseCamera):
 
         # Open a serial handle
         # It's possible initcam messed with it so we reopen it
-        self.edt_iface = EdtInterfaceSerial(self.pdv_unit, self.pdv_channel)
+        self.serial_worker.open(
+                lambda: EdtInterfaceSerial(self.pdv_unit, self.pdv_channel))
 
     def _prepare_backend_cmdline(self, reuse_shm: bool = False) -> None:
 
@@ -116,11 +124,35 @@ class EDTCamera(BaseCamera):
             Wrap to the serial
             That supposes we HAVE serial... maybe we'll move this to a subclass
         '''
-        assert self.edt_iface is not None  # mypy happy.
-
         logg.debug(f'EDTCamera: send_command: "{cmd}"')
 
-        return self.edt_iface.send_command(cmd, base_timeout=base_timeout)
+        return self.send_command_async(cmd, base_timeout=base_timeout).result()
+
+    def send_command_async(self, cmd: str, base_timeout: float = 100.,
+                           priority: typ.Optional[int] = None) -> Future:
+        '''
+            Queue cmd to the serial worker. The future resolves to the raw answer -
+            without the parsing of the subclasses send_command.
+        '''
+
+        def send(edt_iface: typ.Optional[EdtInterfaceSerial]) -> str:
+            assert edt_iface is not None  # mypy happy.
+            return edt_iface.send_command(cmd, base_timeout=base_timeout)
+
+        return self.serial_worker.submit(send, priority=priority,
+                                         timeout=self.SERIAL_QUEUE_TIMEOUT,
+                                         description=cmd)
+
+    def _aux_poll_keywords(self) -> None:
+        # Background polls yield the serial line to user commands.
+        with self.serial_worker.priority(SerialPriority.POLL):
+            super()._aux_poll_keywords()
+
+    def get_serial_stats(self) -> typ.Dict[str, typ.Dict[str, typ.Any]]:
+        '''
+            Serial queue depth, and per priority: requests, timeouts, wait and service times.
+        '''
+        return self.serial_worker.get_stats()
 
     def raw(self, cmd: str) -> str:
         '''
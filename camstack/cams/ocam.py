@@ -8,6 +8,7 @@ import logging as logg
 
 from camstack.cams.edtcam import EDTCamera
 from camstack.core import utilities as util
+from camstack.core.param_cache import cached_param
 
 from pyMilk.interfacing.isio_shmlib import SHM
 
@@ -184,35 +185,45 @@ class OCAM2K(EDTCamera):
     def gain_protection_reset(self) -> None:
         logg.warning('gain_protection_reset')
         self.send_command_parsed('protection reset')
+        self.param_cache.invalidate('gain')
 
     def set_gain(self, gain: int) -> int:
         res = self.send_command_parsed(f'gain {gain}')
         val = int(res[0])
+        self.param_cache.put('gain', val)
         self._set_formatted_keyword('DETGAIN', val)
         logg.info(f'set_gain: {val}')
         return val
 
     def get_gain(self) -> int:
-        res = self.send_command_parsed('gain')
-        val = int(res[0])
+        # Keywords out of the cached query: they're due on a fresh SHM too.
+        val = self._query_gain()
         self._set_formatted_keyword('DETGAIN', val)
         logg.info(f'get_gain: {val}')
         return val
 
+    @cached_param('gain')
+    def _query_gain(self) -> int:
+        return int(self.send_command_parsed('gain')[0])
+
     def set_synchro(self, val: bool) -> None:
         val = bool(val)
         self.send_command_parsed(f'synchro {("off","on")[val]}')
+        self.param_cache.invalidate('fps')
         self.synchro = val
         self._set_formatted_keyword('EXTTRIG', val)
         logg.info(f'set_synchro: {self.synchro}')
 
     def get_fps(self) -> float:
-        res = self.send_command_parsed('fps')
-        val = float(res[0])
+        val = self._query_fps()
         self._set_formatted_keyword('FRATE', val)
         logg.info(f'get_fps: {val}')
         return val
 
+    @cached_param('fps')
+    def _query_fps(self) -> float:
+        return float(self.send_command_parsed('fps')[0])
+
     def set_fps(self, fps: float) -> float:
         # 0 sets maxfps
         if self.synchro:
@@ -222,8 +233,10 @@ class OCAM2K(EDTCamera):
             val = float(res[0])
         else:  # Retcode + value
             logg.warning(f'set_fps failure {int(fps)} not accepted')
+            self.param_cache.invalidate('fps')
             return self.get_fps()
 
+        self.param_cache.put('fps', val)
         self._set_formatted_keyword('FRATE', val)
         logg.info(f'set_fps: {val}')
         return val
@@ -4,7 +4,9 @@ from types import TracebackType
 import typing as typ
 
 import os
+import contextlib
 import logging as logg
+from concurrent.futures import Future
 
 from camstack.cams.base import BaseCamera
 from camstack.core import utilities as util
@@ -46,9 +48,74 @@ class WrappingVerboseRLock:
         #print('exited.')
 
 
+# Layout of the _params_fb data array
+# The legacy protocol only uses PARAMS_FB_N_KEYS, the frame-independent handshake all of them.
+PARAMS_FB_N_KEYS = 0  # Number of keywords of the request
+PARAMS_FB_REQ_SEQ = 1  # Request sequence number, written by us
+PARAMS_FB_ACK_SEQ = 2  # Sequence number of the last request serviced, written by the taker
+PARAMS_FB_CAPS = 3  # Capability flags, advertised by the taker
+PARAMS_FB_SIZE = 4
+
+PARAMS_FB_CAP_SEQACK = 0x1  # Taker services requests out-of-band and acks them
+
+
+class ParamsFuture(Future):
+    '''
+        Result of a request to the params SHM.
+        result() sends the pending batch if it hasn't been yet - so it's safe to call
+        from within a batch(), at the price of an extra round trip.
+        Errors of futures created within a batch are raised when it exits.
+
+        Futures resolve - keywords set and then() functions called - in the thread
+        that made the request, on its next flush: its result() or batch exit.
+        If another thread waits on the future, it resolves it in its stead.
+    '''
+
+    def __init__(self, camera: ParamsSHMCamera,
+                 owner: typ.Optional[int] = None) -> None:
+        super().__init__()
+        self._camera = camera
+        # Thread that made the request
+        self.owner = threading.get_ident() if owner is None else owner
+        camera._prm_track(self)
+
+    def result(self, timeout: typ.Optional[float] = None) -> typ.Any:
+        if not self.done():
+            self._camera._prm_flush()
+        if not self.done() and self.owner != threading.get_ident():
+            # Flushed and handed over to the owner, who may never come for it.
+            self._camera._prm_deliver(self.owner)
+        return super().result(timeout)
+
+    def then(self, function: typ.Callable[[typ.Any], typ.Any]) -> ParamsFuture:
+        '''
+            Future of function(result), called as soon as the result is in.
+        '''
+        chained = ParamsFuture(self._camera, self.owner)
+
+        def callback(fut: Future) -> None:
+            try:
+                chained.set_result(function(fut.result()))
+            except Exception as exc:
+                chained.set_exception(exc)
+
+        self.add_done_callback(callback)
+        return chained
+
+
+class _PrmRequest(typ.NamedTuple):
+    values: typ.List[typ.Any]
+    fits_keys: typ.List[typ.Optional[str]]
+    api_keys: typ.List[int]
+    string_keys: typ.List[str]
+    future: ParamsFuture
+    owner: int  # Thread ident of the requester
+
+
 class ParamsSHMCamera(BaseCamera):
 
-    INTERACTIVE_SHELL_METHODS = [] + BaseCamera.INTERACTIVE_SHELL_METHODS
+    INTERACTIVE_SHELL_METHODS = ['get_params_stats'
+                                ] + BaseCamera.INTERACTIVE_SHELL_METHODS
 
     MODES = {}
 
@@ -62,6 +129,14 @@ class ParamsSHMCamera(BaseCamera):
     # encodes a "Invalid property" returned from the framegrab process
     PARAMS_SHM_INVALID_MAGIC = -8.0085
 
+    # Params SHM exchange timeouts - see _prm_exchange
+    PRM_TIMEOUT_BASE: float = 0.5  # sec.
+    PRM_TIMEOUT_MAX: float = 120.0  # sec.
+    PRM_ACK_EXPTIME_FACTOR: float = 1.0  # Taker may have to finish the current exposure
+    PRM_LEGACY_N_FRAMES: int = 3  # Frame-synchronous re-sync of the legacy protocol
+    PRM_RETRIES: int = 2
+    PRM_DELIVERY_TIMEOUT: float = 10.0  # sec. See _prm_deliver_stale
+
     def __init__(self, *args, **kwargs) -> None:
 
         # Do basic stuff
@@ -69,6 +144,24 @@ class ParamsSHMCamera(BaseCamera):
         # Need an RLock because during the set_camera_mode we eventually get to a _prm_setget_multivalue for fill_keywords.
         self.control_shm_lock = WrappingVerboseRLock()  #threading.RLock()
 
+        # Requests to the params SHM not sent yet - see _prm_submit
+        self._prm_pending: typ.List[_PrmRequest] = []
+        self._prm_pending_lock = threading.Lock()
+        self._prm_batch_local = threading.local()
+        # Exchanged requests of other threads: thread ident -> [(request, feedback, error, time)]
+        self._prm_delivered: typ.Dict[int, typ.List[typ.Tuple[
+                _PrmRequest, typ.Optional[typ.Dict[str, float]],
+                typ.Optional[Exception], float]]] = {}
+        self.params_stats = {
+                'requests': 0,
+                'exchanges': 0,
+                'keys': 0,
+                'retries': 0,
+                'legacy_exchanges': 0,
+        }
+        # [s] Exposure time, for the exchange timeouts. Kept up to date by subclass tint getters/setters.
+        self.prm_exptime_hint = 0.0
+
         super().__init__(*args, **kwargs)
 
     def init_framegrab_backend(self) -> None:
@@ -85,9 +178,12 @@ class ParamsSHMCamera(BaseCamera):
         # Try create a feedback SHM for parameters
         if self.control_shm is None:
             self.control_shm = SHM(self.STREAMNAME + "_params_fb",
-                                   np.zeros((1, ), dtype=np.int32))
+                                   np.zeros((PARAMS_FB_SIZE, ), dtype=np.int32))
 
     def set_camera_mode(self, mode_id: util.Typ_mode_id, **kwargs) -> None:
+        mode = self.MODES.get(mode_id)
+        if mode is not None and mode.tint is not None:
+            self.prm_exptime_hint = mode.tint
         # Wrap into something thread-safe during the restart.
         with self.control_shm_lock:
             return super().set_camera_mode(mode_id, **kwargs)
@@ -148,52 +244,277 @@ class ParamsSHMCamera(BaseCamera):
             dcam_keys: typ.List[int],
             getonly_flag: bool,
     ) -> typ.List[float]:
+        return self._prm_submit(values, fits_keys, dcam_keys,
+                                getonly_flag).result()
+
+    # Asynchronous flavors: return a ParamsFuture. Requests made within a batch()
+    # are sent together when the outermost batch exits.
+    def _prm_setvalue_async(self, value: typ.Any, fits_key: typ.Optional[str],
+                            api_cam_key: int) -> ParamsFuture:
+        return self._prm_submit([value], [fits_key], [api_cam_key],
+                                False).then(lambda res: res[0])
+
+    def _prm_getvalue_async(self, fits_key: typ.Optional[str],
+                            api_cam_key: int) -> ParamsFuture:
+        return self._prm_submit([0.0], [fits_key], [api_cam_key],
+                                True).then(lambda res: res[0])
+
+    def _prm_getmultivalue_async(
+            self, fits_keys: typ.List[typ.Optional[str]],
+            api_cam_keys: typ.List[int]) -> ParamsFuture:
+        return self._prm_submit([0.0] * len(fits_keys), fits_keys, api_cam_keys,
+                                True)
+
+    @contextlib.contextmanager
+    def batch(self) -> typ.Iterator[None]:
+        '''
+            All params SHM requests made within - by this thread - go in one exchange
+            with the grabber, sent on exit of the outermost batch.
+            Use the _prm_*_async methods inside, the synchronous ones force a send.
+        '''
+        depth = getattr(self._prm_batch_local, 'depth', 0)
+        if depth == 0:
+            self._prm_batch_local.futures = []
+        self._prm_batch_local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._prm_batch_local.depth = depth
+            if depth == 0:
+                futures, self._prm_batch_local.futures = \
+                        self._prm_batch_local.futures, []
+                self._prm_flush()
+        # Not raised over an exception from within the batch.
+        if depth == 0:
+            for fut in futures:
+                if fut.done() and fut.exception() is not None:
+                    raise fut.exception()  # type: ignore
+
+    def _prm_track(self, future: ParamsFuture) -> None:
+        if getattr(self._prm_batch_local, 'depth', 0) > 0:
+            self._prm_batch_local.futures += [future]
+
+    def _prm_submit(self, values: typ.List[typ.Any],
+                    fits_keys: typ.List[typ.Optional[str]],
+                    dcam_keys: typ.List[int],
+                    getonly_flag: bool) -> ParamsFuture:
+        '''
+            Queue a request. Its future resolves to the list of returned values,
+            after the fits keywords are set.
+
+            To perform set-gets and just gets with the same procedure... we leverage the hexmasks
+            All parameters (see Eprop in dcamprop.py) are 32 bit starting with 0x0
+            We set the first bit to 1 if it's a get.
+        '''
+        if getonly_flag:
+            dcam_string_keys = [
+                    f"{dcam_key | self.PARAMS_SHM_GET_MAGIC:08x}"
+                    for dcam_key in dcam_keys
+            ]
+        else:
+            dcam_string_keys = [f"{dcam_key:08x}" for dcam_key in dcam_keys]
+
+        request = _PrmRequest(list(values), list(fits_keys), list(dcam_keys),
+                              dcam_string_keys, ParamsFuture(self),
+                              threading.get_ident())
+        with self._prm_pending_lock:
+            self._prm_pending += [request]
+            self.params_stats['requests'] += 1
+        return request.future
+
+    def _prm_flush(self) -> None:
+        '''
+            Send all pending requests - from all threads.
+            Requests queued while we wait for the lock, during another exchange,
+            go with the next one: concurrent callers coalesce without any added delay.
+
+            Only our own requests are resolved here. Those of other threads are handed over
+            (see _prm_dispatch), so that their keywords go through their own keyword_transaction
+            and their callbacks run in their thread.
+            On return, all the requests of this thread made before the call are resolved:
+            whoever took them from the queue held the lock, and handed them over before
+            releasing it.
+        '''
+        with self.control_shm_lock:
+            with self._prm_pending_lock:
+                pending, self._prm_pending = self._prm_pending, []
+
+            while pending:
+                # Merge requests, up to the first one setting an already-set key differently.
+                merged: typ.Dict[str, typ.Any] = {}
+                n_merged = 0
+                for request in pending:
+                    if any(merged.get(sk, v) != v for sk, v in zip(
+                            request.string_keys, request.values)):
+                        break
+                    merged.update(zip(request.string_keys, request.values))
+                    n_merged += 1
+                chunk, pending = pending[:n_merged], pending[n_merged:]
+
+                try:
+                    fb = self._prm_exchange(merged)
+                except Exception as exc:
+                    for request in chunk:
+                        self._prm_dispatch(request, None, exc)
+                    continue
+
+                for request in chunk:  # In order: later keywords win.
+                    self._prm_dispatch(request, fb, None)
+
+        self._prm_deliver(threading.get_ident())
+        self._prm_deliver_stale()
+
+    def _prm_dispatch(self, request: _PrmRequest,
+                      fb: typ.Optional[typ.Dict[str, float]],
+                      error: typ.Optional[Exception]) -> None:
+        if request.owner == threading.get_ident():
+            self._prm_resolve(request, fb, error)
+        else:
+            with self._prm_pending_lock:
+                self._prm_delivered.setdefault(request.owner, []).append(
+                        (request, fb, error, time.monotonic()))
+
+    def _prm_deliver(self, owner: int) -> None:
+        '''
+            Resolve the requests of thread owner that another thread exchanged.
+        '''
+        with self._prm_pending_lock:
+            delivered = self._prm_delivered.pop(owner, [])
+        for request, fb, error, _ in delivered:
+            self._prm_resolve(request, fb, error)
+
+    def _prm_deliver_stale(self) -> None:
+        '''
+            Resolve in place what owners won't come for: requests of dead threads -
+            before another thread gets the same ident - and requests older than
+            PRM_DELIVERY_TIMEOUT, e.g. async requests nobody waits on.
+        '''
+        if not self._prm_delivered:
+            return
+        alive = {thread.ident for thread in threading.enumerate()}
+        t_expired = time.monotonic() - self.PRM_DELIVERY_TIMEOUT
+        with self._prm_pending_lock:
+            stale = [
+                    owner for owner, delivered in self._prm_delivered.items()
+                    if owner not in alive or delivered[0][3] < t_expired
+            ]
+        for owner in stale:
+            self._prm_deliver(owner)
+
+    def _prm_resolve(self, request: _PrmRequest,
+                     fb: typ.Optional[typ.Dict[str, float]],
+                     error: typ.Optional[Exception]) -> None:
+        if error is not None:
+            request.future.set_exception(error)
+            return
+        assert fb is not None
+        try:
+            request.future.set_result(self._prm_process_feedback(request, fb))
+        except Exception as exc:
+            request.future.set_exception(exc)
+
+    def _prm_exchange(self, keys_values: typ.Dict[str, typ.Any]
+                      ) -> typ.Dict[str, float]:
         """
-            Setter - implements a quick feedback between this code and dcamusbtake
+            One round trip with the taker.
+
+            If the taker advertises PARAMS_FB_CAP_SEQACK, it services requests out-of-band,
+            independently of frames: we write a new sequence number, and wait for the taker to
+            write it back as ack. Retried PRM_RETRIES times on timeout.
 
-            The C code overwrites the values of keywords
+            Otherwise, legacy protocol: the C code overwrites the values of keywords
             before posting the data anew.
             To avoid a race, we need to wait twice for a full loop
 
-            To perform set-gets and just gets with the same procedure... we leverage the hexmasks
-            All parameters (see Eprop in dcamprop.py) are 32 bit starting with 0x0
-            We set the first bit to 1 if it's a set.
+            Timeouts scale with the exposure time.
 
             #FIXME: DCAM would really only like to use float64.
             #FIXME: PVCAM is a little more flexible but mostly prefers uint64
         """
+        logg.debug(f"ParamsSHMCamera _prm_exchange: {keys_values}")
+        assert self.control_shm
+
+        with self.control_shm_lock:
+            self.control_shm.reset_keywords(keys_values)
+            data = self.control_shm.get_data()
+            if (data.size > PARAMS_FB_CAPS and
+                        data[PARAMS_FB_CAPS] & PARAMS_FB_CAP_SEQACK):
+                self._prm_handshake(len(keys_values))
+            else:
+                self._prm_frame_sync(len(keys_values))
+
+            fb_keywords = self.control_shm.get_keywords()  # Get back the cam values
+
+        self.params_stats['exchanges'] += 1
+        self.params_stats['keys'] += len(keys_values)
+
+        return {sk: fb_keywords[sk] for sk in keys_values}
 
-        logg.debug(
-                f"ParamsSHMCamera _prm_setgetmultivalue [getonly: {getonly_flag}]: {list(zip(fits_keys, values))}"
-        )
+    def _prm_reset_control_data(self, n_keywords: int) -> None:
+        '''
+            For the parameters injected before (re)starting the taker.
+            Clears sequence numbers and capabilities: the new taker advertises its own.
+        '''
         assert self.control_shm
+        data = np.zeros_like(self.control_shm.get_data())
+        data[PARAMS_FB_N_KEYS] = n_keywords
+        self.control_shm.set_data(data)
 
-        n_keywords = len(values)
+    def _prm_timeout(self, n_exposures: float) -> float:
+        return min(self.PRM_TIMEOUT_BASE + n_exposures * self.prm_exptime_hint,
+                   self.PRM_TIMEOUT_MAX)
 
-        if getonly_flag:
-            dcam_string_keys = [
-                    f"{dcam_key | self.PARAMS_SHM_GET_MAGIC:08x}"
-                    for dcam_key in dcam_keys
-            ]
-        else:
-            dcam_string_keys = [f"{dcam_key:08x}" for dcam_key in dcam_keys]
+    def _prm_frame_sync(self, n_keywords: int) -> None:
+        assert self.control_shm
 
-        with self.control_shm_lock:
-            self.control_shm.reset_keywords({
-                    dk: v
-                    for dk, v in zip(dcam_string_keys, values)
-            })
-            self.control_shm.set_data(self.control_shm.get_data() * 0 +
-                                      n_keywords)  # Toggle grabber process
-            self.control_shm.multi_recv_data(3, True,
-                                             timeout=1.0)  # Ensure re-sync
-
-            fb_values: typ.List[float] = [
-                    self.control_shm.get_keywords()[dk]
-                    for dk in dcam_string_keys
-            ]  # Get back the cam value
-
-        for idx, (fk, dcamk) in enumerate(zip(fits_keys, dcam_keys)):
+        self.params_stats['legacy_exchanges'] += 1
+        data = self.control_shm.get_data()
+        data[PARAMS_FB_N_KEYS] = n_keywords
+        self.control_shm.set_data(data)  # Toggle grabber process
+        self.control_shm.multi_recv_data(
+                self.PRM_LEGACY_N_FRAMES, True, timeout=max(
+                        1.0, self._prm_timeout(
+                                self.PRM_LEGACY_N_FRAMES)))  # Ensure re-sync
+
+    def _prm_handshake(self, n_keywords: int) -> None:
+        assert self.control_shm
+        shm = self.control_shm
+
+        data = shm.get_data()
+        seq = int(data[PARAMS_FB_ACK_SEQ]) % 0x7fff_ffff + 1
+        timeout = self._prm_timeout(self.PRM_ACK_EXPTIME_FACTOR)
+
+        for attempt in range(self.PRM_RETRIES + 1):
+            if attempt > 0:
+                self.params_stats['retries'] += 1
+                logg.warning(f'_prm_handshake: no ack for request {seq} '
+                             f'after {timeout:.2f} s - retrying.')
+            # Re-posting the same seq is harmless: the taker acks it at most once more.
+            data = shm.get_data()
+            if data[PARAMS_FB_ACK_SEQ] == seq:
+                return
+            data[PARAMS_FB_N_KEYS] = n_keywords
+            data[PARAMS_FB_REQ_SEQ] = seq
+            shm.set_data(data)  # Posts the taker
+
+            deadline = time.monotonic() + timeout
+            while True:
+                if shm.get_data()[PARAMS_FB_ACK_SEQ] == seq:
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                shm.IMAGE.semtimedwait(shm.semID, min(remaining, 0.1))
+
+        raise TimeoutError(f'{self.NAME}: params SHM request {seq} not acked '
+                           f'after {self.PRM_RETRIES + 1} x {timeout:.2f} s.')
+
+    def _prm_process_feedback(self, request: _PrmRequest,
+                              fb: typ.Dict[str, float]) -> typ.List[float]:
+        fb_values: typ.List[float] = [fb[sk] for sk in request.string_keys]
+
+        for idx, (fk, dcamk) in enumerate(zip(request.fits_keys,
+                                              request.api_keys)):
             if fk is not None:
                 # Can pass None to skip keys entirely.
                 fits_value = self._params_shm_return_raw_to_fits_val(
@@ -206,6 +527,12 @@ class ParamsSHMCamera(BaseCamera):
 
         return fb_values
 
+    def get_params_stats(self) -> typ.Dict[str, int]:
+        '''
+            Requests to, and actual round trips with, the params SHM.
+        '''
+        return dict(self.params_stats)
+
     def _params_shm_return_raw_to_fits_val(self, api_key: int, value: float):
         # This call is intended to be overriden by subclasses
         # So as to amend how the return values from the feeback SHM
@@ -218,52 +545,15 @@ class ParamsSHMCamera(BaseCamera):
         # are provided (think enums... se dcamcam)
         return value  # Nothing to do here
 
-    def auxiliary_thread_run_function(self) -> None:
+    def _auxiliary_lock(self) -> WrappingVerboseRLock:
         '''
-            I need to subclass this because we're having a freaking deadlock during the joining...
-            (in the base version)
+            We had a deadlock during the joining of the auxiliary thread...
             If the control_lock is requested by the main thread,
-            this ends up blocking on the control lock during poll_camera_for_keywords
+            the aux thread ends up blocking on the control lock during poll_camera_for_keywords
             Then the main thread requests a join... which is impossible because the aux thread is waiting
             on the lock.
 
-            So as a fix, we subclass the entire execution flow of the aux thread,
-            and make sure every single iteration is dependent
-            on owning the lock... non-blockingly! So we can loop-out and join.
+            So every auxiliary task is dependent on owning the lock... non-blockingly!
+            The scheduler retries later if the lock is busy, so we can loop-out and join.
         '''
-
-        assert self.event is not None  # mypy happy assert
-
-        event_count = 0
-        while True:
-            ret = self.event.wait(1)
-            if ret:  # Signal to break the loop
-                break
-
-            event_count += 1
-            if event_count % 10 > 0:
-                continue
-
-            if not self.control_shm_lock.acquire(blocking=False):
-                continue
-
-            try:
-                if not self.is_taker_running():
-                    logg.critical('take_tmux_pane contains no live PID.')
-
-                # Dependents cset + RTprio checking
-                for proc in self.dependent_processes:
-                    proc.make_children_rt()
-
-                # Camera specifics !
-                try:
-                    self.poll_camera_for_keywords()
-                except Exception as e:
-                    logg.error(f"Polling thread: error [{e}]")
-
-                try:
-                    self.redis_push_values()
-                except Exception as e:
-                    logg.error(f"Polling thread: error [{e}]")
-            finally:
-                self.control_shm_lock.release()
+        return self.control_shm_lock
@@ -0,0 +1,193 @@
+'''
+    Python stand-in for the params SHM (<stream>_params_fb) servicing of the C takers
+    (hwacq-dcamtake, pvcamtake) - to test and benchmark the ParamsSHMCamera protocols
+    without hardware, and without MILK: FakeParamsSHM is an in-process SHM.
+'''
+from __future__ import annotations
+
+import typing as typ
+
+import time
+import threading
+
+import numpy as np
+
+from camstack.cams.params_shm_backend import (ParamsSHMCamera, PARAMS_FB_SIZE,
+                                              PARAMS_FB_N_KEYS,
+                                              PARAMS_FB_REQ_SEQ,
+                                              PARAMS_FB_ACK_SEQ,
+                                              PARAMS_FB_CAPS,
+                                              PARAMS_FB_CAP_SEQACK)
+
+
+class _FakeImage:
+    '''
+        Stand-in for the ImageStreamIO handle: one semaphore per SHM handle.
+    '''
+
+    def __init__(self) -> None:
+        self._sem = threading.Semaphore(0)
+
+    def sempost(self, sem_id: int) -> None:
+        self._sem.release()
+
+    def semflush(self, sem_id: int) -> None:
+        while self._sem.acquire(blocking=False):
+            pass
+
+    def semtimedwait(self, sem_id: int, timeout: float) -> int:
+        return 0 if self._sem.acquire(timeout=timeout) else -1
+
+
+class FakeParamsSHM:
+    '''
+        Shared storage of an in-process params SHM: data array and keywords.
+        Every handle() has its own semaphore, that set_data posts - like pyMilk.
+    '''
+
+    def __init__(self, size: int = PARAMS_FB_SIZE) -> None:
+        self.data = np.zeros((size, ), dtype=np.int32)
+        self.keywords: typ.Dict[str, typ.Any] = {}
+        self.lock = threading.Lock()
+        self.handles: typ.List[FakeParamsSHMHandle] = []
+
+    def handle(self) -> FakeParamsSHMHandle:
+        handle = FakeParamsSHMHandle(self)
+        self.handles += [handle]
+        return handle
+
+
+class FakeParamsSHMHandle:
+    '''
+        The subset of the pyMilk SHM API that ParamsSHMCamera uses.
+    '''
+
+    semID = 0
+
+    def __init__(self, storage: FakeParamsSHM) -> None:
+        self.storage = storage
+        self.IMAGE = _FakeImage()
+
+    def get_data(self, *args, **kwargs) -> np.ndarray:
+        with self.storage.lock:
+            return self.storage.data.copy()
+
+    def set_data(self, data: np.ndarray) -> None:
+        with self.storage.lock:
+            self.storage.data[:] = data
+        self.post()
+
+    def post(self) -> None:
+        for handle in self.storage.handles:
+            handle.IMAGE.sempost(handle.semID)
+
+    def get_keywords(self, *args, **kwargs) -> typ.Dict[str, typ.Any]:
+        with self.storage.lock:
+            return dict(self.storage.keywords)
+
+    def reset_keywords(self, keywords: typ.Dict[str, typ.Any]) -> None:
+        with self.storage.lock:
+            self.storage.keywords = dict(keywords)
+
+    def set_keywords(self, keywords: typ.Dict[str, typ.Any]) -> None:
+        with self.storage.lock:
+            self.storage.keywords.update(keywords)
+
+    def check_sem_trywait(self) -> bool:
+        return self.IMAGE.semtimedwait(self.semID, 0.0) == 0
+
+    def multi_recv_data(self, n: int, outputFormat: bool,
+                        timeout: float) -> typ.List[np.ndarray]:
+        for _ in range(n):
+            self.IMAGE.semtimedwait(self.semID, timeout)
+        return [self.get_data()]
+
+
+class ParamsSHMStandInTaker:
+    '''
+        Services params SHM requests against a dict of property values {api key: value}.
+
+        seqack=True: advertises PARAMS_FB_CAP_SEQACK, and services requests as soon as posted,
+            acking their sequence number - after service_time (the camera API call).
+        seqack=False: legacy - services the pending request and posts the SHM once per
+            frame_period, like the acquisition loop of the C takers.
+        drop_acks: the first drop_acks requests are serviced but not acked, as if the
+            ack got lost - to exercise the retries of the client.
+    '''
+
+    GET_MAGIC = ParamsSHMCamera.PARAMS_SHM_GET_MAGIC
+    INVALID_MAGIC = ParamsSHMCamera.PARAMS_SHM_INVALID_MAGIC
+
+    def __init__(self, shm: FakeParamsSHMHandle, props: typ.Dict[int, float],
+                 frame_period: float, seqack: bool = True,
+                 service_time: float = 0.0, drop_acks: int = 0) -> None:
+        self.shm = shm
+        self.props = dict(props)
+        self.frame_period = frame_period
+        self.seqack = seqack
+        self.service_time = service_time
+        self.drop_acks = drop_acks
+
+        self.n_serviced = 0
+        self.n_dropped_acks = 0
+        self._event = threading.Event()
+        self._thread: typ.Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.seqack:
+            data = self.shm.get_data()
+            data[PARAMS_FB_CAPS] |= PARAMS_FB_CAP_SEQACK
+            self.shm.set_data(data)
+        self.shm.IMAGE.semflush(self.shm.semID)
+
+        self._event.clear()
+        self._thread = threading.Thread(
+                target=self._run_seqack if self.seqack else self._run_legacy,
+                daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _service(self) -> None:
+        time.sleep(self.service_time)
+        keywords = self.shm.get_keywords()
+        for string_key, value in keywords.items():
+            key = int(string_key, 16)
+            if key & self.GET_MAGIC:
+                keywords[string_key] = self.props.get(key & ~self.GET_MAGIC,
+                                                      self.INVALID_MAGIC)
+            else:
+                self.props[key] = value
+        self.shm.set_keywords(keywords)
+        self.n_serviced += 1
+
+    def _run_seqack(self) -> None:
+        # Out-of-band: wake up on the posts of the SHM, not on frames.
+        # Only on posts - a dropped ack is only serviced again once the client re-posts.
+        while not self._event.is_set():
+            if self.shm.IMAGE.semtimedwait(self.shm.semID, 0.1) != 0:
+                continue
+            data = self.shm.get_data()
+            if data[PARAMS_FB_REQ_SEQ] == data[PARAMS_FB_ACK_SEQ]:
+                continue
+            self._service()
+            if self.n_dropped_acks < self.drop_acks:
+                self.n_dropped_acks += 1
+                # Serviced, but the client doesn't hear of it: it'll re-post the same seq.
+                continue
+            data[PARAMS_FB_ACK_SEQ] = data[PARAMS_FB_REQ_SEQ]
+            self.shm.set_data(data)
+
+    def _run_legacy(self) -> None:
+        while not self._event.wait(self.frame_period):
+            data = self.shm.get_data()
+            if data[PARAMS_FB_N_KEYS] > 0:
+                self._service()
+                data[PARAMS_FB_N_KEYS] = 0
+                self.shm.set_data(data)
+            else:
+                self.shm.post()  # "New frame"
@@ -102,7 +102,7 @@ class PVCAMCamera(ParamsSHMCamera):
 
         # PARAMS for PVCAM are gonna be longs, not floats
         self.control_shm.reset_keywords(dump_params)
-        self.control_shm.set_data(self.control_shm.get_data() * 0 + len(params))
+        self._prm_reset_control_data(len(params))
 
     def _prepare_backend_cmdline(self, reuse_shm: bool = False) -> None:
 
@@ -185,11 +185,14 @@ class JensPrimeBSI(PVCAMCamera):
     def get_tint(self) -> float:
         val = self._prm_getvalue("EXPTIME", pvcam.PARAMMAGIC_EXP_TIME) / 1e6
         logg.info(f"get_tint {val}")
+        self.prm_exptime_hint = val
         return val
 
     def set_tint(self, tint: float) -> float:
+        self.prm_exptime_hint = max(self.prm_exptime_hint, tint)
         tint = self._prm_setvalue(int(tint * 1e6), "EXPTIME",
                                   pvcam.PARAMMAGIC_EXP_TIME) / 1e6
+        self.prm_exptime_hint = tint
         # update FRATE and EXPTIME
         return tint
 
@@ -9,6 +9,7 @@ from camstack.core import utilities as util
 from camstack.core.wcs import wcs_dict_init
 
 from .dcamcam import OrcaQuest
+from .params_shm_backend import ParamsFuture
 
 
 class BaseVCAM(OrcaQuest):
@@ -88,101 +89,114 @@ class BaseVCAM(OrcaQuest):
         super().set_readout_mode(mode)
         self._set_formatted_keyword("U_DETMOD", mode.upper())
 
+    def _get_readout_mode_async(self) -> ParamsFuture:
+
+        def set_detmod(mode: str) -> str:
+            self._set_formatted_keyword("U_DETMOD", mode.upper())
+            return mode
+
+        return super()._get_readout_mode_async().then(set_detmod)
+
     def get_readout_mode(self) -> str:
         mode = super().get_readout_mode()
+        # Also on cache hits, that don't go through _get_readout_mode_async
         self._set_formatted_keyword("U_DETMOD", mode.upper())
         return mode
 
     def _fill_keywords(self) -> None:
-        super()._fill_keywords()
-        cropped = self.current_mode_id != self.FULL
-        self._set_formatted_keyword("CROPPED", cropped)
+        # One params SHM round trip, see OrcaQuest._fill_keywords
+        with self.batch():
+            super()._fill_keywords()
+            cropped = self.current_mode_id != self.FULL
+            self._set_formatted_keyword("CROPPED", cropped)
 
-        self._set_formatted_keyword("F-RATIO", 21.3)
-        self._set_formatted_keyword("INST-PA", self.INST_PA)
-        self._set_formatted_keyword("U_DETMOD", self.get_readout_mode().upper())
+            self._set_formatted_keyword("F-RATIO", 21.3)
+            self._set_formatted_keyword("INST-PA", self.INST_PA)
+            self._get_readout_mode_async()  # Sets U_DETMOD
 
-        self.get_fps()
-        self.get_tint()
+            self._get_fps_async()
+            self._get_tint_async()
 
     def poll_camera_for_keywords(self) -> None:
-        super().poll_camera_for_keywords()
-
-        # Defaults
-        filter01 = bs = "Unknown"
-        dfl1 = dfl2 = "Open"
-        hwp_stage = 0
-        lp_stage = 0
-        scex_lp = 'Unknown'
-        lp_theta = imrang = imrpad = -1
-        qwp1 = qwp1th = -1
-        qwp2 = qwp2th = -1
-        retang1 = retpos1 = -1
-        retang2 = retpos2 = -1
-        pupil_lens = "Unknown"
-        try:
-            with self.RDB.pipeline() as pipe:
-                pipe.hget('U_FILTER', 'value')
-                pipe.hget('U_BS', 'value')
-                pipe.hget('P_STGPS1', 'value')
-                pipe.hget('P_STGPS2', 'value')
-                pipe.hget('X_POLAR', 'value')
-                pipe.hget('X_POLARP', 'value')
-                pipe.hget('D_IMRANG', 'value')
-                pipe.hget('D_IMRPAD', 'value')
-                pipe.hget('U_DIFFL1', 'value')
-                pipe.hget('U_DIFFL2', 'value')
-                pipe.hget("U_QWP1", "value")
-                pipe.hget("U_QWP1TH", "value")
-                pipe.hget("U_QWP2", "value")
-                pipe.hget("U_QWP2TH", "value")
-                pipe.hget("RET-ANG1", "value")
-                pipe.hget("RET-ANG2", "value")
-                pipe.hget("RET-POS1", "value")
-                pipe.hget("RET-POS2", "value")
-                pipe.hget("U_PUPST", "value")
-                filter01, bs, lp_stage, hwp_stage, scex_lp, lp_theta, imrang, imrpad, dfl1, dfl2, qwp1, qwp1th, qwp2, qwp2th, retang1, retang2, retpos1, retpos2, pupil_lens = pipe.execute(
-                )
-        except Exception:
-            logg.exception(
-                    'REDIS unavailable @ poll_camera_for_keywords @ BaseVCAM')
-
-        self._set_formatted_keyword('FILTER01', filter01)
-        self._set_formatted_keyword("X_POLARP", lp_theta)
-        self._set_formatted_keyword("D_IMRANG", imrang)
-        self._set_formatted_keyword("D_IMRPAD", imrpad)
-        self._set_formatted_keyword("U_QWP1", qwp1)
-        self._set_formatted_keyword("U_QWP1TH", qwp1th)
-        self._set_formatted_keyword("U_QWP2", qwp2)
-        self._set_formatted_keyword("U_QWP2TH", qwp2th)
-        self._set_formatted_keyword("RET-ANG1", retang1)
-        self._set_formatted_keyword("RET-ANG2", retang2)
-        self._set_formatted_keyword("RET-POS1", retpos1)
-        self._set_formatted_keyword("RET-POS2", retpos2)
-        ## determine observing mode from the following logic
-        # if the PBS is in and the HWP is running, we're doing polarimetry
-        polarimetry = bs.upper() == "PBS" and \
-                      (np.abs(hwp_stage - 56) < 1 or \
-                       np.abs(lp_stage - 55.2) < 1 or \
-                       np.abs(lp_stage - 90) < 1 or
-                       scex_lp.strip().upper() == "IN")
-        base_mode = "IPOL" if polarimetry else "IMAG"
-        # Determine whether in standard mode, SDI mode, or MBI/r mode
-        nonsdi_flts = ("UNKNOWN", "OPEN", "BLOCK")
-        sdi = dfl1.upper() not in nonsdi_flts and dfl2.upper() not in nonsdi_flts
-        if sdi:
-            obs_mod = f"{base_mode}_SDI"
-        elif self.current_mode_id == "MBI":
-            obs_mod = f"{base_mode}_MBI"
-        elif self.current_mode_id == "MBI_REDUCED":
-            obs_mod = f"{base_mode}_MBIR"
-        elif pupil_lens.strip().upper() == "IN":
-            obs_mod = f"{base_mode}_PUP"
-        else:
-            obs_mod = base_mode
-
-        self._set_formatted_keyword('OBS-MOD', obs_mod)
-        self._fill_wcs_keywords(obs_mod)
+        # The temperature get goes to the grabber once we're done with redis.
+        with self.batch():
+            super().poll_camera_for_keywords()
+
+            # Defaults
+            filter01 = bs = "Unknown"
+            dfl1 = dfl2 = "Open"
+            hwp_stage = 0
+            lp_stage = 0
+            scex_lp = 'Unknown'
+            lp_theta = imrang = imrpad = -1
+            qwp1 = qwp1th = -1
+            qwp2 = qwp2th = -1
+            retang1 = retpos1 = -1
+            retang2 = retpos2 = -1
+            pupil_lens = "Unknown"
+            try:
+                with self.RDB.pipeline() as pipe:
+                    pipe.hget('U_FILTER', 'value')
+                    pipe.hget('U_BS', 'value')
+                    pipe.hget('P_STGPS1', 'value')
+                    pipe.hget('P_STGPS2', 'value')
+                    pipe.hget('X_POLAR', 'value')
+                    pipe.hget('X_POLARP', 'value')
+                    pipe.hget('D_IMRANG', 'value')
+                    pipe.hget('D_IMRPAD', 'value')
+                    pipe.hget('U_DIFFL1', 'value')
+                    pipe.hget('U_DIFFL2', 'value')
+                    pipe.hget("U_QWP1", "value")
+                    pipe.hget("U_QWP1TH", "value")
+                    pipe.hget("U_QWP2", "value")
+                    pipe.hget("U_QWP2TH", "value")
+                    pipe.hget("RET-ANG1", "value")
+                    pipe.hget("RET-ANG2", "value")
+                    pipe.hget("RET-POS1", "value")
+                    pipe.hget("RET-POS2", "value")
+                    pipe.hget("U_PUPST", "value")
+                    filter01, bs, lp_stage, hwp_stage, scex_lp, lp_theta, imrang, imrpad, dfl1, dfl2, qwp1, qwp1th, qwp2, qwp2th, retang1, retang2, retpos1, retpos2, pupil_lens = pipe.execute(
+                    )
+            except Exception:
+                logg.exception(
+                        'REDIS unavailable @ poll_camera_for_keywords @ BaseVCAM')
+
+            self._set_formatted_keyword('FILTER01', filter01)
+            self._set_formatted_keyword("X_POLARP", lp_theta)
+            self._set_formatted_keyword("D_IMRANG", imrang)
+            self._set_formatted_keyword("D_IMRPAD", imrpad)
+            self._set_formatted_keyword("U_QWP1", qwp1)
+            self._set_formatted_keyword("U_QWP1TH", qwp1th)
+            self._set_formatted_keyword("U_QWP2", qwp2)
+            self._set_formatted_keyword("U_QWP2TH", qwp2th)
+            self._set_formatted_keyword("RET-ANG1", retang1)
+            self._set_formatted_keyword("RET-ANG2", retang2)
+            self._set_formatted_keyword("RET-POS1", retpos1)
+            self._set_formatted_keyword("RET-POS2", retpos2)
+            ## determine observing mode from the following logic
+            # if the PBS is in and the HWP is running, we're doing polarimetry
+            polarimetry = bs.upper() == "PBS" and \
+                          (np.abs(hwp_stage - 56) < 1 or \
+                           np.abs(lp_stage - 55.2) < 1 or \
+                           np.abs(lp_stage - 90) < 1 or
+                           scex_lp.strip().upper() == "IN")
+            base_mode = "IPOL" if polarimetry else "IMAG"
+            # Determine whether in standard mode, SDI mode, or MBI/r mode
+            nonsdi_flts = ("UNKNOWN", "OPEN", "BLOCK")
+            sdi = dfl1.upper() not in nonsdi_flts and dfl2.upper() not in nonsdi_flts
+            if sdi:
+                obs_mod = f"{base_mode}_SDI"
+            elif self.current_mode_id == "MBI":
+                obs_mod = f"{base_mode}_MBI"
+            elif self.current_mode_id == "MBI_REDUCED":
+                obs_mod = f"{base_mode}_MBIR"
+            elif pupil_lens.strip().upper() == "IN":
+                obs_mod = f"{base_mode}_PUP"
+            else:
+                obs_mod = base_mode
+
+            self._set_formatted_keyword('OBS-MOD', obs_mod)
+            self._fill_wcs_keywords(obs_mod)
 
     def _fill_wcs_keywords(self, obs_mod):
         # Hotspot of physical detector in the current crop coordinates.
@@ -270,15 +284,17 @@ class VCAM1(BaseVCAM):
     REDIS_PREFIX = "u_V"  # LOWERCASE x to not get mixed with the SCExAO keys
 
     def _fill_keywords(self) -> None:
-        super()._fill_keywords()
+        with self.batch():
+            super()._fill_keywords()
 
-        # Override detector name
-        self._set_formatted_keyword("DETECTOR", "VCAM1 - OrcaQ")
-        self._set_formatted_keyword("U_CAMERA", 1)
+            # Override detector name
+            self._set_formatted_keyword("DETECTOR", "VCAM1 - OrcaQ")
+            self._set_formatted_keyword("U_CAMERA", 1)
 
-        # Override detector specs from calibration data
-        ro_mode = self.get_readout_mode()
-        self._set_formatted_keyword("GAIN", self.GAINS[ro_mode])
+            # Override detector specs from calibration data
+            self._get_readout_mode_async().then(
+                    lambda ro_mode: self._set_formatted_keyword(
+                            "GAIN", self.GAINS[ro_mode]))
 
     def poll_camera_for_keywords(self) -> None:
         super().poll_camera_for_keywords()
@@ -325,15 +341,17 @@ class VCAM2(BaseVCAM):
     REDIS_PREFIX = "u_W"  # LOWERCASE x to not get mixed with the SCExAO keys
 
     def _fill_keywords(self) -> None:
-        super()._fill_keywords()
+        with self.batch():
+            super()._fill_keywords()
 
-        # Override detector name
-        self._set_formatted_keyword("DETECTOR", "VCAM2 - OrcaQ")
-        self._set_formatted_keyword("U_CAMERA", 2)
+            # Override detector name
+            self._set_formatted_keyword("DETECTOR", "VCAM2 - OrcaQ")
+            self._set_formatted_keyword("U_CAMERA", 2)
 
-        # Override detector specs from calibration data
-        ro_mode = self.get_readout_mode()
-        self._set_formatted_keyword("GAIN", self.GAINS[ro_mode])
+            # Override detector specs from calibration data
+            self._get_readout_mode_async().then(
+                    lambda ro_mode: self._set_formatted_keyword(
+                            "GAIN", self.GAINS[ro_mode]))
 
     def poll_camera_for_keywords(self) -> None:
         super().poll_camera_for_keywords()
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import typing as typ
+
+import time
+import functools
+import threading
+
+T = typ.TypeVar('T')
+
+
+class ParamCache:
+    '''
+        Time-to-live cache of camera parameter values (fps, tint, gain...), by name.
+
+        Getters return the cached value if it is younger than ttl, otherwise they
+        query the camera and store the result.
+        Setters store the value the camera echoed back - or invalidate, if they don't
+        know it, so that the next get reads it back.
+        Anything that may change several parameters under our feet (mode change,
+        taker restart, readout mode change) invalidates everything.
+
+        ttl <= 0 disables the cache: every get is a miss.
+    '''
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._values: typ.Dict[str, typ.Tuple[float, typ.Any]] = {}
+        # Per name, the clock of its last put / invalidate: a query that started before
+        # an update of its name must not overwrite it with its older result.
+        # Updates of other names don't concern it - but invalidating everything does.
+        self._clock = 0
+        self._epochs: typ.Dict[str, int] = {}
+        self._epoch_all = 0
+
+        self.stats = {
+                'hits': 0,
+                'misses': 0,
+                'invalidations': 0,
+        }
+
+    def epoch(self, name: str) -> int:
+        return max(self._epochs.get(name, 0), self._epoch_all)
+
+    def get(self, name: str) -> typ.Optional[typ.Any]:
+        '''
+            Cached value, or None if absent or expired.
+        '''
+        with self._lock:
+            entry = self._values.get(name)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self.stats['hits'] += 1
+                return entry[1]
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, name: str, value: T, since: typ.Optional[int] = None) -> T:
+        '''
+            Store value, and return it.
+            since: epoch at which the query for value started. If the cache was
+                updated since, value is stale and dropped.
+        '''
+        with self._lock:
+            if since is None or since == self.epoch(name):
+                self._values[name] = (time.monotonic(), value)
+                self._clock += 1
+                self._epochs[name] = self._clock
+        return value
+
+    def invalidate(self, *names: str) -> None:
+        '''
+            Drop names - everything if none given.
+        '''
+        with self._lock:
+            self._clock += 1
+            if names:
+                for name in names:
+                    self._values.pop(name, None)
+                    self._epochs[name] = self._clock
+            else:
+                self._values.clear()
+                self._epochs.clear()
+                self._epoch_all = self._clock
+            self.stats['invalidations'] += 1
+
+    def fetch(self, name: str, query: typ.Callable[[], T]) -> T:
+        '''
+            Cached value of name, or query() - stored.
+        '''
+        value = self.get(name)
+        if value is not None:
+            return value
+        since = self.epoch(name)
+        return self.put(name, query(), since)
+
+    def get_stats(self) -> typ.Dict[str, int]:
+        return dict(self.stats)
+
+
+def cached_param(name: str) -> typ.Callable[[typ.Callable[..., T]],
+                                            typ.Callable[..., T]]:
+    '''
+        Decorator for argument-less getters of objects that have a param_cache:
+
+            @cached_param('fps')
+            def _query_fps(self) -> float:
+                ...  # Actual query
+
+        Side effects - e.g. keyword writes - are skipped on hits: keep them in an
+        undecorated public getter around the cached query.
+    '''
+
+    def decorator(getter: typ.Callable[..., T]) -> typ.Callable[..., T]:
+
+        @functools.wraps(getter)
+        def wrapper(self) -> T:
+            return self.param_cache.fetch(name, lambda: getter(self))
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import typing as typ
+
+import os
+import time
+import logging as logg
+
+if typ.TYPE_CHECKING:
+    from camstack.core.utilities import DependentProcess
+
+from camstack.core import tmux, remote
+
+
+class Probe:
+    '''
+    A condition on a dependent process, polled by wait_for_probes.
+    arm() is called once before polling starts (e.g. right before sending the command line).
+    '''
+
+    def arm(self, proc: DependentProcess) -> None:
+        pass
+
+    def check(self, proc: DependentProcess) -> bool:
+        raise NotImplementedError("Must be subclassed from the base class")
+
+    def __repr__(self) -> str:
+        return self.__class__.__name__
+
+
+class PIDProbe(Probe):
+    '''
+    Something is running in the tmux pane.
+    '''
+
+    def check(self, proc: DependentProcess) -> bool:
+        return proc.get_pid() is not None
+
+
+class PIDGoneProbe(Probe):
+    '''
+    Nothing is running in the tmux pane anymore: kill completed.
+    '''
+
+    def check(self, proc: DependentProcess) -> bool:
+        return proc.get_pid() is None
+
+
+class SHMFileProbe(Probe):
+    '''
+    The SHM file of a stream exists - and was (re-)created after arm().
+    '''
+
+    def __init__(self, stream_name: str) -> None:
+        self.stream_name = stream_name
+        self._armed_mtime: typ.Optional[float] = None
+
+    def _path(self) -> str:
+        return f"{os.environ['MILK_SHM_DIR']}/{self.stream_name}.im.shm"
+
+    def _mtime(self) -> typ.Optional[float]:
+        try:
+            return os.stat(self._path()).st_mtime
+        except OSError:
+            return None
+
+    def arm(self, proc: DependentProcess) -> None:
+        self._armed_mtime = self._mtime()
+
+    def check(self, proc: DependentProcess) -> bool:
+        mtime = self._mtime()
+        return mtime is not None and mtime != self._armed_mtime
+
+    def __repr__(self) -> str:
+        return f'SHMFileProbe({self.stream_name})'
+
+
+class SHMFrameProbe(Probe):
+    '''
+    A frame was posted to the stream (its counter moved) since arm().
+    '''
+
+    def __init__(self, stream_name: str) -> None:
+        self.stream_name = stream_name
+        self._armed_cnt: typ.Optional[int] = None
+
+    def _cnt0(self) -> typ.Optional[int]:
+        from pyMilk.interfacing.isio_shmlib import SHM
+        try:
+            return SHM(self.stream_name, symcode=0).IMAGE.md.cnt0
+        except Exception:  # Does not exist (yet), or being re-created.
+            return None
+
+    def arm(self, proc: DependentProcess) -> None:
+        self._armed_cnt = self._cnt0()
+
+    def check(self, proc: DependentProcess) -> bool:
+        cnt = self._cnt0()
+        return cnt is not None and cnt != self._armed_cnt
+
+    def __repr__(self) -> str:
+        return f'SHMFrameProbe({self.stream_name})'
+
+
+PROC_NET_TCP = ('/proc/net/tcp', '/proc/net/tcp6')
+
+
+def _parse_listening_ports(proc_net_tcp: str) -> typ.Set[int]:
+    ports = set()
+    for line in proc_net_tcp.splitlines():
+        fields = line.split()
+        if len(fields) > 3 and fields[3] == '0A':  # LISTEN
+            ports.add(int(fields[1].rsplit(':', 1)[1], 16))
+    return ports
+
+
+def _tcp_listening_ports(host: typ.Optional[str] = None) -> typ.Set[int]:
+    if host is not None:
+        res = remote.get_executor().run(host,
+                                        'cat ' + ' '.join(PROC_NET_TCP))
+        return _parse_listening_ports(res.stdout.decode('utf8'))
+
+    ports = set()
+    for fname in PROC_NET_TCP:
+        try:
+            with open(fname) as f:
+                ports |= _parse_listening_ports(f.read())
+        except OSError:
+            pass
+    return ports
+
+
+class TCPListenProbe(Probe):
+    '''
+    A socket is listening on port, locally or on host (see remote.get_executor).
+    Read from /proc/net - we do NOT connect, that would be an actual client to e.g. shmimTCPreceive.
+    '''
+
+    def __init__(self, port: int, host: typ.Optional[str] = None) -> None:
+        self.port = port
+        self.host = host
+
+    def check(self, proc: DependentProcess) -> bool:
+        return self.port in _tcp_listening_ports(self.host)
+
+    def __repr__(self) -> str:
+        return f'TCPListenProbe({self.port}, {self.host})'
+
+
+class TmuxSettledProbe(Probe):
+    '''
+    The pane's shell has been up long enough to have sourced its bashrc/profile -
+    which we MUST NOT interrupt. Immediate for panes that already existed.
+    '''
+
+    def __init__(self, settle_time: float = 3.0) -> None:
+        self.settle_time = settle_time
+
+    def check(self, proc: DependentProcess) -> bool:
+        assert proc.tmux_pane is not None
+        try:
+            return tmux.pane_age(proc.tmux_pane) >= self.settle_time
+        except Exception:  # Can't tell: do as we used to.
+            time.sleep(self.settle_time)
+            return True
+
+
+PROBE_POLL_INTERVAL = 0.1  # sec.
+
+
+def wait_for_probes(waits: typ.Iterable[typ.Tuple[DependentProcess,
+                                                  typ.List[Probe]]],
+                    timeout: float,
+                    interval: float = PROBE_POLL_INTERVAL,
+                    log_failures: bool = True) -> bool:
+    '''
+    Poll all probes of all processes, until all pass or timeout.
+    Probes that passed are not polled again.
+    Returns True if everything passed, False otherwise (and logs the laggards, if log_failures).
+    '''
+    pending = [(proc, probe) for proc, probes in waits for probe in probes]
+
+    t_end = time.monotonic() + timeout
+    while True:
+        pending = [(proc, probe)
+                   for proc, probe in pending
+                   if not probe.check(proc)]
+        if len(pending) == 0:
+            return True
+        if time.monotonic() >= t_end:
+            break
+        time.sleep(interval)
+
+    if not log_failures:
+        return False
+    for proc, probe in pending:
+        logg.warning(f'wait_for_probes: {proc.tmux_name} - {probe!r} not '
+                     f'passed after {timeout:.1f} s.')
+    return False
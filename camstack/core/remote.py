@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import typing as typ
+
+import os
+import shlex
+import threading
+import subprocess
+import logging as logg
+
+
+def tmux_command_string(commands: typ.Sequence[typ.Sequence[str]]) -> str:
+    '''
+        [['send-keys', '-t', 'sess', 'ls', 'Enter'], ['list-panes', ...]] ->
+        "tmux send-keys -t sess ls Enter \\; list-panes ..."
+        Several tmux commands in one tmux client - hence in one round trip.
+        Every argument is shell-quoted: it reaches tmux verbatim.
+    '''
+    return 'tmux ' + ' \\; '.join(
+            ' '.join(shlex.quote(arg) for arg in command)
+            for command in commands)
+
+
+class RemoteExecutor:
+    '''
+        Runs shell command lines on remote hosts.
+        run() must be implemented by subclasses; it must be thread safe.
+    '''
+
+    def run(self, host: str, command: str,
+            check: bool = False) -> subprocess.CompletedProcess[bytes]:
+        raise NotImplementedError("Must be subclassed from the base class")
+
+    def tmux(self, host: str, commands: typ.Sequence[typ.Sequence[str]],
+             check: bool = False) -> subprocess.CompletedProcess[bytes]:
+        '''
+            Run a batch of tmux commands in one round trip.
+            tmux stops at the first failing command.
+        '''
+        return self.run(host, tmux_command_string(commands), check=check)
+
+    def close(self) -> None:
+        pass
+
+    def get_stats(self) -> typ.Dict[str, typ.Dict[str, int]]:
+        return {}
+
+
+class SSHExecutor(RemoteExecutor):
+    '''
+        One persistent, multiplexed ssh connection per host (OpenSSH ControlMaster),
+        shared by all commands - and threads - instead of a full TCP + ssh handshake
+        per command.
+
+        The master connection is opened by the first command to a host (ControlMaster=auto),
+        and lingers CONTROL_PERSIST seconds after the last one. Commands are not
+        serialized, and cost a single ssh fork.
+        Only if the connection broke (ssh exits with 255), the master is torn down and
+        the command retried once on a new connection.
+    '''
+
+    CONTROL_PERSIST = 600  # sec.
+    CONNECT_TIMEOUT = 5  # sec.
+    SSH_ERROR = 255  # ssh's own exit code on connection errors
+
+    def __init__(self, control_dir: typ.Optional[str] = None) -> None:
+        if control_dir is None:
+            control_dir = f'/tmp/camstack-ssh-{os.getuid()}'
+        os.makedirs(control_dir, mode=0o700, exist_ok=True)
+        self.control_dir = control_dir
+
+        self._lock = threading.Lock()
+        self._host_locks: typ.Dict[str, threading.Lock] = {}
+        self._stats: typ.Dict[str, typ.Dict[str, int]] = {}
+
+    def _ssh_options(self) -> typ.List[str]:
+        # %C: hash of local host, remote host, port and user - stays short.
+        return [
+                '-o', f'ControlPath={self.control_dir}/%C', '-o',
+                'ControlMaster=auto', '-o',
+                f'ControlPersist={self.CONTROL_PERSIST}', '-o',
+                f'ConnectTimeout={self.CONNECT_TIMEOUT}', '-o', 'BatchMode=yes'
+        ]
+
+    def _host_lock(self, host: str) -> threading.Lock:
+        with self._lock:
+            if host not in self._host_locks:
+                self._host_locks[host] = threading.Lock()
+                self._stats[host] = {
+                        'calls': 0,
+                        'connects': 0,
+                        'reconnects': 0
+                }
+            return self._host_locks[host]
+
+    def is_connected(self, host: str) -> bool:
+        res = subprocess.run(['ssh'] + self._ssh_options() +
+                             ['-O', 'check', host], stdout=subprocess.DEVNULL,
+                             stderr=subprocess.DEVNULL)
+        return res.returncode == 0
+
+    def connect(self, host: str) -> None:
+        '''
+            Open the master connection to host, unless it's up.
+            Not needed before commands - ControlMaster=auto opens it with the first one -
+            only to re-establish a broken master.
+        '''
+        with self._host_lock(host):
+            self._connect(host)
+
+    def _connect(self, host: str) -> None:
+        # Under the host lock
+        if self.is_connected(host):
+            return
+        # -f: backgrounds once authenticated, -N: no command.
+        subprocess.run(['ssh'] + self._ssh_options() +
+                       ['-o', 'ControlMaster=yes', '-fN', host],
+                       stdout=subprocess.DEVNULL)
+        self._stats[host]['connects'] += 1
+
+    def _reconnect(self, host: str) -> None:
+        '''
+            After a connection error. Serialized per host: the threads that failed on the
+            same broken master re-establish it once.
+        '''
+        with self._host_lock(host):
+            if self.is_connected(host):  # Someone else did it already.
+                return
+            self._stats[host]['reconnects'] += 1
+            self.disconnect(host)
+            self._connect(host)
+
+    def disconnect(self, host: str) -> None:
+        subprocess.run(['ssh'] + self._ssh_options() + ['-O', 'exit', host],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def run(self, host: str, command: str,
+            check: bool = False) -> subprocess.CompletedProcess[bytes]:
+        # No lock and no master check: one ssh fork per command, multiplexed
+        # by ControlMaster=auto.
+        self._host_lock(host)  # Registers host, for the stats
+        self._stats[host]['calls'] += 1
+
+        argv = ['ssh'] + self._ssh_options() + [host, command]
+        res = subprocess.run(argv, stdout=subprocess.PIPE)
+        if res.returncode == self.SSH_ERROR:
+            logg.warning(f'SSHExecutor: connection to {host} failed - '
+                         'reconnecting.')
+            self._reconnect(host)
+            res = subprocess.run(argv, stdout=subprocess.PIPE)
+
+        if check:
+            res.check_returncode()
+        return res
+
+    def close(self) -> None:
+        for host in list(self._host_locks):
+            self.disconnect(host)
+
+    def get_stats(self) -> typ.Dict[str, typ.Dict[str, int]]:
+        return {host: dict(stats) for host, stats in self._stats.items()}
+
+
+class LocalExecutor(RemoteExecutor):
+    '''
+        Fake executor: runs the "remote" commands on this machine, and records them.
+        Lets RemotePanePatch / RemoteDependentProcess be exercised without any remote host.
+    '''
+
+    def __init__(self) -> None:
+        self.calls: typ.List[typ.Tuple[str, str]] = []
+        self._lock = threading.Lock()
+
+    def run(self, host: str, command: str,
+            check: bool = False) -> subprocess.CompletedProcess[bytes]:
+        with self._lock:
+            self.calls += [(host, command)]
+        return subprocess.run(['bash', '-c', command], stdout=subprocess.PIPE,
+                              check=check)
+
+    def get_stats(self) -> typ.Dict[str, typ.Dict[str, int]]:
+        stats: typ.Dict[str, typ.Dict[str, int]] = {}
+        for host, _ in list(self.calls):
+            stats.setdefault(host, {'calls': 0})['calls'] += 1
+        return stats
+
+
+_EXECUTOR: typ.Optional[RemoteExecutor] = None
+
+
+def get_executor() -> RemoteExecutor:
+    '''
+        The process-wide executor: an SSHExecutor, or a LocalExecutor if
+        CAMSTACK_REMOTE_EXECUTOR=local (testing).
+    '''
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        if os.environ.get('CAMSTACK_REMOTE_EXECUTOR', default=None) == 'local':
+            _EXECUTOR = LocalExecutor()
+        else:
+            _EXECUTOR = SSHExecutor()
+    return _EXECUTOR
+
+
+def set_executor(executor: RemoteExecutor) -> None:
+    global _EXECUTOR
+    _EXECUTOR = executor
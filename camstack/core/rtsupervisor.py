@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import typing as typ
+
+import os
+import subprocess
+import logging as logg
+
+# Where cset / cgroup v1 mounts the cpusets, or cgroup v2.
+CPUSET_ROOTS = ('/sys/fs/cgroup/cpuset', '/dev/cpuset', '/cpusets',
+                '/sys/fs/cgroup')
+
+
+def parse_cpu_list(cpu_list: str) -> typ.Set[int]:
+    '''
+    '0-3,8,10-11' -> {0, 1, 2, 3, 8, 10, 11}
+    '''
+    cpus: typ.Set[int] = set()
+    for chunk in cpu_list.strip().split(','):
+        if not chunk:
+            continue
+        if '-' in chunk:
+            lo, hi = chunk.split('-')
+            cpus.update(range(int(lo), int(hi) + 1))
+        else:
+            cpus.add(int(chunk))
+    return cpus
+
+
+def cpuset_cpus(cset: str) -> typ.Optional[typ.Set[int]]:
+    '''
+    CPUs of a cpuset, None if it can't be found.
+    '''
+    for root in CPUSET_ROOTS:
+        for fname in ('cpuset.cpus', 'cpus'):
+            try:
+                with open(f'{root}/{cset}/{fname}') as f:
+                    return parse_cpu_list(f.read())
+            except OSError:
+                pass
+    return None
+
+
+def proc_threads(pid: int) -> typ.List[int]:
+    try:
+        return [int(tid) for tid in os.listdir(f'/proc/{pid}/task')]
+    except OSError:  # Gone
+        return []
+
+
+def proc_start_time(pid: int) -> typ.Optional[int]:
+    '''
+    Start time of a process (clock ticks since boot) - tells a PID from its reuse.
+    '''
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # comm (2nd field) may contain spaces or parentheses: split after the last ')'
+    return int(stat[stat.rindex(')') + 2:].split()[19])
+
+
+def _children_from_task_files(pid: int) -> typ.Optional[typ.List[int]]:
+    # Requires CONFIG_PROC_CHILDREN. Children are listed under the thread that forked them.
+    children = []
+    for tid in proc_threads(pid):
+        try:
+            with open(f'/proc/{pid}/task/{tid}/children') as f:
+                children += [int(c) for c in f.read().split()]
+        except FileNotFoundError:
+            return None
+        except OSError:
+            pass
+    return children
+
+
+def _children_map() -> typ.Dict[int, typ.List[int]]:
+    '''
+    ppid -> [pids], from one pass over /proc/*/stat.
+    '''
+    cmap: typ.Dict[int, typ.List[int]] = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        ppid = int(stat[stat.rindex(')') + 2:].split()[1])
+        cmap.setdefault(ppid, []).append(int(entry))
+    return cmap
+
+
+def proc_children(pid: int) -> typ.List[int]:
+    '''
+    Direct children of pid, from /proc - no pgrep.
+    '''
+    children = _children_from_task_files(pid)
+    if children is None:  # No children files on this kernel
+        children = _children_map().get(pid, [])
+    return children
+
+
+def proc_tree(pid: int) -> typ.List[int]:
+    '''
+    pid and all its descendants, from /proc - no pgrep.
+    '''
+    tree = [pid]
+    cmap: typ.Optional[typ.Dict[int, typ.List[int]]] = None
+    idx = 0
+    while idx < len(tree):
+        parent = tree[idx]
+        idx += 1
+        children = None
+        if cmap is None:
+            children = _children_from_task_files(parent)
+            if children is None:  # No children files on this kernel
+                cmap = _children_map()
+        if cmap is not None:
+            children = cmap.get(parent, [])
+        assert children is not None  # mypy
+        tree += children
+    return tree
+
+
+class RTSupervisor:
+    '''
+    Places process trees in a cpuset at a SCHED_FIFO priority.
+    Replaces `pgrep -P` + `milk-makecsetandrt` for every process on every polling cycle:
+        - the tree and threads are read from /proc,
+        - processes already placed are remembered (by PID + start time) and only re-checked
+          with a syscall,
+        - placement is native (cpuset tasks file or sched_setaffinity, and sched_setscheduler)
+          when we have the privileges, and milk-makecsetandrt otherwise -
+          still only for new or changed processes.
+    '''
+
+    def __init__(self) -> None:
+        # pid -> (start time, cset, rtprio)
+        self._placed: typ.Dict[int, typ.Tuple[int, str, int]] = {}
+
+    def place_tree(self, root_pid: int, cset: str, rtprio: int) -> int:
+        '''
+        Place root_pid and its descendants. Returns the number of processes (re-)placed.
+        '''
+        tree = proc_tree(root_pid)
+        n_placed = 0
+        for pid in tree:
+            start_time = proc_start_time(pid)
+            if start_time is None:  # Gone
+                continue
+            if (self._placed.get(pid) == (start_time, cset, rtprio) and
+                        self._is_still_rt(pid, rtprio)):
+                continue
+            self.place(pid, cset, rtprio)
+            self._placed[pid] = (start_time, cset, rtprio)
+            n_placed += 1
+
+        # Forget what's gone
+        alive = set(tree)
+        self._placed = {
+                pid: v
+                for pid, v in self._placed.items()
+                if pid in alive
+        }
+
+        return n_placed
+
+    @staticmethod
+    def _is_still_rt(pid: int, rtprio: int) -> bool:
+        try:
+            return (os.sched_getscheduler(pid) == os.SCHED_FIFO and
+                    os.sched_getparam(pid).sched_priority == rtprio)
+        except OSError:
+            return False
+
+    def place(self, pid: int, cset: str, rtprio: int) -> None:
+        try:
+            self._place_native(pid, cset, rtprio)
+        except (OSError, ValueError) as e:
+            logg.debug(f'RTSupervisor: native placement of {pid} failed '
+                       f'[{e!r}], using milk-makecsetandrt')
+            subprocess.run(['milk-makecsetandrt',
+                            str(pid), cset,
+                            str(rtprio)], stdout=subprocess.DEVNULL)
+
+    @staticmethod
+    def _place_native(pid: int, cset: str, rtprio: int) -> None:
+        # All threads to the cpuset, like cset proc --threads
+        tids = proc_threads(pid)
+        moved = False
+        for root in CPUSET_ROOTS:
+            tasks_file = f'{root}/{cset}/tasks'
+            if os.path.isfile(tasks_file) and os.access(tasks_file, os.W_OK):
+                for tid in tids:
+                    with open(tasks_file, 'w') as f:
+                        f.write(str(tid))
+                moved = True
+                break
+
+        if not moved:
+            cpus = cpuset_cpus(cset)
+            if cpus is None:
+                raise ValueError(f'cpuset {cset} not found.')
+            for tid in tids:
+                os.sched_setaffinity(tid, cpus)
+
+        # Main thread only, like chrt -p. Needs CAP_SYS_NICE or RLIMIT_RTPRIO.
+        os.sched_setscheduler(pid, os.SCHED_FIFO, os.sched_param(rtprio))
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import typing as typ
+
+import time
+import heapq
+import random
+import threading
+import logging as logg
+
+
+class Lockable(typ.Protocol):
+
+    def acquire(self, blocking: bool = ...) -> bool:
+        ...
+
+    def release(self) -> None:
+        ...
+
+
+class PollTask:
+    '''
+    A periodic task of a PollScheduler, and its run statistics.
+    '''
+
+    def __init__(self, name: str, function: typ.Callable[[], typ.Any],
+                 period: float, jitter: float, timeout: typ.Optional[float],
+                 backoff_max: float, lock: typ.Optional[Lockable]) -> None:
+        self.name = name
+        self.function = function
+        self.period = period
+        self.jitter = jitter
+        self.timeout = period if timeout is None else timeout
+        self.backoff_max = backoff_max
+        self.lock = lock
+
+        self.next_run = 0.0  # time.monotonic()
+
+        self.n_runs = 0
+        self.n_errors = 0
+        self.n_overruns = 0
+        self.n_lock_busy = 0
+        self.consecutive_errors = 0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+        self.last_run = 0.0  # time.time()
+        self.last_error: typ.Optional[str] = None
+
+    def next_delay(self) -> float:
+        '''
+        Period with jitter - so that tasks with the same period spread out -
+        stretched by exponential backoff after consecutive errors.
+        '''
+        delay = self.period * (1. + random.uniform(-self.jitter, self.jitter))
+        if self.consecutive_errors > 0:
+            delay = min(delay * 2**self.consecutive_errors,
+                        max(self.backoff_max, delay))
+        return delay
+
+    def stats(self) -> typ.Dict[str, typ.Any]:
+        return {
+                'period': self.period,
+                'n_runs': self.n_runs,
+                'n_errors': self.n_errors,
+                'n_overruns': self.n_overruns,
+                'n_lock_busy': self.n_lock_busy,
+                'last_duration': self.last_duration,
+                'max_duration': self.max_duration,
+                'last_run': self.last_run,
+                'last_error': self.last_error,
+        }
+
+
+class PollScheduler:
+    '''
+    Runs periodic tasks with individual periods, from a single thread:
+    a priority queue on the next run time, and a sleep on the stop event until then.
+    Replaces the "wake up every second, do everything every 10th time" loop.
+
+    Per task:
+        - period, with +/- jitter (fraction of the period)
+        - timeout: a run longer than that (defaults to the period) is logged and counted as overrun.
+          Python can't preempt a hung task, but the next run is always scheduled from the end of
+          the previous one, so late tasks don't pile up.
+        - error backoff: after n consecutive errors, the delay is multiplied by 2**n,
+          up to backoff_max.
+        - lock: acquired non-blocking around the run; if busy, the task is retried
+          LOCK_RETRY_DELAY later. That keeps the thread responsive to the stop event
+          while the main thread holds the lock (see ParamsSHMCamera).
+
+    run() returns when the event is set.
+    '''
+
+    LOCK_RETRY_DELAY = 1.0  # sec.
+
+    def __init__(self, event: threading.Event) -> None:
+        self.event = event
+        self.tasks: typ.Dict[str, PollTask] = {}
+        self._queue: typ.List[typ.Tuple[float, int, str]] = []
+        self._seq = 0
+        self._queue_lock = threading.Lock()
+
+    def add_task(self, name: str, function: typ.Callable[[], typ.Any],
+                 period: float, *, jitter: float = 0.1,
+                 timeout: typ.Optional[float] = None,
+                 first_delay: typ.Optional[float] = None,
+                 backoff_max: typ.Optional[float] = None,
+                 lock: typ.Optional[Lockable] = None) -> PollTask:
+        '''
+        Register (or replace) a task.
+        first_delay: until the first run, defaults to a random fraction of the period.
+        backoff_max: longest delay after errors, defaults to 10 periods.
+        '''
+        task = PollTask(name, function, period, jitter, timeout,
+                        10 * period if backoff_max is None else backoff_max,
+                        lock)
+        if first_delay is None:
+            first_delay = random.uniform(0., period)
+
+        with self._queue_lock:
+            self.tasks[name] = task
+            self._push(task, time.monotonic() + first_delay)
+
+        return task
+
+    def remove_task(self, name: str) -> None:
+        # Its queue entry is dropped when it comes up.
+        with self._queue_lock:
+            self.tasks.pop(name, None)
+
+    def _push(self, task: PollTask, when: float) -> None:
+        task.next_run = when
+        self._seq += 1
+        heapq.heappush(self._queue, (when, self._seq, task.name))
+
+    def _pop_due(self) -> typ.Tuple[typ.Optional[PollTask], float]:
+        '''
+        The next task if it is due, and how long to wait otherwise.
+        '''
+        with self._queue_lock:
+            while self._queue:
+                when, _, name = self._queue[0]
+                task = self.tasks.get(name)
+                if task is None or task.next_run != when:  # Removed or replaced
+                    heapq.heappop(self._queue)
+                    continue
+                wait = when - time.monotonic()
+                if wait > 0:
+                    return None, wait
+                heapq.heappop(self._queue)
+                return task, 0.
+        return None, self.LOCK_RETRY_DELAY
+
+    def run(self) -> None:
+        while not self.event.is_set():
+            task, wait = self._pop_due()
+            if task is None:
+                if self.event.wait(wait):
+                    break
+                continue
+
+            delay = self._run_task(task)
+            with self._queue_lock:
+                if self.tasks.get(task.name) is task:
+                    self._push(task, time.monotonic() + delay)
+
+    def _run_task(self, task: PollTask) -> float:
+        '''
+        Run the task once, returns the delay until the next run.
+        '''
+        if task.lock is not None and not task.lock.acquire(blocking=False):
+            task.n_lock_busy += 1
+            return self.LOCK_RETRY_DELAY
+
+        task.last_run = time.time()
+        t_start = time.monotonic()
+        try:
+            task.function()
+            task.consecutive_errors = 0
+        except Exception as e:
+            task.n_errors += 1
+            task.consecutive_errors += 1
+            task.last_error = repr(e)
+            logg.error(f"Polling thread: error in {task.name} [{e!r}]")
+        finally:
+            if task.lock is not None:
+                task.lock.release()
+
+        task.last_duration = time.monotonic() - t_start
+        task.max_duration = max(task.max_duration, task.last_duration)
+        task.n_runs += 1
+        if task.last_duration > task.timeout:
+            task.n_overruns += 1
+            logg.warning(f"Polling thread: {task.name} took "
+                         f"{task.last_duration:.3f} s (timeout "
+                         f"{task.timeout:.3f} s)")
+
+        return task.next_delay()
+
+    def get_stats(self) -> typ.Dict[str, typ.Dict[str, typ.Any]]:
+        return {name: task.stats() for name, task in list(self.tasks.items())}
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import typing as typ
+
+import time
+import heapq
+import itertools
+import threading
+import contextlib
+import logging as logg
+from concurrent.futures import Future
+
+T = typ.TypeVar('T')
+
+
+class SerialPriority:
+    '''
+        Lower goes first. Requests of equal priority are served in order.
+    '''
+    CONTROL = 0  # Handle (re)opening
+    USER = 10  # Interactive shell, Pyro
+    POLL = 20  # Background keyword polling
+
+    NAMES = {CONTROL: 'control', USER: 'user', POLL: 'poll'}
+
+
+class _SerialRequest:
+
+    def __init__(self, function: typ.Callable[[typ.Any], typ.Any],
+                 priority: int, deadline: float, description: str) -> None:
+        self.function = function
+        self.priority = priority
+        self.deadline = deadline
+        self.description = description
+        self.future: Future = Future()
+        self.t_submit = time.monotonic()
+
+
+class _PriorityStats:
+
+    def __init__(self) -> None:
+        self.n_requests = 0
+        self.n_errors = 0
+        self.n_timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.service_total = 0.0
+        self.service_max = 0.0
+
+    def stats(self) -> typ.Dict[str, typ.Any]:
+        n_served = max(1, self.n_requests - self.n_timeouts)
+        return {
+                'n_requests': self.n_requests,
+                'n_errors': self.n_errors,
+                'n_timeouts': self.n_timeouts,
+                'wait_mean': self.wait_total / n_served,
+                'wait_max': self.wait_max,
+                'service_mean': self.service_total / n_served,
+                'service_max': self.service_max,
+        }
+
+
+class SerialWorker:
+    '''
+        One thread that owns a serial handle, and executes requests on it one at a time,
+        from a priority queue: user commands jump ahead of the background polls queued
+        before them. A command in progress is never interrupted.
+
+        Requests are functions of the handle, that run in the worker thread:
+            worker.call(lambda iface: iface.send_command('fps raw'))
+        submit() returns a Future; call() waits for it.
+
+        Every request has a timeout: if it isn't started by then, it is dropped and
+        fails with TimeoutError.
+        The default priority is the caller thread's (see priority()), else USER.
+    '''
+
+    DEFAULT_TIMEOUT = 10.0  # sec.
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._handle: typ.Any = None
+
+        self._queue: typ.List[typ.Tuple[int, int, _SerialRequest]] = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._stop = False
+        self._local = threading.local()
+
+        self.max_depth = 0
+        self._stats: typ.Dict[int, _PriorityStats] = {}
+
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name=f'serial-{name}')
+        self._thread.start()
+
+    @contextlib.contextmanager
+    def priority(self, priority: int) -> typ.Iterator[None]:
+        '''
+            Default priority of the requests of this thread, within the block.
+        '''
+        previous = getattr(self._local, 'priority', None)
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def submit(self, function: typ.Callable[[typ.Any], T],
+               priority: typ.Optional[int] = None,
+               timeout: typ.Optional[float] = None,
+               description: str = '') -> Future:
+        if priority is None:
+            priority = getattr(self._local, 'priority', None)
+            if priority is None:
+                priority = SerialPriority.USER
+        if timeout is None:
+            timeout = self.DEFAULT_TIMEOUT
+
+        request = _SerialRequest(function, priority,
+                                 time.monotonic() + timeout, description)
+        if threading.current_thread() is self._thread:
+            # From within a request: queuing would deadlock.
+            self._execute(request)
+            return request.future
+
+        with self._cond:
+            if self._stop:
+                raise RuntimeError(f'SerialWorker {self.name} is closed.')
+            heapq.heappush(self._queue,
+                           (priority, next(self._counter), request))
+            self.max_depth = max(self.max_depth, len(self._queue))
+            self._cond.notify()
+        return request.future
+
+    def call(self, function: typ.Callable[[typ.Any], T],
+             priority: typ.Optional[int] = None,
+             timeout: typ.Optional[float] = None, description: str = '') -> T:
+        # No wait timeout: the request either starts before its timeout, or fails.
+        # Once started, it's bounded by the timeouts of the handle itself.
+        return self.submit(function, priority, timeout, description).result()
+
+    def open(self, factory: typ.Callable[[], typ.Any]) -> None:
+        '''
+            (Re-)open the handle: factory() runs in the worker thread, after whatever
+            request is in progress, before all queued ones.
+        '''
+
+        def reopen(_: typ.Any) -> None:
+            self._handle = factory()
+
+        self.call(reopen, priority=SerialPriority.CONTROL, description='open')
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._stop:
+                    self._cond.wait()
+                if not self._queue:  # Stopped, and drained
+                    return
+                _, _, request = heapq.heappop(self._queue)
+            self._execute(request)
+
+    def _execute(self, request: _SerialRequest) -> None:
+        stats = self._stats.setdefault(request.priority, _PriorityStats())
+        stats.n_requests += 1
+
+        t_start = time.monotonic()
+        if t_start > request.deadline:
+            stats.n_timeouts += 1
+            logg.warning(f'SerialWorker {self.name}: "{request.description}" '
+                         f'dropped after {t_start - request.t_submit:.3f} s '
+                         'in queue.')
+            request.future.set_exception(
+                    TimeoutError(f'"{request.description}" not started '
+                                 'before its timeout.'))
+            return
+
+        wait = t_start - request.t_submit
+        stats.wait_total += wait
+        stats.wait_max = max(stats.wait_max, wait)
+        error: typ.Optional[Exception] = None
+        try:
+            result = request.function(self._handle)
+        except Exception as exc:
+            stats.n_errors += 1
+            error = exc
+
+        service = time.monotonic() - t_start
+        stats.service_total += service
+        stats.service_max = max(stats.service_max, service)
+
+        if error is not None:
+            request.future.set_exception(error)
+        else:
+            request.future.set_result(result)
+
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def close(self) -> None:
+        '''
+            Stop the thread once the queue is drained.
+        '''
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if threading.current_thread() is not self._thread:
+            self._thread.join()
+
+    def get_stats(self) -> typ.Dict[str, typ.Dict[str, typ.Any]]:
+        '''
+            Per priority: requests, errors, timeouts, queue wait and service times [s].
+            Plus 'queue': current and max depth.
+        '''
+        stats: typ.Dict[str, typ.Dict[str, typ.Any]] = {
+                SerialPriority.NAMES.get(prio, str(prio)): prio_stats.stats()
+                for prio, prio_stats in sorted(self._stats.items())
+        }
+        stats['queue'] = {'depth': self.depth(), 'max_depth': self.max_depth}
+        return stats
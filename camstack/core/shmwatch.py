@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import typing as typ
+
+import os
+import time
+import errno
+import select
+import ctypes
+import ctypes.util
+import logging as logg
+
+from camstack.core.utilities import CamstackStateException
+
+if typ.TYPE_CHECKING:
+    from pyMilk.interfacing.isio_shmlib import SHM
+
+# <sys/inotify.h>
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# Upper bound of a single wait, even with inotify: we re-check the file anyway.
+WATCH_MAX_WAIT = 1.0  # sec.
+POLL_INTERVAL = 0.1  # sec. Without inotify.
+OPEN_RETRY_MIN = 0.005  # sec. The file exists, but the header may not be written yet.
+OPEN_RETRY_MAX = 0.1  # sec.
+
+
+class SHMReadyTimeout(CamstackStateException):
+    pass
+
+
+def shm_path(stream_name: str) -> str:
+    return f"{os.environ['MILK_SHM_DIR']}/{stream_name}.im.shm"
+
+
+_LIBC: typ.Optional[ctypes.CDLL] = None
+
+
+def _libc() -> ctypes.CDLL:
+    global _LIBC
+    if _LIBC is None:
+        _LIBC = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    return _LIBC
+
+
+class DirectoryWatch:
+    '''
+        inotify watch on the files created (or moved) into a directory.
+        wait() returns as soon as anything was created, or on timeout.
+        If inotify is not available, wait() just sleeps POLL_INTERVAL.
+    '''
+
+    def __init__(self, directory: str) -> None:
+        self.fd: typ.Optional[int] = None
+        try:
+            libc = _libc()
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), 'inotify_init1')
+            if libc.inotify_add_watch(fd, directory.encode(),
+                                      IN_CREATE | IN_MOVED_TO) < 0:
+                err = ctypes.get_errno()
+                os.close(fd)
+                raise OSError(err, 'inotify_add_watch')
+            self.fd = fd
+        except (OSError, AttributeError) as exc:
+            logg.debug(f'DirectoryWatch: no inotify on {directory} [{exc!r}]')
+
+    def wait(self, timeout: float) -> None:
+        if self.fd is None:
+            time.sleep(min(timeout, POLL_INTERVAL))
+            return
+        readable, _, _ = select.select([self.fd], [], [],
+                                       min(timeout, WATCH_MAX_WAIT))
+        if readable:
+            try:
+                os.read(self.fd, 65536)  # Drain - the caller re-checks its file.
+            except OSError as exc:
+                if exc.errno != errno.EAGAIN:
+                    raise
+
+    def close(self) -> None:
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self) -> DirectoryWatch:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def wait_for_file(path: str, deadline: float) -> bool:
+    '''
+        Wait until path exists, or time.monotonic() > deadline. Returns whether it exists.
+    '''
+    if os.path.isfile(path):
+        return True
+    with DirectoryWatch(os.path.dirname(path)) as watch:
+        # Watch first, check next: a creation in between can't be missed.
+        while not os.path.isfile(path):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            watch.wait(remaining)
+    return True
+
+
+def wait_for_shm(stream_name: str, timeout: typ.Optional[float],
+                 frame_timeout: typ.Optional[float] = None,
+                 raise_on_no_frame: bool = True) -> SHM:
+    '''
+        Open the SHM stream_name as soon as it is created, then wait for a first frame
+        to be published to it, with a blocking semaphore wait.
+
+        timeout: overall deadline, None for forever.
+        frame_timeout: cap on the first frame wait alone (within the overall deadline).
+        raise_on_no_frame: if False, return the SHM anyway if no frame came
+            before the deadline.
+
+        Raises SHMReadyTimeout, telling which step didn't complete.
+    '''
+    from pyMilk.interfacing.isio_shmlib import SHM
+
+    t_start = time.monotonic()
+    deadline = float('inf') if timeout is None else t_start + timeout
+    path = shm_path(stream_name)
+
+    # 1/ The file
+    if not wait_for_file(path, deadline):
+        raise SHMReadyTimeout(
+                f'SHM {stream_name}: {path} not created after {timeout} s.')
+
+    # 2/ A valid SHM - the file is created before its header is written.
+    retry = OPEN_RETRY_MIN
+    while True:
+        try:
+            shm = SHM(stream_name, symcode=0)
+            break
+        except Exception as exc:
+            if time.monotonic() + retry > deadline:
+                raise SHMReadyTimeout(
+                        f'SHM {stream_name}: cannot be opened after '
+                        f'{timeout} s [{exc!r}].') from exc
+        time.sleep(retry)
+        retry = min(2 * retry, OPEN_RETRY_MAX)
+
+    # 3/ A first frame. We don't want to break a semaphore: wait on our own.
+    frame_deadline = deadline
+    if frame_timeout is not None:
+        frame_deadline = min(deadline, time.monotonic() + frame_timeout)
+
+    img = shm.IMAGE
+    img.semflush(shm.semID)
+    cnt0 = img.md.cnt0
+    while img.md.cnt0 == cnt0:
+        remaining = frame_deadline - time.monotonic()
+        if remaining <= 0:
+            if raise_on_no_frame:
+                raise SHMReadyTimeout(
+                        f'SHM {stream_name}: no frame published after '
+                        f'{time.monotonic() - t_start:.1f} s - is the '
+                        'grabber running?')
+            logg.warning(f'wait_for_shm: no frame in {stream_name} yet.')
+            break
+        # Bounded chunks: semtimedwait can't be interrupted.
+        img.semtimedwait(shm.semID, min(remaining, WATCH_MAX_WAIT))
+
+    logg.debug(f'wait_for_shm: {stream_name} ready in '
+               f'{time.monotonic() - t_start:.3f} s')
+    return shm
@@ -7,11 +7,17 @@ import libtmux as tmux
 import typing as typ
 if typ.TYPE_CHECKING:
     Pane_T: typ.TypeAlias = typ.Union[tmux.pane.Pane, 'RemotePanePatch',
-                                      'DeprecatedPanePatch']
+                                      'DeprecatedPanePatch',
+                                      'tmux_control.ControlPanePatch']
 
 import time
+import shlex
+import contextlib
 import subprocess
 
+from camstack.core import remote, tmux_control
+from camstack.core.rtsupervisor import proc_children
+
 TMUX_SERVER = tmux.server.Server()  # No arguments: defaut server
 if not TMUX_SERVER.is_alive():
     # There's probably better...
@@ -45,20 +51,53 @@ def find_or_create_deprecated(session_name: str) -> Pane_T:
     return DeprecatedPanePatch(session_name)
 
 
+def find_or_create_control(session_name: str) -> Pane_T:
+    '''
+        Mimic of find_or_create, through the shared tmux control mode client:
+        no tmux fork per command.
+        Will return a ControlPanePatch object
+    '''
+    client = tmux_control.get_client()
+    if session_name not in client.pane_pids():
+        try:
+            client.command('new-session', '-d', '-s', session_name)
+        except tmux_control.TmuxControlError:  # Was created meanwhile
+            pass
+        client.invalidate_pane_pids()
+    return tmux_control.ControlPanePatch(session_name, client)
+
+
 if os.environ.get('WHICHCOMP', default=None) == '2':
     find_or_create = find_or_create_deprecated
-else:
+elif os.environ.get('CAMSTACK_TMUX_BACKEND', default=None) == 'libtmux':
     find_or_create = find_or_create_
+else:
+    find_or_create = find_or_create_control
 
 
-def find_or_create_remote(session_name: str, host: str):
+def find_or_create_remote(
+        session_name: str, host: str,
+        executor: typ.Optional[remote.RemoteExecutor] = None):
     '''
         Mimic of find_or_create, but on a remote machine.
         Will return a RemotePanePatch object
     '''
-    subprocess.run(['ssh', host, "tmux new-session -d -s " + session_name],
-                   stdout=subprocess.PIPE)
-    return RemotePanePatch(session_name, host)
+    pane = RemotePanePatch(session_name, host, executor)
+    # Don't fail if it exists.
+    pane.executor.run(
+            host, f'tmux has-session -t {shlex.quote(session_name)} '
+            f'2>/dev/null || tmux new-session -d -s {shlex.quote(session_name)}')
+    return pane
+
+
+def batch(pane: Pane_T) -> typ.ContextManager:
+    '''
+        Group the send_keys to a pane: in one round trip when the pane is remote,
+        pipelined over the control mode client. No-op otherwise.
+    '''
+    if isinstance(pane, (RemotePanePatch, tmux_control.ControlPanePatch)):
+        return pane.batch()
+    return contextlib.nullcontext()
 
 
 def send_keys(pane: Pane_T, keys: str, enter: bool = True) -> None:
@@ -68,13 +107,15 @@ def send_keys(pane: Pane_T, keys: str, enter: bool = True) -> None:
 
 
 def kill_running_Cc(pane: Pane_T) -> None:
-    pane.send_keys('C-c', enter=False, suppress_history=False)
-    pane.send_keys('C-c', enter=False, suppress_history=False)
+    with batch(pane):
+        pane.send_keys('C-c', enter=False, suppress_history=False)
+        pane.send_keys('C-c', enter=False, suppress_history=False)
 
 
 def kill_running_Cz(pane: Pane_T) -> None:
-    pane.send_keys('C-z', enter=False, suppress_history=False)
-    pane.send_keys('kill %')
+    with batch(pane):
+        pane.send_keys('C-z', enter=False, suppress_history=False)
+        pane.send_keys('kill %')
 
 
 def kill_running(pane: Pane_T) -> None:
@@ -83,18 +124,45 @@ def kill_running(pane: Pane_T) -> None:
     kill_running_Cz(pane)
 
 
+def _cmd_first_line(pane: Pane_T, command: str, args: str) -> str:
+    # libtmux returns a list of lines, the Patch classes a CompletedProcess[bytes]
+    out = pane.cmd(command, args).stdout  # type: ignore
+    if isinstance(out, bytes):
+        out = out.decode('utf8').splitlines()
+    return out[0].strip()
+
+
+def pane_age(pane: Pane_T) -> float:
+    '''
+        Seconds since the session of the pane was created
+    '''
+    created = int(_cmd_first_line(pane, 'list-panes', '-F#{session_created}'))
+    return time.time() - created
+
+
 def find_pane_running_pid(pane: Pane_T) -> int | None:
     # Identify the PIDs running in a pane.
     # Generally, we expect to find nothing, or only one front-end job.
 
-    # This is the PID of the pane's shell
-    p = pane.cmd('list-panes',
-                 '-F#{pane_pid}').stdout[0].strip()  # type: ignore
-    # For which we identify children
+    if type(pane) is tmux_control.ControlPanePatch:
+        # Cached list-panes -a, and children from /proc: no fork at all.
+        shell_pid = pane.client.pane_pids().get(pane.session_name)
+        if shell_pid is None:
+            return None
+        children = proc_children(shell_pid)
+        return children[0] if children else None
+
     if type(pane) is RemotePanePatch:
-        res = subprocess.run(['ssh', pane.host, "pgrep", "-P", p],
-                             stdout=subprocess.PIPE)
+        # Both steps remotely, in one round trip
+        res = pane.executor.run(
+                pane.host,
+                'pgrep -P "$(' + remote.tmux_command_string(
+                        [['list-panes', '-t', pane.session_name,
+                          '-F#{pane_pid}']]) + ' | head -n 1)"')
     else:
+        # This is the PID of the pane's shell
+        p = _cmd_first_line(pane, 'list-panes', '-F#{pane_pid}')
+        # For which we identify children
         res = subprocess.run(['pgrep', '-P', p], stdout=subprocess.PIPE)
 
     if res.returncode == 0:
@@ -131,37 +199,55 @@ class DeprecatedPanePatch:
 class RemotePanePatch:
     '''
         Provide a virtual handle to a tmux pane on a remote server
-        It's only based on system tmux commands over ssh
+        It's only based on system tmux commands, run by a remote.RemoteExecutor -
+        by default, over a persistent, multiplexed ssh connection.
+
+        Within a batch(), send_keys are queued and sent in one round trip on exit.
     '''
 
-    def __init__(self, session_name: str, host: str) -> None:
+    def __init__(self, session_name: str, host: str,
+                 executor: typ.Optional[remote.RemoteExecutor] = None) -> None:
         self.session_name = session_name
         self.host = host
+        self.executor = remote.get_executor() if executor is None else executor
+
+        self._batch: typ.Optional[typ.List[typ.List[str]]] = None
+
+    @contextlib.contextmanager
+    def batch(self) -> typ.Iterator[None]:
+        if self._batch is not None:  # Nested: the outer one sends
+            yield
+            return
+
+        self._batch = []
+        try:
+            yield
+        finally:
+            commands, self._batch = self._batch, None
+            if commands:
+                self.executor.tmux(self.host, commands, check=True)
 
     def send_keys(self, keys: str, enter: bool = True,
                   suppress_history: bool = False) -> None:
-        # Mind the quotes - we're gonna put keys between double quotes,
-        # so we need to escape double quotes inside of keys
-        # and we need to escape the backslash so that python knows it's a backslash
-        if '"' in keys:
-            keys = keys.replace('"', '\\"')
+        # keys are shell-quoted by the executor: they reach tmux verbatim.
         if suppress_history:
             keys = " " + keys
-        cmdstring = [
-                'tmux', 'send-keys', '-t', self.session_name, '"' + keys + '"'
-        ]
+        command = ['send-keys', '-t', self.session_name, keys]
         if enter:
-            cmdstring += ["Enter"]
+            command += ["Enter"]
 
-        # Use check call to return a CalledProcessError
-        subprocess.check_call(['ssh', self.host] + cmdstring,
-                              stdout=subprocess.PIPE)
+        if self._batch is not None:
+            self._batch += [command]
+            return
+        # Use check to return a CalledProcessError
+        self.executor.tmux(self.host, [command], check=True)
 
     def cmd(self, command: str,
             args: str = '') -> subprocess.CompletedProcess[bytes]:
         '''
-            Carefully mind the single and double quotes
+            args is a single argument to the tmux command
         '''
-        cmdstring = ['tmux', command, '-t', self.session_name, args]
-        return subprocess.run(['ssh', self.host] + cmdstring,
-                              stdout=subprocess.PIPE)
+        cmd = [command, '-t', self.session_name]
+        if args:
+            cmd += [args]
+        return self.executor.tmux(self.host, [cmd])
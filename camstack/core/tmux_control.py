@@ -0,0 +1,311 @@
+from __future__ import annotations
+
+import typing as typ
+
+import time
+import shlex
+import threading
+import contextlib
+import subprocess
+import collections
+import logging as logg
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+
+class TmuxControlError(Exception):
+    pass
+
+
+class TmuxControlClient:
+    '''
+        A single tmux control mode client (tmux -C), kept open: commands are written to
+        its stdin and pipelined - no tmux client fork per command.
+
+        Replies come back in order, framed by %begin / %end (or %error) lines whose
+        flags are 1 for the commands of this client. Everything else is a notification.
+        Session and window notifications invalidate the pane PID cache.
+
+        The client attaches to a dedicated CONTROL_SESSION. It is (re-)started on demand
+        if the tmux server or the client died.
+        Replies are matched to commands by position: if one times out, the stream can't
+        be trusted anymore, and the client is killed - see wait.
+    '''
+
+    CONTROL_SESSION = '_camstack_ctl'
+    COMMAND_TIMEOUT = 5.0  # sec.
+    PANE_PID_TTL = 1.0  # sec.
+
+    # Notifications after which sessions / panes may have come or gone
+    INVALIDATING_NOTIFICATIONS = ('%sessions-changed', '%session-changed',
+                                  '%window-add', '%window-close',
+                                  '%unlinked-window-close',
+                                  '%layout-change', '%exit')
+
+    def __init__(self) -> None:
+        self._proc: typ.Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+        self._pending: typ.Deque[Future] = collections.deque()
+
+        self._pane_pids: typ.Dict[str, int] = {}
+        self._pane_pids_time = 0.0
+
+        self.n_commands = 0
+        self.n_starts = 0
+        self.n_pane_pid_queries = 0
+        self.n_desyncs = 0
+
+    def _ensure_started(self) -> subprocess.Popen:
+        # Under self._lock
+        if self._proc is not None and self._proc.poll() is None:
+            return self._proc
+
+        proc = subprocess.Popen(
+                ['tmux', '-C', 'new-session', '-A', '-s', self.CONTROL_SESSION],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL)
+        # Each client process has its own queue: a dying reader only fails its own.
+        self._pending = collections.deque()
+        threading.Thread(target=self._reader, args=(proc, self._pending),
+                         daemon=True, name='tmux-control').start()
+        self._proc = proc
+        self.n_starts += 1
+        self.invalidate_pane_pids()
+        return proc
+
+    def _reader(self, proc: subprocess.Popen,
+                pending: typ.Deque[Future]) -> None:
+        assert proc.stdout is not None
+
+        block: typ.Optional[typ.List[str]] = None
+        block_id = ''
+        block_is_ours = False
+
+        for raw in proc.stdout:
+            line = raw.decode('utf8', errors='replace').rstrip('\n')
+            if block is not None:
+                # %end / %error carry the same time, number, flags as the %begin
+                if line.split(' ', 1)[-1] == block_id and line.startswith(
+                        ('%end ', '%error ')):
+                    if block_is_ours:
+                        self._resolve(pending, block,
+                                      line.startswith('%error'))
+                    block = None
+                else:
+                    block += [line]
+            elif line.startswith('%begin '):
+                block = []
+                block_id = line.split(' ', 1)[1]
+                block_is_ours = block_id.endswith(' 1')
+            elif line.startswith(self.INVALIDATING_NOTIFICATIONS):
+                self.invalidate_pane_pids()
+            # Other notifications (%output, %pane-mode-changed...) are of no use to us.
+
+        # EOF: the client died. Fail what's in flight - the next command restarts it.
+        with self._lock:
+            if self._proc is proc:
+                self._proc = None
+        self._fail_all(pending, 'tmux control client exited.')
+
+    @staticmethod
+    def _fail_all(pending: typ.Deque[Future], message: str) -> None:
+        while True:
+            try:
+                fut = pending.popleft()
+            except IndexError:
+                return
+            fut.set_exception(TmuxControlError(message))
+
+    def _resolve(self, pending: typ.Deque[Future], lines: typ.List[str],
+                 error: bool) -> None:
+        # No lock: submit may hold it, blocked on a full stdin pipe, until we read on.
+        # deque.popleft / append are atomic.
+        try:
+            fut = pending.popleft()
+        except IndexError:  # Shouldn't happen
+            return
+        if error:
+            fut.set_exception(TmuxControlError('\n'.join(lines)))
+        else:
+            fut.set_result(lines)
+
+    def submit(self, command: typ.Sequence[str]) -> Future:
+        '''
+            Send a tmux command (as argv, without 'tmux') without waiting.
+            The future resolves to its output lines, or raises TmuxControlError.
+        '''
+        if any('\n' in arg for arg in command):
+            raise ValueError('No newlines in tmux control mode commands.')
+        line = ' '.join(shlex.quote(arg) for arg in command) + '\n'
+
+        fut: Future = Future()
+        with self._lock:
+            proc = self._ensure_started()
+            assert proc.stdin is not None
+            self._pending.append(fut)
+            try:
+                proc.stdin.write(line.encode('utf8'))
+                proc.stdin.flush()
+            except OSError as exc:
+                self._pending.remove(fut)
+                self._proc = None
+                raise TmuxControlError(
+                        'tmux control client is gone.') from exc
+            self.n_commands += 1
+        return fut
+
+    def wait(self, fut: Future) -> typ.List[str]:
+        '''
+            Result of a submitted command, within COMMAND_TIMEOUT.
+            On timeout, its late reply would be taken for the next command's: the client
+            is killed, all commands in flight fail, and the next one starts a new client.
+            Raises TmuxControlError.
+        '''
+        try:
+            return fut.result(timeout=self.COMMAND_TIMEOUT)
+        except FutureTimeoutError:
+            self._desync(fut)
+            raise TmuxControlError(
+                    f'tmux control command timed out after '
+                    f'{self.COMMAND_TIMEOUT} s.') from None
+
+    def _desync(self, fut: Future) -> None:
+        with self._lock:
+            if fut not in self._pending:
+                # Sent to a client that's already gone: its reader fails it on EOF.
+                return
+            proc, self._proc = self._proc, None
+            pending, self._pending = self._pending, collections.deque()
+            self.n_desyncs += 1
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+        logg.warning('tmux control client timed out - restarting it.')
+        self._fail_all(pending, 'tmux control client restarted after a timeout.')
+
+    def command(self, *args: str) -> typ.List[str]:
+        return self.wait(self.submit(args))
+
+    def commands(
+            self, commands: typ.Sequence[typ.Sequence[str]]
+    ) -> typ.List[typ.List[str]]:
+        '''
+            Pipeline several commands: all sent, then all waited for.
+        '''
+        futures = [self.submit(command) for command in commands]
+        return [self.wait(fut) for fut in futures]
+
+    def pane_pids(self) -> typ.Dict[str, int]:
+        '''
+            session name -> PID of the shell of its (first) pane, for all sessions,
+            from one list-panes -a, at most every PANE_PID_TTL.
+        '''
+        if time.monotonic() - self._pane_pids_time > self.PANE_PID_TTL:
+            t_query = time.monotonic()
+            lines = self.command('list-panes', '-a', '-F',
+                                 '#{session_name}\t#{pane_pid}')
+            pids: typ.Dict[str, int] = {}
+            for line in lines:
+                session_name, pid = line.rsplit('\t', 1)
+                pids.setdefault(session_name, int(pid))
+            self._pane_pids = pids
+            self._pane_pids_time = t_query
+            self.n_pane_pid_queries += 1
+        return self._pane_pids
+
+    def invalidate_pane_pids(self) -> None:
+        self._pane_pids_time = 0.0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._proc is not None and self._proc.poll() is None:
+                assert self._proc.stdin is not None
+                self._proc.stdin.close()  # Detaches the client
+            self._proc = None
+
+    def get_stats(self) -> typ.Dict[str, int]:
+        return {
+                'commands': self.n_commands,
+                'starts': self.n_starts,
+                'pane_pid_queries': self.n_pane_pid_queries,
+                'desyncs': self.n_desyncs,
+        }
+
+
+_CLIENT: typ.Optional[TmuxControlClient] = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client() -> TmuxControlClient:
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = TmuxControlClient()
+        return _CLIENT
+
+
+class ControlPanePatch:
+    '''
+        Handle to a local tmux pane, driven through the shared TmuxControlClient.
+        Same interface as DeprecatedPanePatch.
+
+        Within a batch(), send_keys are pipelined and only waited for on exit.
+    '''
+
+    def __init__(self, session_name: str,
+                 client: typ.Optional[TmuxControlClient] = None) -> None:
+        self.session_name = session_name
+        self.client = get_client() if client is None else client
+
+        self._batch: typ.Optional[typ.List[Future]] = None
+
+    @contextlib.contextmanager
+    def batch(self) -> typ.Iterator[None]:
+        if self._batch is not None:  # Nested: the outer one waits
+            yield
+            return
+
+        self._batch = []
+        try:
+            yield
+        finally:
+            futures, self._batch = self._batch, None
+            for fut in futures:
+                self._check(fut)
+
+    def _check(self, fut: Future) -> None:
+        try:
+            self.client.wait(fut)
+        except TmuxControlError as exc:
+            # Same as DeprecatedPanePatch's check_call
+            raise subprocess.CalledProcessError(1, 'tmux send-keys',
+                                                str(exc)) from exc
+
+    def send_keys(self, keys: str, enter: bool = True,
+                  suppress_history: bool = False) -> None:
+        if suppress_history:
+            keys = " " + keys
+        command = ['send-keys', '-t', self.session_name, keys]
+        if enter:
+            command += ["Enter"]
+
+        fut = self.client.submit(command)
+        if self._batch is not None:
+            self._batch += [fut]
+        else:
+            self._check(fut)
+
+    def cmd(self, command: str,
+            args: str = '') -> subprocess.CompletedProcess[typ.List[str]]:
+        '''
+            args is a single argument to the tmux command.
+            stdout is the list of output lines, as with libtmux.
+        '''
+        cmd = [command, '-t', self.session_name]
+        if args:
+            cmd += [args]
+        try:
+            return subprocess.CompletedProcess(cmd, 0,
+                                               stdout=self.client.command(*cmd))
+        except TmuxControlError as exc:
+            logg.debug(f'ControlPanePatch: {cmd} failed [{exc}]')
+            return subprocess.CompletedProcess(cmd, 1, stdout=[])
@@ -3,9 +3,10 @@ from __future__ import annotations
 import typing as typ
 
 import os
-import time
 import subprocess
 import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor, Future
 
 from typing import Optional, Tuple, Dict
 from pydantic import BaseModel
@@ -14,6 +15,9 @@ import tomli
 import tomli_w
 
 from camstack.core import tmux
+from camstack.core.rtsupervisor import RTSupervisor
+from camstack.core.probes import (Probe, PIDProbe, PIDGoneProbe,
+                                  TmuxSettledProbe, wait_for_probes)
 from scxkw.config import MAGIC_BOOL_STR
 
 MODES_DIR = Path(__file__).parent.parent.parent / "conf" / "modes"
@@ -64,6 +68,8 @@ class FormattedFloat(float):
         Returns the float value as a formatted string.
     """
 
+    __slots__ = ('formatstr', )  # No per-instance __dict__
+
     def __new__(cls, value, formatstr=None):
         """
         Constructs a new instance of the FormattedFloat class.
@@ -104,32 +110,78 @@ class FormattedFloat(float):
         return self.formatstr % self.__float__()
 
 
+Typ_kw_formatter: typ.TypeAlias = typ.Callable[[Typ_shm_kw], Typ_shm_kw_nobool]
+
+# Float formatters cache their FormattedFloat by formatted string: pollers write the same
+# values over and over. Cleared when full.
+FORMATTED_FLOAT_CACHE_SIZE = 256
+
+
+@functools.lru_cache(maxsize=None)
+def compile_keyword_formatter(format: str) -> Typ_kw_formatter:
+    '''
+    Resolve a camstack KEYWORDS formatter ('BOOLEAN', '%20.3f', '%-16s', '%16d'...)
+    once into a callable that converts a value to what pyMilk takes.
+    Same as keyword_camstack_to_pyMilk, without re-parsing the format on every call.
+    '''
+    if format == 'BOOLEAN':
+
+        def fmt_bool(value: Typ_shm_kw) -> Typ_shm_kw_nobool:
+            if isinstance(value, bool):
+                # Booleans that are not formatted yet
+                return MAGIC_BOOL_STR.TUPLE[value]
+            # Booleans that came back from pyMilk and are already string-formatted
+            assert value in MAGIC_BOOL_STR.TUPLE
+            return value
+
+        return fmt_bool
+
+    elif format[-1] == 'd':
+
+        def fmt_int(value: Typ_shm_kw) -> Typ_shm_kw_nobool:
+            return int(format % value)
+
+        return fmt_int
+
+    elif format[-1] == 'f':
+        # not really in control here, at the end of the day
+        # milk gets to decide how to write it. Make sure to
+        # format it to round to correct precision
+        cache: dict[str, FormattedFloat] = {}
+
+        def fmt_float(value: Typ_shm_kw) -> Typ_shm_kw_nobool:
+            formatted = format % value
+            val = cache.get(formatted)
+            if val is None:
+                if len(cache) >= FORMATTED_FLOAT_CACHE_SIZE:
+                    cache.clear()
+                val = cache[formatted] = FormattedFloat(formatted, format)
+            return val
+
+        return fmt_float
+
+    elif format[-1] == 's':  # string
+
+        def fmt_str(value: Typ_shm_kw) -> Typ_shm_kw_nobool:
+            return format % value
+
+        return fmt_str
+
+    def fmt_passthrough(value: Typ_shm_kw) -> Typ_shm_kw_nobool:
+        return value  # type: ignore # bool, that's for the caller to not do.
+
+    return fmt_passthrough
+
+
 def keyword_camstack_to_pyMilk(value: Typ_shm_kw,
                                format: str) -> Typ_shm_kw_nobool:
-    val = value
     try:
-        if format == 'BOOLEAN':
-            if isinstance(value, bool):
-                # Booleans that are not formatted yet
-                val = MAGIC_BOOL_STR.TUPLE[value]
-            else:
-                # Booleans that came back from pyMilk and are already string-formatted
-                assert val in MAGIC_BOOL_STR.TUPLE
-        elif format[-1] == 'd':
-            val = int(format % value)
-        elif format[-1] == 'f':
-            # not really in control here, at the end of the day
-            # milk gets to decide how to write it. Make sure to
-            # format it to round to correct precision
-            val = FormattedFloat(format % value, format)
-        elif format[-1] == 's':  # string
-            val = format % value
+        return compile_keyword_formatter(format)(value)
     except:  # Sometime garbage values cannot be formatted properly...
         logg.error(
                 f"keyword_camstack_to_pyMilk: formatting error on {value}, {format}"
         )
         raise
-    return val
 
 
 def keyword_dictionary_camstack_to_pyMilk(
@@ -174,6 +226,16 @@ class CameraMode(BaseModel):
     def __repr__(self):
         return str(self)
 
+    def diff(self, other: CameraMode) -> typ.Set[str]:
+        '''
+            Names of the fields that differ between self and other.
+        '''
+        return {
+                name
+                for name in type(self).model_fields
+                if getattr(self, name) != getattr(other, name)
+        }
+
     @classmethod
     def from_file(cls, filename):
         """Load configuration from TOML file
@@ -210,6 +272,15 @@ class CameraMode(BaseModel):
             tomli_w.dump(model_dict, fh)
 
 
+class ModeChangePath:
+    '''
+        How BaseCamera.set_camera_mode goes from a mode to another - cheapest first.
+    '''
+    PARAMS = 'params'  # Same geometry: fps / tint set live, no restart.
+    REUSE_SHM = 'reuse_shm'  # Same frame size: taker restarted on its SHM, dependents untouched.
+    FULL = 'full'  # Taker and dependents torn down and restarted.
+
+
 class DependentProcess:
     '''
         Dependent processes are stuff that the camera server should take care of killing before changing the size
@@ -217,12 +288,29 @@ class DependentProcess:
 
         They're expected to live in a tmux (local or remote)
         This typically will include ocamdecode, and the TCP transfer.
+
+        Instead of sleeping fixed amounts, we poll probes (see camstack.core.probes):
+            ready_probes: after sending the command line, e.g. SHMFileProbe('apapane'),
+                TCPListenProbe(port). Default: a PID appeared in the pane.
+            kill_probes: after C-c, then again after C-z + kill.
+                Default: no PID left in the pane.
+
+        depends_on: dependents that must be ready before this one starts,
+            and that will only be stopped after this one is dead.
+            E.g. the TCP sender depends on the TCP receiver and on the process creating its SHM.
     '''
 
+    READY_TIMEOUT = 10.0  # sec.
+    KILL_CC_TIMEOUT = 2.0  # sec. Before escalating to C-z + kill %
+    KILL_CZ_TIMEOUT = 1.0  # sec.
+
     def __init__(self, tmux_name: str, cli_cmd: str,
                  cli_args: typ.Iterable[typ.Any], cset: str = 'system',
                  rtprio: typ.Optional[int] = None,
-                 kill_upon_create: bool = True):
+                 kill_upon_create: bool = True,
+                 ready_probes: typ.Optional[typ.List[Probe]] = None,
+                 kill_probes: typ.Optional[typ.List[Probe]] = None,
+                 depends_on: typ.Optional[typ.List[DependentProcess]] = None):
 
         self.enabled = True  # Is this registered to run ? #TODO UNUSED
 
@@ -232,57 +320,56 @@ class DependentProcess:
         self.cli_original_args = cli_args  # Can hold magic replace-me placeholders, e.g. #HEIGHT#
         self.cli_args: typ.List[Typ_shm_kw] = [t for t in cli_args]  # Deepcopy
 
+        # Only a tie-breaker among dependents free to go, see DependentMultiManager
         self.start_order = 0
         self.kill_order = 0
+        self.depends_on: typ.List[DependentProcess] = ([] if depends_on is None
+                                                       else list(depends_on))
 
         self.cset = cset
         self.rtprio = rtprio
+        self.rt_supervisor = RTSupervisor()
 
         self.kill_upon_init = kill_upon_create
 
+        self.ready_probes: typ.List[Probe] = ([PIDProbe()] if ready_probes
+                                              is None else ready_probes)
+        self.kill_probes: typ.List[Probe] = ([PIDGoneProbe()] if kill_probes
+                                             is None else kill_probes)
+        self.settled_probes: typ.List[Probe] = [TmuxSettledProbe()]
+
     def assign_tmux_pane(self):
         self.tmux_pane = tmux.find_or_create(self.tmux_name)
 
     def initialize_tmux(self, kill_upon_create):
         self.assign_tmux_pane()
         if kill_upon_create:
-            time.sleep(3.0)  # MUST NOT KILL the sourcing of bashrc/profile
+            # MUST NOT KILL the sourcing of bashrc/profile
+            wait_for_probes([(self, self.settled_probes)], 10.0)
             self.stop()
 
+    def arm_probes(self):
+        for probe in self.ready_probes + self.kill_probes:
+            probe.arm(self)
+
     def start_command_line(self):
         assert self.tmux_pane is not None
+        self.arm_probes()
         tmux.send_keys(self.tmux_pane, self.cli_cmd % tuple(self.cli_args))
 
     def start(self):
         self.start_command_line()
-        time.sleep(1)
+        wait_for_probes([(self, self.ready_probes)], self.READY_TIMEOUT)
         self.make_children_rt()
 
     def make_children_rt(self):
         if self.rtprio is not None:
-            # This works very partially.
-            # Because some dependents start aux processes,
-            # And because some dependents start by a sleep command...
-            # D'oh.
-            pids = []
+            # Some dependents start aux processes, or start by a sleep command...
+            # So this is called again and again from the polling thread:
+            # the supervisor only acts on processes it hasn't placed yet.
             pid = self.get_pid()
             if pid is not None:
-                pids = [pid]
-            while len(pids) > 0:
-                pid = pids.pop()
-                #print('PID: ', pid)
-                ret = subprocess.run([
-                        'milk-makecsetandrt',
-                        str(pid), self.cset,
-                        str(self.rtprio)
-                ], stdout=subprocess.DEVNULL)
-                children = subprocess.run(['pgrep', '-P',
-                                           str(pid)],
-                                          stdout=subprocess.PIPE).stdout.decode(
-                                                  'utf8').strip().split('\n')
-                if children[0] != '':
-                    pids += [int(c) for c in children]
-                #print('PIDs: ', pids)
+                self.rt_supervisor.place_tree(pid, self.cset, self.rtprio)
 
     def stop(self):
         if self.tmux_pane is None:
@@ -291,9 +378,11 @@ class DependentProcess:
         assert self.tmux_pane is not None
 
         tmux.kill_running_Cc(self.tmux_pane)
-        time.sleep(2)
+        if wait_for_probes([(self, self.kill_probes)], self.KILL_CC_TIMEOUT,
+                           log_failures=False):
+            return
         tmux.kill_running_Cz(self.tmux_pane)
-        time.sleep(1)
+        wait_for_probes([(self, self.kill_probes)], self.KILL_CZ_TIMEOUT)
 
     def is_running(self):
         return self.get_pid() is not None
@@ -307,44 +396,142 @@ class RemoteDependentProcess(DependentProcess):
 
     def __init__(self, tmux_name, cli_cmd, cli_args, remote_host,
                  cset: str = 'system', rtprio: typ.Optional[int] = None,
-                 kill_upon_create: bool = True):
+                 kill_upon_create: bool = True,
+                 ready_probes: typ.Optional[typ.List[Probe]] = None,
+                 kill_probes: typ.Optional[typ.List[Probe]] = None,
+                 depends_on: typ.Optional[typ.List[DependentProcess]] = None):
 
         self.remote_host = remote_host
 
         DependentProcess.__init__(self, tmux_name, cli_cmd, cli_args, cset=cset,
                                   rtprio=rtprio,
-                                  kill_upon_create=kill_upon_create)
+                                  kill_upon_create=kill_upon_create,
+                                  ready_probes=ready_probes,
+                                  kill_probes=kill_probes,
+                                  depends_on=depends_on)
 
     def assign_tmux_pane(self):
         self.tmux_pane = tmux.find_or_create_remote(self.tmux_name,
                                                     self.remote_host)
 
-    def start(self):
+    def start_command_line(self):
+        self.arm_probes()
         try:
             tmux.send_keys(self.tmux_pane, self.cli_cmd % tuple(self.cli_args))
         except subprocess.CalledProcessError as err:
             print(f"Remote {self.tmux_name} on {self.remote_host} tmux may be dead - attempting re-initialize"
                   )
             self.initialize_tmux(False)
-            tmux.send_keys(self.tmux_pane, self.cli_cmd % self.cli_args)
+            tmux.send_keys(self.tmux_pane, self.cli_cmd % tuple(self.cli_args))
 
-        time.sleep(1)
-        self.make_children_rt()
+    def make_children_rt(self):
+        # The PIDs are remote: we can't place them from here.
+        if self.rtprio is not None:
+            logg.warning(f'make_children_rt: cannot set rtprio of remote '
+                         f'{self.tmux_name} on {self.remote_host}.')
 
 
 class DependentMultiManager:
-    # The only point is to batch all the sleeping... that piles up quite a bit with lots of dependents.
+    '''
+        Starts and stops all the dependents of a camera, concurrently, along their depends_on edges:
+        a dependent is started once all those it depends on are started and ready (probes),
+        and stopped once all those depending on it are dead.
+        Independent branches - e.g. local and remote ones, on different hosts - go in parallel.
+
+        start_order / kill_order only order the submission of dependents free to go.
+        Edges to processes that are not managed here are ignored.
+    '''
 
     def __init__(self, dependents: typ.List[DependentProcess]) -> None:
         self.dependent_list = dependents
+        self.check_dependency_graph()
+
+    def _upstream(self, dep: DependentProcess) -> typ.List[DependentProcess]:
+        return [d for d in dep.depends_on if d in self.dependent_list]
+
+    def _downstream(self, dep: DependentProcess) -> typ.List[DependentProcess]:
+        return [d for d in self.dependent_list if dep in d.depends_on]
+
+    def check_dependency_graph(self) -> None:
+        '''
+            Raises CamstackStateException on a dependency cycle.
+        '''
+        done: typ.Set[int] = set()
+        path: typ.List[DependentProcess] = []
+
+        def visit(dep: DependentProcess) -> None:
+            if dep in path:
+                cycle = path[path.index(dep):] + [dep]
+                raise CamstackStateException(
+                        'Dependency cycle: ' +
+                        ' -> '.join(d.tmux_name for d in cycle))
+            if id(dep) in done:
+                return
+            path.append(dep)
+            for up in self._upstream(dep):
+                visit(up)
+            path.pop()
+            done.add(id(dep))
+
+        for dep in self.dependent_list:
+            visit(dep)
+
+    def _topological_order(
+            self, upstream: typ.Callable[[DependentProcess],
+                                         typ.List[DependentProcess]],
+            key: typ.Callable[[DependentProcess], int]
+    ) -> typ.List[DependentProcess]:
+        order: typ.List[DependentProcess] = []
+        remaining = sorted(self.dependent_list, key=key)
+        while remaining:
+            free = [
+                    dep for dep in remaining
+                    if all(up in order for up in upstream(dep))
+            ]
+            assert free  # check_dependency_graph
+            order += free
+            remaining = [dep for dep in remaining if dep not in free]
+        return order
+
+    def _run_graph(
+            self, action: typ.Callable[[DependentProcess], typ.Any],
+            upstream: typ.Callable[[DependentProcess],
+                                   typ.List[DependentProcess]],
+            key: typ.Callable[[DependentProcess], int]) -> None:
+        '''
+            Run action on every dependent, in a thread pool, each once its upstream is done.
+            A failed upstream doesn't block its downstream: it is logged, and we carry on.
+        '''
+        self.check_dependency_graph()
+
+        def after(ups: typ.List[Future], dep: DependentProcess) -> None:
+            for fut in ups:
+                fut.exception()  # Wait
+            action(dep)
+
+        futures: typ.Dict[DependentProcess, Future] = {}
+        # One worker per dependent: waiting on upstream never starves the pool.
+        with ThreadPoolExecutor(max_workers=len(self.dependent_list)) as pool:
+            for dep in self._topological_order(upstream, key):
+                futures[dep] = pool.submit(after,
+                                           [futures[up] for up in upstream(dep)],
+                                           dep)
+
+        for dep, fut in futures.items():
+            if fut.exception() is not None:
+                logg.error(f'DependentMultiManager: {dep.tmux_name} failed '
+                           f'[{fut.exception()!r}]')
 
     def initialize_tmux(self):
         if len(self.dependent_list) == 0:
             return
 
-        for dependent in self.dependent_list:
-            dependent.assign_tmux_pane()
-        time.sleep(3.0)
+        with ThreadPoolExecutor(max_workers=len(self.dependent_list)) as pool:
+            list(pool.map(lambda dep: dep.assign_tmux_pane(),
+                          self.dependent_list))
+        # MUST NOT KILL the sourcing of bashrc/profile
+        wait_for_probes([(dep, dep.settled_probes)
+                         for dep in self.dependent_list], 10.0)
 
         self.stop(watch_kill_create_flag=True)
 
@@ -352,30 +539,20 @@ class DependentMultiManager:
         if len(self.dependent_list) == 0:
             return
 
-        self.dependent_list.sort(key=lambda x: x.start_order)
-
-        for dependent in self.dependent_list:
-            dependent.start_command_line()
-        time.sleep(1.0)
-        for dependent in self.dependent_list:
-            dependent.make_children_rt()
+        self._run_graph(lambda dep: dep.start(), self._upstream,
+                        lambda dep: dep.start_order)
 
     def stop(self, watch_kill_create_flag: bool = False):
 
         if len(self.dependent_list) == 0:
             return
 
-        self.dependent_list.sort(key=lambda x: x.kill_order)
-        for dependent in self.dependent_list:
-            if (not watch_kill_create_flag) or dependent.kill_upon_init:
-                assert dependent.tmux_pane is not None
-                tmux.kill_running_Cc(dependent.tmux_pane)
-        time.sleep(2.0)
-        for dependent in self.dependent_list:
-            if (not watch_kill_create_flag) or dependent.kill_upon_init:
-                assert dependent.tmux_pane is not None
-                tmux.kill_running_Cz(dependent.tmux_pane)
-        time.sleep(.5)
+        def stop_one(dep: DependentProcess) -> None:
+            if (not watch_kill_create_flag) or dep.kill_upon_init:
+                dep.stop()
+
+        # Reverse edges: kill what depends on you first.
+        self._run_graph(stop_one, self._downstream, lambda dep: dep.kill_order)
 
 
 def shellify_methods(instance_of_camera, top_level_globals):
@@ -1,4 +1,5 @@
 import typing as t
+import functools
 from math import cos, sin
 
 from camstack.core.utilities import Typ_shm_kw
@@ -14,6 +15,24 @@ def wcs_dict_init(
         name: str = '',
         double_with_subaru_fake_standard: bool = True,
 ) -> WCSDictType:
+    '''
+    Polling threads call this every cycle, almost always with the same arguments:
+    the dictionaries are memoized, and a (shallow) copy is returned.
+    '''
+    return dict(
+            _wcs_dict_init_cached(wcs_num, tuple(pix), delt_val, cd_rot_rad,
+                                  name, double_with_subaru_fake_standard))
+
+
+@functools.lru_cache(maxsize=64)
+def _wcs_dict_init_cached(
+        wcs_num: int,
+        pix: t.Tuple[float, float],
+        delt_val: t.Union[float, t.Tuple[float, float]],
+        cd_rot_rad: float,
+        name: str,
+        double_with_subaru_fake_standard: bool,
+) -> WCSDictType:
 
     if not isinstance(delt_val, tuple):
         delt_val = (delt_val, delt_val)
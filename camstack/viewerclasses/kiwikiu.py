@@ -133,12 +133,12 @@ RCTRL + RALT + ARROWS   : same, but smaller
         self.lbl_backend.render((self.backend_obj.str_status_report(), ),
                                 blit_onto=self.pg_screen)
 
-        self.pg_updated_rects += [
-                self.lbl_gain_mfrate.rectangle,
-                self.lbl_size_minmax.rectangle,
-                self.lbl_mouse.rectangle,
-                self.lbl_backend.rectangle,
-        ]
+        self.pg_updated_rects += futs.changed_label_rects(
+                self.lbl_gain_mfrate,
+                self.lbl_size_minmax,
+                self.lbl_mouse,
+                self.lbl_backend,
+        )
 
 
 class KiwikiuViewerBackend(GenericViewerBackend):
@@ -188,14 +188,11 @@ RCTRL + RALT + ARROWS   : same, but smaller
             self.lbl_no_redis.render(('NO REDIS', ),
                                      blit_onto=self.pg_datasurface)
 
-        self.pg_updated_rects += [
-                getattr(obj, 'rectangle') for obj in [
-                        self.lbl_gain_mfrate, self.lbl_size_minmax,
-                        self.lbl_mouse, self.lbl_backend, self.lbl_tt,
-                        self.lbl_pil, self.lbl_no_redis, self.lbl_block,
-                        self.lbl_whatfilt, self.lbl_whatpickoff
-                ]
-        ]
+        # lbl_no_redis, lbl_block, lbl_whatfilt, lbl_whatpickoff are on the data surface,
+        # that is updated every frame.
+        self.pg_updated_rects += futs.changed_label_rects(
+                self.lbl_gain_mfrate, self.lbl_size_minmax, self.lbl_mouse,
+                self.lbl_backend, self.lbl_tt, self.lbl_pil)
 
 
 class PueoViewerBackend(GenericViewerBackend):
@@ -218,7 +215,7 @@ class PueoViewerBackend(GenericViewerBackend):
             self.redis_status = False
         self.redis_last_time = time.time()
 
-    def data_iter(self) -> None:
+    def data_iter(self) -> bool:
         if time.time() - self.redis_last_time > 0.5:
             self.redis_fetch()
 
@@ -274,9 +274,7 @@ CTRL  + s     : Save current position to last configuration"""
         assert self.data_debias_uncrop is not None
 
         # get image statistics for full data frame
-        self.data_min = np.min(self.data_raw_uncrop)
-        self.data_max = np.max(self.data_raw_uncrop)
-        self.data_mean = np.mean(self.data_raw_uncrop)
+        self.stats.update_uncropped(self.data_raw_uncrop)
 
         ## determine our camera mode from the data size
         Nx, Ny = self.data_debias_uncrop.shape
@@ -405,8 +403,9 @@ class VAMPIRESBaseViewerFrontend(PygameViewerFrontend):
                 (self.backend_obj.data_min, self.backend_obj.data_max,
                  self.backend_obj.data_mean), blit_onto=self.pg_screen)
 
-        self.pg_updated_rects.extend((
-                self.lbl_cropzone.rectangle,
-                self.lbl_times.rectangle,
-                self.lbl_data_val.rectangle,
-        ))
+        self.pg_updated_rects += futs.changed_label_rects(
+                self.lbl_cropzone,
+                self.lbl_times,
+                self.lbl_trig,
+                self.lbl_data_val,
+        )
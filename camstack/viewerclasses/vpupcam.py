@@ -72,11 +72,11 @@ class VAMPIRESPupilCamViewerFrontend(PygameViewerFrontend):
                 (self.backend_obj.data_min, self.backend_obj.data_max,
                  self.backend_obj.data_mean), blit_onto=self.pg_screen)
 
-        self.pg_updated_rects.extend((
-                self.lbl_cropzone.rectangle,
-                self.lbl_times.rectangle,
-                self.lbl_data_val.rectangle,
-        ))
+        self.pg_updated_rects += futs.changed_label_rects(
+                self.lbl_cropzone,
+                self.lbl_times,
+                self.lbl_data_val,
+        )
 
 
 class VAMPIRESPupilCamViewerBackend(GenericViewerBackend):
@@ -146,5 +146,7 @@ CTRL  + SHIFT + 8 : LyotStop-S"""
     def _data_grab(self) -> None:
         ## hack this to crop the troublesome rows of the Flea3
         super()._data_grab()
+        assert self.data_raw_frame is not None
         assert self.data_raw_uncrop is not None
+        self.data_raw_frame = self.data_raw_frame[1:, 1:]
         self.data_raw_uncrop = self.data_raw_uncrop[1:, 1:]
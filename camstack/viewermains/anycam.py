@@ -3,13 +3,15 @@
     pygame SHM viewer - generic basic version
 
     Usage:
-        anycam.py <shm_name> [-z <zoom>] [-b <binn>] [-w] [-f <fz>]
+        anycam.py <shm_name> [-z <zoom>] [-b <binn>] [-w] [-f <fz>] [-T] [-P <file>]
 
     Options:
         -z <zoom>    Graphics windows factor [default: 1]
         -f <fzoom>   Separate zooming for test. Default to == -z [default: 0]
         -w           Hidpi displays, forces fontzoom to 2 x <zoom>
         -b <binn>    SHM binning factor [default: 1]
+        -T           Threaded: process data in a separate thread from the display
+        -P <file>    Write the per-stage timing statistics to <file> (json) at exit
 '''
 
 import docopt
@@ -40,7 +42,7 @@ print(zoom, fonts_zoom)
 frontend = PygameViewerFrontend(zoom, 20, binned_backend_shape,
                                 fonts_zoom=fonts_zoom)
 frontend.register_backend(backend)
-frontend.run()  # Perpetual while True:
+frontend.run(threaded=args['-T'], profile_dump=args['-P'])  # Perpetual while True:
 
 
 # For pyproject entrypoint.
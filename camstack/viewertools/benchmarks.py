@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+'''
+    Viewer benchmarks, on a fake in-process SHM - no camera, no display needed.
+
+    benchmarks.py [pipeline]: compares the legacy (allocate-per-stage), preallocated,
+        and preallocated + lookup table data pipelines of the GenericViewerBackend.
+        <size> defaults to 256 1024 2048 (square frames).
+
+    benchmarks.py parity: checks that the lookup table pipeline colors frames as the legacy one,
+        for all z-scalings and colormaps: fraction of differing pixels, and max RGB difference.
+        <size> defaults to 256.
+
+    benchmarks.py viewer: GenericViewerBackend + PygameViewerFrontend, headless
+        (SDL dummy video driver), unthrottled. Sweeps all combinations of sizes, data types,
+        colormaps, z-scalings, window zooms, crop levels and plugin sets;
+        reports frames/s and median per-stage times.
+        <size> defaults to 64 256 1024 2048 (square frames).
+        Plugin sets: none, default (the frontend's own), overlays (enabled crosshairs,
+        bullseye, saturation).
+
+    Usage:
+        benchmarks.py viewer [-n <n_frames>] [-t <types>] [-m <cmaps>] [-l <zscales>] [-z <zooms>] [-c <crops>] [-p <plugins>] [-d <disp>] [-o <file>] [<size>...]
+        benchmarks.py parity [-n <n_frames>] [-t <type>] [-m <cmaps>] [<size>...]
+        benchmarks.py [pipeline] [-n <n_frames>] [-t <type>] [<size>...]
+
+    Options:
+        -n <n_frames>   Number of frames to time per configuration [default: 100]
+        -t <type>       Data type(s) of the fake SHM (see simcam_framegen), comma separated [default: u16]
+        -m <cmaps>      Colormaps, comma separated matplotlib names [default: gray,inferno]
+        -l <zscales>    Z-scalings, comma separated (LIN, ROOT3, LOG) [default: LIN,LOG]
+        -z <zooms>      Window zoom factors, comma separated [default: 1,2]
+        -c <crops>      Crop (zoom) levels, comma separated [default: 0]
+        -p <plugins>    Plugin sets, comma separated [default: none,overlays]
+        -d <disp>       Display base size (data area before window zoom) [default: 512]
+        -o <file>       Write all results, with the stats of every stage, to <file> (json)
+'''
+from __future__ import annotations
+
+import typing as typ
+if typ.TYPE_CHECKING:
+    import numpy.typing as npt
+
+import os
+import time
+import json
+import threading
+import tracemalloc
+
+# Headless: must be set before pygame opens a display.
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+_CORES = os.sched_getaffinity(0)  # AMD fix
+import pygame
+import pygame.constants as pgmc
+
+os.sched_setaffinity(0, _CORES)  # AMD fix
+
+import numpy as np
+from matplotlib import cm
+
+from camstack.acq.simcam_framegen import make_data_circ_buff, TYPE_DICT
+from camstack.viewertools.generic_viewer_backend import GenericViewerBackend
+from camstack.viewertools.pygame_viewer_frontend import PygameViewerFrontend
+from camstack.viewertools import utils_backend as buts
+from camstack.viewertools import plugins
+
+
+class _FakeImageMetadata:
+
+    def __init__(self) -> None:
+        self.cnt0 = 0
+
+
+class _FakeImage:
+    '''
+    Stand-in for the ImageStreamIO handle (SHM.IMAGE): frame counter and one semaphore.
+    '''
+
+    def __init__(self) -> None:
+        self.md = _FakeImageMetadata()
+        self._sem = threading.Semaphore(0)
+
+    def sempost(self, sem_id: int) -> None:
+        self._sem.release()
+
+    def semflush(self, sem_id: int) -> None:
+        while self._sem.acquire(blocking=False):
+            pass
+
+    def semtimedwait(self, sem_id: int, timeout: float) -> int:
+        return 0 if self._sem.acquire(timeout=timeout) else -1
+
+
+class FakeSHM:
+    '''
+    Minimal in-process stand-in for a pyMilk SHM.
+    Serves frames rolling through a simcam_framegen circular buffer.
+    Frames are published by calling new_frame.
+    '''
+
+    def __init__(self, shape: tuple[int, int],
+                 dtype: npt.DTypeLike = np.uint16) -> None:
+        self.shape = shape
+        self.dtype = dtype
+        self._circ_buff = make_data_circ_buff(shape[0], shape[1], dtype)
+
+        self.IMAGE = _FakeImage()
+        self.semID = 0
+
+    def new_frame(self) -> None:
+        self.IMAGE.md.cnt0 += 1
+        self.IMAGE.sempost(self.semID)
+
+    def get_data(self, check: bool = False, *args,
+                 copy: bool = True, **kwargs) -> np.ndarray:
+        col = self.IMAGE.md.cnt0 % self.shape[1]
+        data = self._circ_buff[:, col:col + self.shape[1]]
+        return data.copy() if copy else data
+
+    def get_keywords(self, *args, **kwargs) -> dict[str, typ.Any]:
+        return {}
+
+    def get_fps(self) -> float:
+        return 0.0
+
+    def get_expt(self) -> float:
+        return 0.0
+
+    def get_ndr(self) -> int:
+        return 1
+
+    def get_crop(self) -> tuple[int, int, int, int]:
+        return (0, 0, self.shape[0], self.shape[1])
+
+
+class BenchViewerBackend(GenericViewerBackend):
+    '''
+    GenericViewerBackend running on a FakeSHM.
+    '''
+
+    def __init__(self, fake_shm: FakeSHM, prealloc: bool = True,
+                 lut: bool = True) -> None:
+        self.fake_shm = fake_shm
+        self.PIPELINE_PREALLOC = prealloc
+        self.COLORING_LUT = lut
+        # Own shortcut dict: we create many backends + plugins in the same process.
+        self.SHORTCUTS = {}
+        super().__init__('bench')
+        self.cross_register_plugins([])
+
+    def _open_input_shm(self) -> FakeSHM:  # type: ignore # Override
+        return self.fake_shm
+
+
+def bench_backend_pipeline(backend: BenchViewerBackend,
+                           n_frames: int) -> tuple[float, float]:
+    '''
+    Time backend.data_iter, with a new frame every iteration.
+
+    Returns the mean ms/frame, and the peak transient memory allocated
+    during one frame, in MB.
+    '''
+    shm = backend.fake_shm
+
+    for _ in range(5):  # Warm up, let the lazy buffers allocate.
+        shm.new_frame()
+        backend.data_iter()
+
+    t_start = time.perf_counter()
+    for _ in range(n_frames):
+        shm.new_frame()
+        backend.data_iter()
+    ms_per_frame = (time.perf_counter() - t_start) / n_frames * 1e3
+
+    shm.new_frame()
+    tracemalloc.start()
+    mem_before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    backend.data_iter()
+    _, mem_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return ms_per_frame, (mem_peak - mem_before) / 2**20
+
+
+def main_backend_pipeline(sizes: list[int], n_frames: int,
+                          dtype: npt.DTypeLike) -> None:
+    configs = {  # name: (prealloc, lut)
+            'legacy': (False, False),
+            'prealloc': (True, False),
+            'lut': (True, True),
+    }
+    print(f'{"size":>6s} {"zscale":>6s} | ' +
+          ' | '.join(f'{name + " ms":>11s} {"MB":>6s}' for name in configs))
+    for size in sizes:
+        fake_shm = FakeSHM((size, size), dtype)
+        frame_mb = size * size * 4 / 2**20
+        for zscale in buts.ZScaleEnum:
+            results = []
+            for prealloc, lut in configs.values():
+                backend = BenchViewerBackend(fake_shm, prealloc, lut)
+                backend.toggle_scaling(zscale)
+                results += [bench_backend_pipeline(backend, n_frames)]
+            print(f'{size:6d} {zscale.name:>6s} | ' +
+                  ' | '.join(f'{ms:11.2f} {mb:6.1f}' for ms, mb in results))
+        print(f'       (1 float32 frame = {frame_mb:.1f} MB)')
+
+
+def check_lut_parity(sizes: list[int], n_frames: int, dtype: npt.DTypeLike,
+                     cmaps: list[str]) -> bool:
+    '''
+    Legacy vs. lookup table pipelines, on the same frames.
+    Colors may only differ on the few pixels that float rounding puts on the other side
+    of a colormap bin edge - by one colormap step.
+    Returns True if all configurations pass.
+    '''
+    all_ok = True
+    print(f'{"size":>6s} {"cmap":>8s} {"zscale":>6s} | {"diff px":>9s} {"max diff":>8s}')
+    for size in sizes:
+        fake_shm = FakeSHM((size, size), dtype)
+        for cmap_name in cmaps:
+            for zscale in buts.ZScaleEnum:
+                backends = [
+                        BenchViewerBackend(fake_shm, prealloc, lut)
+                        for prealloc, lut in ((False, False), (True, True))
+                ]
+                for backend in backends:
+                    backend.COLORMAPS = [getattr(cm, cmap_name)]
+                    backend.toggle_cmap(0)
+                    backend.toggle_scaling(zscale)
+
+                n_diff, max_diff = 0, 0
+                for _ in range(n_frames):
+                    fake_shm.new_frame()
+                    legacy, lut = [(backend.data_iter(), backend.data_rgbimg)[1]
+                                   for backend in backends]
+                    diff = np.abs(legacy.astype(np.int16) - lut).max(axis=-1)
+                    n_diff += np.count_nonzero(diff)
+                    max_diff = max(max_diff, int(diff.max()))
+
+                frac_diff = n_diff / (n_frames * size * size)
+                # One colormap step, with margin - and a smooth colormap.
+                ok = bool(frac_diff < 1e-3 and max_diff <= 16)
+                all_ok &= ok
+                print(f'{size:6d} {cmap_name:>8s} {zscale.name:>6s} | '
+                      f'{frac_diff:9.2e} {max_diff:8d} {("FAIL", "ok")[ok]}')
+
+    return all_ok
+
+
+def _plugins_none(frontend: PygameViewerFrontend) -> list:
+    return []
+
+
+def _plugins_default(frontend: PygameViewerFrontend) -> list:
+    return frontend.plugins
+
+
+def _plugins_overlays(frontend: PygameViewerFrontend) -> list:
+    plugs = [
+            plugins.CrossHairPlugin(frontend, pgmc.K_c),
+            plugins.CenteredCrossHairPlugin(frontend, pgmc.K_c,
+                                            pgmc.KMOD_LSHIFT),
+            plugins.BullseyePlugin(frontend),
+            plugins.SaturationPlugin(frontend, sat_value=100,
+                                     textbox=frontend.lbl_status),
+    ]
+    for plug in plugs:
+        if isinstance(plug, plugins.OnOffPlugin):
+            plug.enable()
+    return plugs
+
+
+PLUGIN_SETS: dict[str, typ.Callable[[PygameViewerFrontend], list]] = {
+        'none': _plugins_none,
+        'default': _plugins_default,
+        'overlays': _plugins_overlays,
+}
+
+# Per-stage medians printed by main_viewer - all of them go to the -o file.
+VIEWER_STAGES_PRINTED = ('grab', 'zscaling', 'coloring', 'pipeline', 'resize',
+                         'labels', 'blit_screen', 'display_update')
+
+
+def bench_viewer(frontend: PygameViewerFrontend, fake_shm: FakeSHM,
+                 n_frames: int) -> float:
+    '''
+    Run the frontend loop (minus the frame rate clock) with a new frame every iteration.
+    Returns the frames/s.
+    '''
+    assert frontend.backend_obj
+    prof = frontend.backend_obj.profiler
+
+    for _ in range(5):  # Warm up
+        fake_shm.new_frame()
+        frontend.loop_iter()
+
+    t_start = time.perf_counter()
+    for _ in range(n_frames):
+        fake_shm.new_frame()
+        frontend.loop_iter()
+        t = time.perf_counter_ns()
+        pygame.display.update(frontend.pg_updated_rects)
+        prof.lap('display_update', t)
+        pygame.event.pump()
+
+    return n_frames / (time.perf_counter() - t_start)
+
+
+def main_viewer(sizes: list[int], n_frames: int, dtypes: list[str],
+                cmaps: list[str], zscales: list[str], zooms: list[int],
+                crops: list[int], plugin_sets: list[str], disp_size: int,
+                output_file: str | None) -> None:
+
+    results = []
+
+    cols = ('size', 'type', 'cmap', 'zscale', 'zoom', 'crop', 'plugins', 'fps')
+    print(' '.join(f'{c:>8s}' for c in cols) + ' | ' +
+          ' '.join(f'{s[:8]:>8s}' for s in VIEWER_STAGES_PRINTED) +
+          '  (p50 ms)')
+
+    for size in sizes:
+        for dtype in dtypes:
+            fake_shm = FakeSHM((size, size), TYPE_DICT[dtype])
+            for cmap_name in cmaps:
+                for zscale in zscales:
+                    for zoom in zooms:
+                        for crop in crops:
+                            for plugin_set in plugin_sets:
+                                backend = BenchViewerBackend(fake_shm)
+                                backend.COLORMAPS = [getattr(cm, cmap_name)]
+                                backend.toggle_cmap(0)
+                                backend.toggle_scaling(buts.ZScaleEnum[zscale])
+                                backend.toggle_crop(crop)
+
+                                frontend = PygameViewerFrontend(
+                                        zoom, 1000, (disp_size, disp_size))
+                                frontend.plugins = PLUGIN_SETS[plugin_set](
+                                        frontend)
+                                frontend.register_backend(backend)
+
+                                fps = bench_viewer(frontend, fake_shm, n_frames)
+                                stats = backend.profiler.session_stats()
+
+                                config = (size, dtype, cmap_name, zscale, zoom,
+                                          crop, plugin_set)
+                                print(' '.join(f'{c:>8}' for c in config) +
+                                      f' {fps:8.1f} | ' + ' '.join(
+                                              f'{stats[s]["p50_ms"]:8.2f}'
+                                              if s in stats else f'{"-":>8s}'
+                                              for s in VIEWER_STAGES_PRINTED))
+
+                                results += [{
+                                        **dict(zip(cols, config)),
+                                        'fps': fps,
+                                        'stages': stats,
+                                }]
+
+    if output_file is not None:
+        with open(output_file, 'w') as fp:
+            json.dump({'disp_size': disp_size, 'n_frames': n_frames,
+                       'results': results}, fp, indent=2)
+
+
+if __name__ == '__main__':
+    import docopt
+
+    args = docopt.docopt(__doc__)
+
+    arg_n_frames = int(args['-n'])
+
+    if args['parity']:
+        arg_sizes = [int(s) for s in args['<size>']] or [256]
+        if not check_lut_parity(arg_sizes, arg_n_frames, TYPE_DICT[args['-t']],
+                                args['-m'].split(',')):
+            raise SystemExit(1)
+    elif args['viewer']:
+        arg_sizes = [int(s) for s in args['<size>']] or [64, 256, 1024, 2048]
+        main_viewer(arg_sizes, arg_n_frames, args['-t'].split(','),
+                    args['-m'].split(','), args['-l'].split(','),
+                    [int(z) for z in args['-z'].split(',')],
+                    [int(c) for c in args['-c'].split(',')],
+                    args['-p'].split(','), int(args['-d']), args['-o'])
+    else:
+        arg_sizes = [int(s) for s in args['<size>']] or [256, 1024, 2048]
+        main_backend_pipeline(arg_sizes, arg_n_frames, TYPE_DICT[args['-t']])
@@ -15,6 +15,7 @@ if typ.TYPE_CHECKING:
 
 from .plugin_arch import BasePlugin
 from . import utils_backend as buts
+from ..core.param_cache import ParamCache
 
 Sc = buts.Shortcut
 
@@ -23,10 +24,16 @@ from swmain.network.pyroclient import connect, connect_aorts
 
 class PyroProxyControl(BasePlugin):
 
+    # [s] Increase / decrease shortcuts reuse the last known value rather than
+    # doing a get round trip before every set.
+    PARAM_CACHE_TTL: float = 1.0
+
     def __init__(self, frontend_obj: PygameViewerFrontend,
                  pyro_key: str) -> None:
         super().__init__(frontend_obj)
 
+        self.param_cache = ParamCache(self.PARAM_CACHE_TTL)
+
         self.pyro_key = pyro_key
         import Pyro4
         try:
@@ -51,6 +58,29 @@ class PyroProxyControl(BasePlugin):
         '''
         pass
 
+    def get_param(self, name: str) -> typ.Any:
+        '''
+            pyro_proxy.get_<name>(), cached.
+        '''
+        return self.param_cache.fetch(
+                name, getattr(self.pyro_proxy, 'get_' + name))
+
+    def set_param(self, name: str, value: typ.Any) -> typ.Any:
+        '''
+            pyro_proxy.set_<name>(value) - caches the value echoed by the camera.
+        '''
+        self.param_cache.invalidate(name)
+        return self.param_cache.put(
+                name, getattr(self.pyro_proxy, 'set_' + name)(value))
+
+    def set_synchro(self, synchro: bool) -> None:
+        self.pyro_proxy.set_synchro(synchro)
+        self.param_cache.invalidate('fps')
+
+    def gain_protection_reset(self) -> None:
+        self.pyro_proxy.gain_protection_reset()
+        self.param_cache.invalidate('gain')
+
 
 class IiwiProxyControl(PyroProxyControl):
     HELP_MSG = '''
@@ -78,10 +108,10 @@ CTRL + o       : Increase FPS
         this_shortcuts: buts.T_ShortcutCbMap = {
                 # Ctrl + T          Set extrig ON
                 Sc(pgmc.K_t, pgmc.KMOD_LCTRL):
-                        partial(self.pyro_proxy.set_synchro, True),
+                        partial(self.set_synchro, True),
                 # Ctrl + Alt + T    Set extrig OFF
                 Sc(pgmc.K_t, pgmc.KMOD_LCTRL | pgmc.KMOD_LALT):
-                        partial(self.pyro_proxy.set_synchro, False),
+                        partial(self.set_synchro, False),
                 # Ctrl + g: decrease gain
                 Sc(pgmc.K_g, pgmc.KMOD_LCTRL):
                         self.decrease_gain,
@@ -101,35 +131,35 @@ CTRL + o       : Increase FPS
         self._append_shortcuts(this_shortcuts)
 
     def increase_gain(self):
-        gain = self.pyro_proxy.get_gain()
+        gain = self.get_param('gain')
         # Find and set first index > gain
         for g in self.SHORT_GAINS:
             if g > gain:
-                self.pyro_proxy.set_gain(g)
+                self.set_param('gain', g)
                 break
 
     def decrease_gain(self):
-        gain = self.pyro_proxy.get_gain()
+        gain = self.get_param('gain')
         # Find and set last index < gain
         for g in self.SHORT_GAINS[::-1]:
             if g < gain:
-                self.pyro_proxy.set_gain(g)
+                self.set_param('gain', g)
                 break
 
     def increase_fps(self):
-        fps = self.pyro_proxy.get_fps()
+        fps = self.get_param('fps')
         # Find and set first index > 1.05 * fps (avoid roundoff problems)
         for f in self.SHORT_FPS:
             if f > 1.05 * fps:
-                self.pyro_proxy.set_fps(f)
+                self.set_param('fps', f)
                 break
 
     def decrease_fps(self):
-        fps = self.pyro_proxy.get_fps()
+        fps = self.get_param('fps')
         # Find and set last index < 0.95 * fps
         for f in self.SHORT_FPS[::-1]:
             if f < 0.95 * fps:
-                self.pyro_proxy.set_fps(f)
+                self.set_param('fps', f)
                 break
 
 
@@ -161,10 +191,10 @@ CTRL + SHIFT + NUMBER: Set EM gain to 2**NUMBER
         this_shortcuts: buts.T_ShortcutCbMap = {
                 # Ctrl + T          Set extrig ON
                 Sc(pgmc.K_t, pgmc.KMOD_LCTRL):
-                        partial(self.pyro_proxy.set_synchro, True),
+                        partial(self.set_synchro, True),
                 # Ctrl + Alt + T    Set extrig OFF
                 Sc(pgmc.K_t, pgmc.KMOD_LCTRL | pgmc.KMOD_LALT):
-                        partial(self.pyro_proxy.set_synchro, False),
+                        partial(self.set_synchro, False),
                 # Ctrl + g: decrease gain
                 Sc(pgmc.K_g, pgmc.KMOD_LCTRL):
                         self.decrease_gain,
@@ -173,7 +203,7 @@ CTRL + SHIFT + NUMBER: Set EM gain to 2**NUMBER
                         self.increase_gain,
                 # Ctrl + Alt + g: gain reset
                 Sc(pgmc.K_g, pgmc.KMOD_LCTRL | pgmc.KMOD_LALT):
-                        self.pyro_proxy.gain_protection_reset,
+                        self.gain_protection_reset,
                 # Ctrl + l: decrease fps
                 Sc(pgmc.K_l, pgmc.KMOD_LCTRL):
                         self.decrease_fps,
@@ -185,40 +215,40 @@ CTRL + SHIFT + NUMBER: Set EM gain to 2**NUMBER
         # Ctrl + Shift + [0-9]: set direct EM gain
         for ii, key in enumerate(buts.NUMKEYS_0_9):
             this_shortcuts[Sc(key, pgmc.KMOD_LCTRL | pgmc.KMOD_LSHIFT)] =\
-                partial(self.pyro_proxy.set_gain, 2**ii)
+                partial(self.set_param, 'gain', 2**ii)
 
         # That's all we need for Pueo for now...
 
         self._append_shortcuts(this_shortcuts)
 
     def increase_gain(self):
-        gain = self.pyro_proxy.get_gain()
+        gain = self.get_param('gain')
         # Find and set first index > gain
         for g in self.SHORT_GAINS:
             if g > gain:
-                self.pyro_proxy.set_gain(g)
+                self.set_param('gain', g)
                 break
 
     def decrease_gain(self):
-        gain = self.pyro_proxy.get_gain()
+        gain = self.get_param('gain')
         # Find and set last index < gain
         for g in self.SHORT_GAINS[::-1]:
             if g < gain:
-                self.pyro_proxy.set_gain(g)
+                self.set_param('gain', g)
                 break
 
     def increase_fps(self):
-        fps = self.pyro_proxy.get_fps()
+        fps = self.get_param('fps')
         # Find and set first index > 1.05 * fps (avoid roundoff problems)
         for f in self.SHORT_FPS:
             if f > 1.05 * fps:
-                self.pyro_proxy.set_fps(f)
+                self.set_param('fps', f)
                 break
 
     def decrease_fps(self):
-        fps = self.pyro_proxy.get_fps()
+        fps = self.get_param('fps')
         # Find and set last index < 0.95 * fps
         for f in self.SHORT_FPS[::-1]:
             if f < 0.95 * fps:
-                self.pyro_proxy.set_fps(f)
+                self.set_param('fps', f)
                 break
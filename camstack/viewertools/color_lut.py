@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import typing as typ
+if typ.TYPE_CHECKING:
+    from matplotlib.colors import Colormap
+
+import numpy as np
+
+from . import utils_backend as buts
+
+
+class ColorLUT:
+    '''
+    Z-scaling + colormap lookup table engine.
+
+    Precomputes a (n_entries x 3) uint8 RGB table of the colormap, sampled on
+    the z-scaled [0, 1] display range.
+    Each frame is z-scaled in place (at most one pow / log10 pass), then linearly quantized
+    to a table index and colored with a single np.take: no matplotlib call in the loop.
+
+    The z-scaling must come before the quantization: quantizing the linear data
+    and baking the transform into the table loses the dark end of ROOT3 and LOG,
+    where a single linear bin spans many colors.
+    With n_entries a multiple of the colormap size, colors match the legacy cmap(zmapped).
+    '''
+
+    def __init__(self, cmap: Colormap,
+                 zscaling: int = buts.ZScaleEnum.LIN,
+                 n_entries: int = 4096) -> None:
+
+        self.n_entries = n_entries
+
+        self.cmap = cmap
+        self.zscaling = zscaling
+
+        self.table: np.ndarray = np.zeros((self.n_entries, 3), np.uint8)
+        self._dirty = True
+
+        self.n_rebuilds = 0
+
+    def set_cmap(self, cmap: Colormap) -> None:
+        self.cmap = cmap
+        self._dirty = True
+
+    def set_zscaling(self, zscaling: int) -> None:
+        # The table doesn't depend on it: no rebuild.
+        self.zscaling = zscaling
+
+    def _rebuild(self) -> None:
+        # Bin centers of the z-scaled [0, 1] range
+        zmapped = (np.arange(self.n_entries) + 0.5) / self.n_entries
+
+        self.table = np.ascontiguousarray(
+                self.cmap(zmapped, bytes=True)[:, :3])
+        self._dirty = False
+        self.n_rebuilds += 1
+
+    def quantize(self, data: np.ndarray, low: float, high: float,
+                 out: np.ndarray, scratch: np.ndarray) -> np.ndarray:
+        '''
+        data -> table indices in out (an intp array of the same shape as data)
+
+        scratch: float array of the same shape, receives the z-scaled data.
+        Rebuilds the table if need be.
+        '''
+        if self._dirty:
+            self._rebuild()
+
+        # Clipping first keeps pow / log in their domain - even if high < low.
+        np.clip(data, low, max(low, high), out=scratch, casting='same_kind')
+        np.subtract(scratch, low, out=scratch)
+        span = max(float(high - low), 0.0)
+
+        if self.zscaling == buts.ZScaleEnum.LIN:
+            zspan = span
+        elif self.zscaling == buts.ZScaleEnum.ROOT3:
+            np.power(scratch, 0.3, out=scratch)
+            zspan = span**0.3
+        elif self.zscaling == buts.ZScaleEnum.LOG:
+            np.log1p(scratch, out=scratch)
+            zspan = np.log1p(span)
+        else:
+            raise AssertionError(f"zscaling {self.zscaling} is invalid")
+
+        scale = self.n_entries / zspan if zspan != 0 else 0.0
+        # Truncating cast, of non-negative values: floor. zspan lands on n_entries,
+        # clipped to the last entry by colorize.
+        np.multiply(scratch, scale, out=out, casting='unsafe')
+
+        return out
+
+    def colorize(self, indices: np.ndarray, out: np.ndarray) -> np.ndarray:
+        '''
+        table indices -> uint8 RGB in out (shape indices.shape + (3,))
+        '''
+        np.take(self.table, indices, axis=0, out=out, mode='clip')
+        return out
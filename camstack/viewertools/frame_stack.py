@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import typing as typ
+if typ.TYPE_CHECKING:
+    import numpy.typing as npt
+
+import numpy as np
+
+from . import utils_backend as buts
+
+
+class FrameStack:
+    '''
+    Frame stacking engine over a preallocated ring buffer of the last `window` frames.
+
+    - mean(): windowed mean, O(1) per frame: a float64 running sum, adding the incoming frame
+      and subtracting the one it overwrites in the ring.
+      Exact for integer frames; float frames get the sum re-synced every SUM_RESYNC_PERIOD frames.
+    - ema(): exponential moving average, alpha defaults to 2 / (window + 1).
+    - median(), sigma_clipped_mean(): computed on demand from the ring.
+
+    Frames are stored in their native dtype (typically the SHM's uint16).
+
+    keep_frames=False: no ring, push() only accumulates the sum, mean() is then the mean
+    of everything pushed since the last reset(), regardless of window.
+    That's all the memory a plain mean needs - median and sigma-clipping need the ring.
+    '''
+
+    SUM_RESYNC_PERIOD = 1024
+
+    def __init__(self, shape: tuple[int, ...], window: int,
+                 dtype: npt.DTypeLike = np.float32, keep_frames: bool = True,
+                 ema_alpha: float | None = None) -> None:
+
+        assert window >= 1
+
+        self.shape = tuple(shape)
+        self.window = window
+        self.dtype = np.dtype(dtype)
+        self.keep_frames = keep_frames
+        self.ema_alpha = 2. / (window + 1) if ema_alpha is None else ema_alpha
+
+        self.frames: np.ndarray | None = None
+        if keep_frames:
+            self.frames = np.empty((window, ) + self.shape, self.dtype)
+
+        self._sum = np.zeros(self.shape, np.float64)
+        self._ema = np.zeros(self.shape, np.float32)
+        self._ema_scratch = np.empty(self.shape, np.float32)
+
+        self.idx_next = 0  # Ring slot of the next push
+        self.n_pushed = 0  # Since the last reset
+
+    def reset(self) -> None:
+        self._sum[:] = 0.
+        self.idx_next = 0
+        self.n_pushed = 0
+
+    @property
+    def n_filled(self) -> int:
+        '''
+        Number of frames in the stack.
+        '''
+        if self.keep_frames:
+            return min(self.n_pushed, self.window)
+        return self.n_pushed
+
+    def push(self, frame: np.ndarray) -> None:
+        if self.frames is not None:
+            slot = self.frames[self.idx_next]
+            if self.n_pushed >= self.window:  # Forget the oldest frame
+                np.subtract(self._sum, slot, out=self._sum)
+            np.copyto(slot, frame, casting='unsafe')
+            np.add(self._sum, slot, out=self._sum)
+            self.idx_next = (self.idx_next + 1) % self.window
+        else:
+            np.add(self._sum, frame, out=self._sum)
+
+        if self.n_pushed == 0:
+            np.copyto(self._ema, frame, casting='unsafe')
+        else:
+            # ema += alpha * (frame - ema)
+            np.subtract(frame, self._ema, out=self._ema_scratch,
+                        casting='unsafe')
+            self._ema_scratch *= self.ema_alpha
+            self._ema += self._ema_scratch
+
+        self.n_pushed += 1
+
+        if (self.frames is not None and self.dtype.kind == 'f' and
+                    self.n_pushed % self.SUM_RESYNC_PERIOD == 0):
+            np.sum(self.frames, axis=0, dtype=np.float64, out=self._sum)
+
+    def _get_out(self, out: np.ndarray | None) -> np.ndarray:
+        if out is None:
+            return np.empty(self.shape, np.float32)
+        return out
+
+    def mean(self, out: np.ndarray | None = None) -> np.ndarray:
+        out = self._get_out(out)
+        np.multiply(self._sum, 1. / max(1, self.n_filled), out=out,
+                    casting='unsafe')
+        return out
+
+    def ema(self, out: np.ndarray | None = None) -> np.ndarray:
+        out = self._get_out(out)
+        np.copyto(out, self._ema)
+        return out
+
+    def _filled_frames(self) -> np.ndarray:
+        if self.frames is None:
+            raise ValueError('FrameStack built with keep_frames=False '
+                             'cannot compute a median.')
+        # Slots are filled in order from 0, so this is right before the ring wraps, too.
+        return self.frames[:max(1, self.n_filled)]
+
+    def median(self, out: np.ndarray | None = None) -> np.ndarray:
+        out = self._get_out(out)
+        out[:] = np.median(self._filled_frames(), axis=0)
+        return out
+
+    def sigma_clipped_mean(self, n_sigma: float = 3.,
+                           out: np.ndarray | None = None) -> np.ndarray:
+        '''
+        Per-pixel mean of the frames within n_sigma of the median,
+        sigma being estimated robustly from the median absolute deviation.
+        '''
+        out = self._get_out(out)
+        frames = self._filled_frames().astype(np.float32)
+
+        med = np.median(frames, axis=0)
+        dev = np.abs(frames - med)
+        sigma = 1.4826 * np.median(dev, axis=0)
+
+        # At least half the frames are within the MAD of the median: count > 0.
+        keep = dev <= n_sigma * sigma
+        count = keep.sum(axis=0)
+        out[:] = np.where(keep, frames, 0.).sum(axis=0) / np.maximum(count, 1)
+
+        return out
+
+    def combine(self, mode: buts.StackModeEnum,
+                out: np.ndarray | None = None) -> np.ndarray:
+        if mode == buts.StackModeEnum.MEAN:
+            return self.mean(out)
+        elif mode == buts.StackModeEnum.EMA:
+            return self.ema(out)
+        elif mode == buts.StackModeEnum.MEDIAN:
+            return self.median(out)
+        elif mode == buts.StackModeEnum.CLIPPED_MEAN:
+            return self.sigma_clipped_mean(out=out)
+        raise AssertionError(f"Stacking mode {mode} is invalid")
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import numpy as np
+
+# Elements per block for the fused reductions: 64k float32 = 256 kB, stays in L2.
+FUSED_BLOCK_SIZE = 1 << 16
+
+
+def fused_min_max_mean(data: np.ndarray, nan_aware: bool = False,
+                       block_size: int = FUSED_BLOCK_SIZE
+                       ) -> tuple[float, float, float]:
+    '''
+    Min, max and mean of data in a single pass over memory.
+
+    Numpy has no fused reduction, so we reduce by blocks of rows small enough
+    to stay in cache: each block is read once from RAM and three times from cache,
+    instead of the whole frame being read three times from RAM.
+
+    nan_aware: use fmin/fmax, which ignore NaNs (the mean does not).
+    '''
+    op_min, op_max = (np.fmin, np.fmax) if nan_aware else (np.minimum,
+                                                           np.maximum)
+
+    n_rows = data.shape[0]
+    row_size = max(1, data.size // max(1, n_rows))
+    block_rows = max(1, block_size // row_size)
+
+    if block_rows >= n_rows:  # Fits in cache anyway
+        return (float(op_min.reduce(data, axis=None)),
+                float(op_max.reduce(data, axis=None)),
+                float(np.add.reduce(data, axis=None, dtype=np.float64) /
+                      data.size))
+
+    d_min, d_max, d_sum = np.inf, -np.inf, 0.0
+    for r in range(0, n_rows, block_rows):
+        block = data[r:r + block_rows]
+        d_min = op_min(d_min, op_min.reduce(block, axis=None))
+        d_max = op_max(d_max, op_max.reduce(block, axis=None))
+        d_sum += np.add.reduce(block, axis=None, dtype=np.float64)
+
+    return float(d_min), float(d_max), float(d_sum / data.size)
+
+
+def histogram_percentile(data: np.ndarray, q: float, low: float, high: float,
+                         n_bins: int = 1024) -> float:
+    '''
+    Approximate q-th percentile of data, known to lie within [low, high].
+    NaNs are ignored, as in np.nanpercentile.
+
+    Histogram, then linear interpolation within the bin that crosses q:
+    the error is bounded by (high - low) / n_bins, with no sort.
+    '''
+    if not high > low:
+        return low
+
+    hist, edges = np.histogram(data, bins=n_bins, range=(low, high))
+    cdf = np.cumsum(hist)
+    if cdf[-1] == 0:
+        return low
+
+    target = q / 100. * cdf[-1]
+    kk = int(np.searchsorted(cdf, target))
+    below = cdf[kk - 1] if kk > 0 else 0
+    frac = (target - below) / hist[kk] if hist[kk] > 0 else 0.
+
+    return float(edges[kk] + frac * (edges[kk + 1] - edges[kk]))
+
+
+class FrameStatistics:
+    '''
+    Shared statistics cache of a viewer backend.
+
+    Refreshed once per frame by the backend pipeline, read by the frontend and plugins:
+    nobody else should be scanning the frame for its min or max.
+
+    - data_min, data_max, data_mean: full (uncropped) frame, one fused pass.
+    - plot_min, plot_max: displayed (cropped) frame, NaN-aware.
+    - percentile(): approximate, on a strided subsample, recomputed every
+      `percentile_cadence` frames.
+    '''
+
+    def __init__(self, percentile_cadence: int = 10,
+                 percentile_stride: int = 4, percentile_bins: int = 1024) -> None:
+        self.percentile_cadence = percentile_cadence
+        self.percentile_stride = percentile_stride
+        self.percentile_bins = percentile_bins
+
+        self.data_min: float = 0.0
+        self.data_max: float = 0.0
+        self.data_mean: float = 0.0
+
+        self.plot_min: float = 0.0
+        self.plot_max: float = 0.0
+
+        self.n_frames = 0
+        self._percentiles: dict[float, tuple[int, float]] = {
+        }  # q: (frame computed, value)
+
+    def invalidate(self) -> None:
+        '''
+        Drop cached percentiles - when the crop, the SHM, the debiasing or the z-scaling changes.
+        '''
+        self._percentiles = {}
+
+    def update_uncropped(self, data: np.ndarray) -> None:
+        self.n_frames += 1
+        self.data_min, self.data_max, self.data_mean = fused_min_max_mean(
+                data)
+
+    def update_cropped(self, data: np.ndarray) -> None:
+        self.plot_min, self.plot_max, _ = fused_min_max_mean(
+                data, nan_aware=True)
+
+    def percentile(self, data: np.ndarray, q: float) -> float:
+        '''
+        q-th percentile of data (cropped frame). Call after update_cropped.
+        '''
+        if q in self._percentiles:
+            frame, value = self._percentiles[q]
+            if self.n_frames - frame < self.percentile_cadence:
+                return value
+
+        ss = self.percentile_stride
+        value = histogram_percentile(data[::ss, ::ss], q, self.plot_min,
+                                     self.plot_max, self.percentile_bins)
+        self._percentiles[q] = (self.n_frames, value)
+
+        return value
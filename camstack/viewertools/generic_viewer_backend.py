@@ -7,6 +7,9 @@ if typ.TYPE_CHECKING:  # this type hint would cause a circular import
     from .plugin_arch import BasePlugin
 
 import os
+import time
+import queue
+import threading
 
 _CORES = os.sched_getaffinity(0)  # AMD fix
 import pygame.constants as pgmc  # For shortcuts
@@ -19,6 +22,12 @@ import pyMilk.errors
 
 from . import utils_backend as buts
 from .utils_backend import Shortcut as Sc
+from .color_lut import ColorLUT
+from .frame_stats import FrameStatistics
+from .frame_stack import FrameStack
+from .profiling import PipelineProfiler
+
+from camstack.core.thread import HackedExitJoinThread
 
 from astropy.io import fits
 from pyMilk.interfacing.shm import SHM
@@ -27,6 +36,9 @@ import numpy as np
 from matplotlib import cm
 from functools import partial
 
+if typ.TYPE_CHECKING:
+    import numpy.typing as npt
+
 
 class GenericViewerBackend:
     '''
@@ -48,11 +60,13 @@ r         : subtract reference frame
 l         : cycle scaling (lin, root, log)
 m         : cycle colormaps
 v         : start/stop averaging frames
+CTRL + v  : cycle averaging mode (mean, exp. moving, median, sig. clip)
 SPACE     : freeze frame
 z         : zoom on the center of the image
 SHIFT + z : unzoom image (cycle backwards)
 CTRL + z  : reset zoom and crop
 ARROWS    : steer crop
+F12       : show/hide the timing (profiling) overlay
     """
 
     COLORMAPS_A = [cm.gray, cm.inferno, cm.magma, cm.viridis]  # type: ignore
@@ -66,17 +80,41 @@ ARROWS    : steer crop
     SHORTCUTS: buts.T_ShortcutCbMap = {
     }  # Do not subclass this, see constructor
 
+    # Preallocated pipeline: every data stage writes into buffers allocated
+    # once per SHM shape, with out= ufuncs. False restores the allocate-per-stage behavior.
+    PIPELINE_PREALLOC: bool = True
+    # Z-scaling and coloring through a precomputed RGB lookup table (see color_lut.ColorLUT)
+    # With it, data_zmapped holds the table indices rather than the [0, 1] normalized data.
+    COLORING_LUT: bool = True
+    LUT_SIZE: int = 4096
+
+    # Approximate percentile (for autoclipping) refresh rate in frames, and subsampling stride.
+    STATS_PERCENTILE_CADENCE: int = 10
+    STATS_PERCENTILE_STRIDE: int = 4
+
+    # Max time [s] to block on the SHM semaphore (when flag_grab_wait, e.g. threaded mode)
+    # and pacing of the worker when there's no SHM to wait on (frozen frame).
+    GRAB_TIMEOUT: float = 0.2
+    WORKER_IDLE_PERIOD: float = 0.05
+    # With no new frame for that long [s], probe the SHM for a re-creation (AutoRelinkError)
+    RELINK_PROBE_PERIOD: float = 1.0
+
+    # Averaging (see toggle_averaging): window in frames, and startup mode
+    AVERAGING_WINDOW: int = 10
+    AVERAGING_MODE: buts.StackModeEnum = buts.StackModeEnum.MEAN
+
     def __init__(self, name_shm: str) -> None:
 
         self.has_frontend = False
 
         ### SHM
         self.name_shm = name_shm
-        self.input_shm = SHM(name_shm, symcode=0)
+        self.input_shm = self._open_input_shm()
 
         ### DATA Pipeline
         # yapf: disable
-        self.data_raw_uncrop: np.ndarray | None = None  # Fresh out of SHM
+        self.data_raw_frame: np.ndarray | None = None  # Fresh out of SHM
+        self.data_raw_uncrop: np.ndarray | None = None  # Averaged, if averaging
         self.data_debias_uncrop: np.ndarray | None = None  # Debiased (ref, bias, badpix)
         self.data_debias: np.ndarray | None = None  # Cropped
         self.data_zmapped: np.ndarray | None = None  # Apply Z scaling
@@ -87,10 +125,46 @@ ARROWS    : steer crop
         self.data_for_sub_ref: np.ndarray | None = None
         #yapf: enable
 
+        # Preallocated pipeline buffers, by stage name.
+        self._pipeline_buffers: dict[str, np.ndarray] = {}
+        self._cmap_lut: np.ndarray | None = None  # uint8 RGB, cmap.N x 3
+        self.color_lut: ColorLUT | None = None
+
+        # Per-stage timings of the backend, plugins and frontend.
+        self.profiler = PipelineProfiler()
+
+        # Shared frame statistics cache - see data_min, data_max, data_mean.
+        self.stats = FrameStatistics(self.STATS_PERCENTILE_CADENCE,
+                                     self.STATS_PERCENTILE_STRIDE)
+
         ### Clipping for pipeline
         self.low_clip: float | None = None
         self.high_clip: float | None = None
 
+        ### Frame acquisition
+        self.flag_grab_wait: bool = False  # Block on the SHM semaphore in _poll_new_frame
+        self.flag_reprocess: bool = False  # Rerun the pipeline even without a new frame
+        self.last_cnt0: int | None = None  # SHM frame counter of the last grabbed frame
+        self.n_frames_missed: int = 0  # Frames that were published in the SHM but never grabbed
+        self._t_last_new_frame = time.time()
+        self.flag_new_frame: bool = False  # The current data_iter grabbed a new frame
+
+        ### Averaging
+        self.stacker: FrameStack | None = None  # Allocated by toggle_averaging
+        self.averaging_mode: buts.StackModeEnum = self.AVERAGING_MODE
+
+        ### Threaded mode (see start_worker)
+        self.frame_publisher = buts.FramePublisher()
+        self._shortcut_queue: queue.SimpleQueue[buts.Shortcut] = queue.SimpleQueue()
+        self._worker_event: threading.Event | None = None
+        self._worker: HackedExitJoinThread | None = None
+        self._worker_exception: BaseException | None = None
+        # Held by data_iter while it changes the data, and by the frontend while it reads it
+        # (labels, plugins) - see run_plugin_actions.
+        self.state_lock = threading.RLock()
+        self._plugins_pending: bool = False  # The worker processed data the plugins haven't seen
+        self._plugins_new_frame: bool = False  # ... including a new frame
+
         ### Various flags
         self.flag_frozenframe: bool = False
         self.flag_subref_on: bool = False
@@ -101,10 +175,13 @@ ARROWS    : steer crop
 
         ### COLORING
         self.cmap_id = 1
+        self.color_lut = ColorLUT(self.COLORMAPS[self.cmap_id],
+                                  self.idx_zscaling, self.LUT_SIZE)
         self.toggle_cmap(self.cmap_id)  # Select startup CM
 
         ### SIZING
         self.shm_shape = self.input_shm.shape
+        self._alloc_pipeline_buffers()
         self.crop_lvl_id = 0
         if self.CROP_CENTER_SPOT is None:
             self.CROP_CENTER_SPOT = self.shm_shape[0] / 2., self.shm_shape[1] / 2.
@@ -122,6 +199,7 @@ ARROWS    : steer crop
                 Sc(pgmc.K_z, pgmc.KMOD_LSHIFT): partial(self.toggle_crop, incr=-1),
                 Sc(pgmc.K_z, pgmc.KMOD_LCTRL): self.reset_crop,
                 Sc(pgmc.K_v, 0x0): self.toggle_averaging,
+                Sc(pgmc.K_v, pgmc.KMOD_LCTRL): self.cycle_averaging_mode,
                 Sc(pgmc.K_SPACE, 0x0): self.toggle_freeze,
                 Sc(pgmc.K_UP, 0x0): partial(self.steer_crop, pgmc.K_UP),
                 Sc(pgmc.K_DOWN, 0x0): partial(self.steer_crop, pgmc.K_DOWN),
@@ -130,16 +208,66 @@ ARROWS    : steer crop
                 Sc(pgmc.K_d, 0x0): self.toggle_sub_dark,
                 Sc(pgmc.K_r, 0x0): self.toggle_sub_ref,
                 Sc(pgmc.K_k, 0x0): self.print_keywords,
+                Sc(pgmc.K_F12, 0x0): self.toggle_profiling_overlay,
         }
         # yapf: enable
         # Note escape and X are reserved for quitting
 
         self.SHORTCUTS.update(this_shortcuts)
 
+    def _open_input_shm(self) -> SHM:
+        '''
+        Initialization function.
+        Open the input SHM. Separated so it can be overloaded (e.g. for benchmarking).
+        '''
+        return SHM(self.name_shm, symcode=0)
+
+    def _alloc_pipeline_buffers(self) -> None:
+        '''
+        Initialization function.
+        Drop all pipeline buffers and preallocate the ones that have the SHM shape.
+        Must be called again whenever the SHM shape changes.
+
+        The buffers downstream of the crop are (re)allocated lazily by _get_buffer,
+        since subclasses can crop to arbitrary shapes.
+        '''
+        self._pipeline_buffers = {}
+        if not self.PIPELINE_PREALLOC:
+            return
+
+        self._get_buffer('raw', self.shm_shape)
+        self._get_buffer('debias', self.shm_shape)
+
+    def _get_buffer(self, name: str, shape: tuple[int, ...],
+                    dtype: npt.DTypeLike = np.float32) -> np.ndarray:
+        '''
+        Internal function.
+        Return the pipeline buffer `name`, only allocating it
+        if it doesn't exist or its shape/dtype doesn't match.
+        '''
+        shape = tuple(shape)
+        buf = self._pipeline_buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = np.empty(shape, dtype=dtype)
+            self._pipeline_buffers[name] = buf
+        return buf
+
+    @property
+    def data_min(self) -> float:
+        return self.stats.data_min
+
+    @property
+    def data_max(self) -> float:
+        return self.stats.data_max
+
+    @property
+    def data_mean(self) -> float:
+        return self.stats.data_mean
+
     def str_status_report(self) -> str:
         ll: list[str] = [('lin.', '1/3', 'log.')[self.idx_zscaling]]
         if self.flag_averaging:
-            ll += ['Ave.']
+            ll += [('Ave.', 'EMA', 'Med.', 'Clip.')[self.averaging_mode]]
         if self.flag_frozenframe:
             ll += ['Frozen']
         if self.flag_subdark_on:
@@ -196,8 +324,11 @@ ARROWS    : steer crop
         In-graphicsloop function.
         Toggle a backend (computational) action for each and every plugin.
         '''
+        prof = self.profiler
+        t = time.perf_counter_ns()
         for plugin in self.plugin_objs:
             plugin.backend_action()
+            t = prof.lap(type(plugin).__name__ + '.backend', t)
 
     def toggle_cmap(self, which: int | None = None) -> None:
         '''
@@ -209,6 +340,11 @@ ARROWS    : steer crop
         else:
             self.cmap_id = which
         self.cmap = self.COLORMAPS[self.cmap_id]
+        # Same table matplotlib builds internally for bytes=True, minus alpha.
+        self._cmap_lut = np.ascontiguousarray(
+                self.cmap(np.arange(self.cmap.N), bytes=True)[:, :3])
+        if self.color_lut is not None:
+            self.color_lut.set_cmap(self.cmap)
 
     def toggle_sub_dark(self, state: bool | None = None):
         '''
@@ -222,6 +358,7 @@ ARROWS    : steer crop
             self.flag_subref_on = False
         if not state:
             self.flag_subdark_on = False
+        self.stats.invalidate()
 
     def toggle_sub_ref(self, state: bool | None = None):
         '''
@@ -235,6 +372,7 @@ ARROWS    : steer crop
             self.flag_subdark_on = False
         if not state:
             self.flag_subref_on = False
+        self.stats.invalidate()
 
     def toggle_scaling(self, value: int | None = None) -> None:
         '''
@@ -245,6 +383,9 @@ ARROWS    : steer crop
             self.idx_zscaling = (self.idx_zscaling + 1) % 3
         else:
             self.idx_zscaling = value
+        if self.color_lut is not None:
+            self.color_lut.set_zscaling(self.idx_zscaling)
+        self.stats.invalidate()
 
     def toggle_crop(self, which: int | None = None, incr: int = 1) -> None:
         '''
@@ -264,6 +405,7 @@ ARROWS    : steer crop
                                                    self.shm_shape)
         else:
             self.crop_slice = np.s_[:, :]
+        self.stats.invalidate()
 
     def reset_crop(self) -> None:
         '''
@@ -330,13 +472,33 @@ ARROWS    : steer crop
     def toggle_averaging(self, set_av: bool | None = None) -> None:
         '''
         Callback function.
-        Toggle continuous frame averaging for display.
+        Toggle frame averaging for display, over the last AVERAGING_WINDOW frames.
+
+        The stack is allocated when averaging starts and released when it stops:
+        it holds AVERAGING_WINDOW frames in the SHM dtype.
         '''
         self.flag_averaging = not self.flag_averaging if set_av is None else set_av
 
         if self.flag_averaging:
             self.flag_frozenframe = False
-        self.count_averaging = 0
+            shm_dtype = self.input_shm.get_data(copy=False).dtype
+            if (self.stacker is None or self.stacker.shape != tuple(self.shm_shape)
+                        or self.stacker.dtype != shm_dtype):
+                self.stacker = FrameStack(self.shm_shape, self.AVERAGING_WINDOW,
+                                          shm_dtype)
+            self.stacker.reset()
+        else:
+            self.stacker = None
+
+    def cycle_averaging_mode(self) -> None:
+        '''
+        Callback function.
+        Cycle the averaging mode: windowed mean, exponential moving average, median, sigma-clipped mean.
+        The stack is unchanged, so switching is immediate.
+        '''
+        self.averaging_mode = buts.StackModeEnum(
+                (self.averaging_mode + 1) % len(buts.StackModeEnum))
+        self.flag_reprocess = True
 
     def toggle_freeze(self, set_freeze: bool | None = None) -> None:
         '''
@@ -346,7 +508,14 @@ ARROWS    : steer crop
         self.flag_frozenframe = not self.flag_frozenframe if set_freeze is None else set_freeze
 
         if self.flag_frozenframe:
-            self.flag_averaging = False
+            self.toggle_averaging(False)
+
+    def toggle_profiling_overlay(self) -> None:
+        '''
+        Callback function.
+        Toggle the display of the per-stage timings by the frontend.
+        '''
+        self.profiler.show_overlay = not self.profiler.show_overlay
 
     def print_keywords(self) -> None:
         '''
@@ -372,59 +541,174 @@ ARROWS    : steer crop
         '''
         self.low_clip = low
         self.high_clip = high
+        self.flag_reprocess = True
 
-    def data_iter(self) -> None:
+    def data_iter(self) -> bool:
         '''
         MAIN In-graphicsloop function.
         Acquires and processes the data and calls the plugin in-loop function.
 
         It's the GUI's framerating loop that will call this function
         in short, the frontend shall call this during its own loop_iter().
+
+        The whole pipeline is skipped if there is no new frame in the SHM (per its frame counter)
+        and no shortcut changed the processing since the last call.
+        Returns True iff the pipeline ran.
+
+        In the worker thread, the plugins are left to the frontend: see run_plugin_actions.
         '''
+        has_new_frame = False
+        relink = False
         if not self.flag_frozenframe:
             try:
+                # May block on the SHM semaphore: not holding the state lock.
+                has_new_frame = self._poll_new_frame()
+            except pyMilk.errors.AutoRelinkError:
+                relink = True
+
+        with self.state_lock:
+            return self._data_iter_locked(has_new_frame, relink)
+
+    def _data_iter_locked(self, has_new_frame: bool, relink: bool) -> bool:
+        prof = self.profiler
+
+        self.flag_new_frame = False
+        if has_new_frame:
+            try:
+                t = time.perf_counter_ns()  # After the semaphore wait
                 self._data_grab()
+                prof.lap('grab', t)
             except pyMilk.errors.AutoRelinkError:
-                # Disable zoom, averaging and freeze
-                # We're litteraly changing the data size so there's
-                # A LOT of housekeeping to do.
-                self.toggle_averaging(False)
-                self.toggle_freeze(False)
-                self.toggle_sub_dark(False)
-                self.data_for_sub_dark = None
-                self.data_for_sub_ref = None
-                self.toggle_sub_ref(False)
-                self.toggle_crop(0)
-                self.input_shm = SHM(self.name_shm, symcode=0)
-                self.shm_shape = self.input_shm.shape
-
-                self._data_grab()  # If this one crashes we're in danger.
+                relink = True
+
+        if relink:
+            # Disable zoom, averaging and freeze
+            # We're litteraly changing the data size so there's
+            # A LOT of housekeeping to do.
+            self.toggle_averaging(False)
+            self.toggle_freeze(False)
+            self.toggle_sub_dark(False)
+            self.data_for_sub_dark = None
+            self.data_for_sub_ref = None
+            self.toggle_sub_ref(False)
+            self.toggle_crop(0)
+            self.input_shm = self._open_input_shm()
+            self.shm_shape = self.input_shm.shape
+            self._alloc_pipeline_buffers()
+            self.last_cnt0 = None
+
+            self._poll_new_frame()
+            self._data_grab()  # If this one crashes we're in danger.
+            has_new_frame = True
+
+        if not (has_new_frame or self.flag_reprocess):
+            return False
+        self.flag_reprocess = False
+        self.flag_new_frame = has_new_frame
+
+        # 'pipeline': all the processing of one frame, grab excluded.
+        t_pipe = t = time.perf_counter_ns()
         self._data_referencing()
+        t = prof.lap('referencing', t)
         self._data_crop()
+        t = prof.lap('crop', t)
         self._data_zscaling()
+        t = prof.lap('zscaling', t)
         self._data_coloring()
+        t = prof.lap('coloring', t)
+
+        if threading.current_thread() is self._worker:
+            # Plugins render labels: the frontend thread runs them, see run_plugin_actions
+            self._plugins_pending = True
+            self._plugins_new_frame |= has_new_frame
+        else:
+            self._inloop_plugin_action()
 
-        self._inloop_plugin_action()
+        prof.lap('pipeline', t_pipe)
+        prof.tick('pipeline_period')
 
         self.flag_data_init = True  # Data is now initialized!
 
+        return True
+
+    def _poll_new_frame(self) -> bool:
+        '''
+        Data function.
+        Is there a frame in the SHM that we haven't grabbed yet? Per the SHM frame counter cnt0.
+
+        If flag_grab_wait, and there's no new frame yet, block on our own semaphore
+        of the SHM for up to GRAB_TIMEOUT.
+        We flush before reading the counter: any frame written after the flush posts the semaphore,
+        any frame written before is visible in the counter. No lost frame, no spurious wake-up.
+
+        Can raise AutoRelinkErrors from pyMilk, see RELINK_PROBE_PERIOD.
+        '''
+        img = self.input_shm.IMAGE
+        sem_id = self.input_shm.semID
+
+        if self.flag_grab_wait:
+            img.semflush(sem_id)
+
+        cnt0 = img.md.cnt0
+        if cnt0 == self.last_cnt0 and self.flag_grab_wait:
+            img.semtimedwait(sem_id, self.GRAB_TIMEOUT)
+            cnt0 = img.md.cnt0
+
+        if cnt0 == self.last_cnt0:
+            # A re-created SHM would freeze the counter of our stale mapping forever
+            # Have pyMilk check (that'll raise AutoRelinkError).
+            if time.time() - self._t_last_new_frame > self.RELINK_PROBE_PERIOD:
+                self._t_last_new_frame = time.time()
+                self.input_shm.get_data(copy=False)
+            return False
+
+        if self.last_cnt0 is not None and cnt0 > self.last_cnt0 + 1:
+            self.n_frames_missed += cnt0 - self.last_cnt0 - 1
+        self.last_cnt0 = cnt0
+        self._t_last_new_frame = time.time()
+
+        return True
+
     def _data_grab(self) -> None:
         '''
         Data function.
-        SHM -> self.data_raw_uncrop
+        SHM -> self.data_raw_frame -> (averaging) -> self.data_raw_uncrop
 
         Can raise AutoRelinkErrors from pyMilk
         These are grabber in data_iter
         '''
-        if self.flag_averaging and self.flag_data_init:
-            assert self.data_raw_uncrop is not None  # from self.flag_data_init
+        if self.PIPELINE_PREALLOC:
+            self._data_grab_prealloc()
+            return
+
+        self.data_raw_frame = self.input_shm.get_data().astype(np.float32)
+
+        if self.flag_averaging and self.stacker is not None:
+            self.stacker.push(self.data_raw_frame)
+            self.data_raw_uncrop = self.stacker.combine(self.averaging_mode)
+        else:
+            self.data_raw_uncrop = self.data_raw_frame
 
-            nn = self.count_averaging
-            self.data_raw_uncrop = self.data_raw_uncrop * (
-                    nn / (nn + 1)) + self.input_shm.get_data() / (nn + 1)
-            self.count_averaging += 1
+    def _data_grab_prealloc(self) -> None:
+        '''
+        Data function - preallocated version of _data_grab.
+        SHM -> self.data_raw_uncrop, without allocating.
+        '''
+        raw = self._get_buffer('raw', self.shm_shape)
+        # No copy: this is a view of the SHM memory, we cast it into raw right away.
+        # The semaphore was taken care of by _poll_new_frame
+        shm_data = self.input_shm.get_data(copy=False)
+        np.copyto(raw, shm_data, casting='unsafe')
+        self.data_raw_frame = raw
+
+        if self.flag_averaging and self.stacker is not None:
+            # Push the native dtype SHM data, not the float copy
+            self.stacker.push(shm_data)
+            self.data_raw_uncrop = self.stacker.combine(
+                    self.averaging_mode,
+                    out=self._get_buffer('averaged', self.shm_shape))
         else:
-            self.data_raw_uncrop = self.input_shm.get_data().astype(np.float32)
+            self.data_raw_uncrop = raw
 
     def _data_referencing(self) -> None:
         '''
@@ -435,7 +719,14 @@ ARROWS    : steer crop
         '''
         assert self.data_raw_uncrop is not None
 
-        if self.flag_subref_on:
+        if self.PIPELINE_PREALLOC and (self.flag_subref_on or
+                                       self.flag_subdark_on):
+            sub = (self.data_for_sub_ref
+                   if self.flag_subref_on else self.data_for_sub_dark)
+            debias = self._get_buffer('debias', self.data_raw_uncrop.shape)
+            np.subtract(self.data_raw_uncrop, sub, out=debias)
+            self.data_debias_uncrop = debias
+        elif self.flag_subref_on:
             self.data_debias_uncrop = self.data_raw_uncrop - self.data_for_sub_ref
         elif self.flag_subdark_on:
             self.data_debias_uncrop = self.data_raw_uncrop - self.data_for_sub_dark
@@ -452,9 +743,7 @@ ARROWS    : steer crop
         assert self.data_raw_uncrop is not None
         assert self.data_debias_uncrop is not None
 
-        self.data_min = self.data_debias_uncrop[1:, 1:].min()
-        self.data_max = self.data_debias_uncrop[1:, 1:].max()
-        self.data_mean = np.mean(self.data_debias_uncrop[1:])
+        self.stats.update_uncropped(self.data_debias_uncrop[1:, 1:])
 
         self.data_debias = self.data_debias_uncrop[self.crop_slice]
 
@@ -466,8 +755,9 @@ ARROWS    : steer crop
         '''
         assert self.data_debias is not None
 
-        self.data_plot_min = np.nanmin(self.data_debias[1:, 1:])
-        self.data_plot_max = np.nanmax(self.data_debias[1:, 1:])
+        self.stats.update_cropped(self.data_debias[1:, 1:])
+        self.data_plot_min = self.stats.plot_min
+        self.data_plot_max = self.stats.plot_max
 
         # Temp variables to distinguish per-frame autoclip (nonlinear modes)
         # Against persistent, user-set clipping
@@ -475,7 +765,7 @@ ARROWS    : steer crop
 
         if low_clip is None and self.idx_zscaling != buts.ZScaleEnum.LIN:
             # Clip to the 80-th percentile (for log modes by default
-            low_clip = np.nanpercentile(self.data_debias[1:, 1:], 0.8)
+            low_clip = self.stats.percentile(self.data_debias[1:, 1:], 0.8)
 
         if low_clip:
             low = low_clip
@@ -487,6 +777,14 @@ ARROWS    : steer crop
         else:
             high = self.data_plot_max
 
+        if self.COLORING_LUT:
+            self._data_zscaling_lut(low, high)
+            return
+
+        if self.PIPELINE_PREALLOC:
+            self._data_zscaling_prealloc(low, high, bool(low_clip or high_clip))
+            return
+
         if low_clip or high_clip:
             data = np.clip(self.data_debias, low, high)
         else:
@@ -507,15 +805,103 @@ ARROWS    : steer crop
 
         self.data_zmapped = (data - low) / (high - low)
 
+    def _data_zscaling_lut(self, low: float, high: float) -> None:
+        '''
+        Data function - lookup table version of the end of _data_zscaling.
+
+        self.data_debias -> self.data_zmapped (ColorLUT table indices)
+        Z-scaled in place in the 'zmapped' buffer, then quantized: the table only holds the colormap.
+        '''
+        assert self.data_debias is not None
+        assert self.color_lut is not None
+
+        shape = self.data_debias.shape
+        self.data_zmapped = self.color_lut.quantize(
+                self.data_debias, low, high,
+                out=self._get_buffer('lut_idx', shape, np.intp),
+                scratch=self._get_buffer('zmapped', shape))
+
+    def _data_zscaling_prealloc(self, low: float, high: float,
+                                do_clip: bool) -> None:
+        '''
+        Data function - preallocated version of the end of _data_zscaling.
+
+        self.data_debias -> self.data_zmapped, in place in a single buffer.
+        '''
+        assert self.data_debias is not None
+
+        data = self._get_buffer('zmapped', self.data_debias.shape)
+        if do_clip:
+            np.clip(self.data_debias, low, high, out=data)
+        else:
+            np.copyto(data, self.data_debias, casting='same_kind')
+
+        if self.idx_zscaling == buts.ZScaleEnum.LIN:  # linear
+            op = lambda x: x
+        elif self.idx_zscaling == buts.ZScaleEnum.ROOT3:  # pow .33
+            np.subtract(data, low, out=data)
+            np.power(data, 0.3, out=data)
+            op = lambda x: (x - low)**0.3
+        elif self.idx_zscaling == buts.ZScaleEnum.LOG:  # log
+            np.subtract(data, low - 1, out=data)
+            np.log10(data, out=data)
+            op = lambda x: np.log10(x - low + 1)
+        else:
+            raise AssertionError(
+                    f"self.flag_non_linear {self.idx_zscaling} is invalid")
+
+        low, high = op(low), op(high)
+
+        np.subtract(data, low, out=data)
+        np.divide(data, high - low, out=data)
+
+        self.data_zmapped = data
+
     def _data_coloring(self) -> None:
         '''
         Data function.
 
         self.data_zmapped -> self.data_rgbimg
         '''
+        if self.COLORING_LUT:
+            assert self.data_zmapped is not None
+            assert self.color_lut is not None
+            self.data_rgbimg = self.color_lut.colorize(
+                    self.data_zmapped,
+                    out=self._get_buffer('rgb', (*self.data_zmapped.shape, 3),
+                                         np.uint8))
+            return
+
+        if self.PIPELINE_PREALLOC:
+            self._data_coloring_prealloc()
+            return
+
         # Coloring with cmap, 0-255 uint8, discard alpha channel
         self.data_rgbimg = self.cmap(self.data_zmapped, bytes=True)[:, :, :-1]
 
+    def _data_coloring_prealloc(self) -> None:
+        '''
+        Data function - preallocated version of _data_coloring.
+
+        self.data_zmapped -> self.data_rgbimg
+        Quantize to the colormap index and take from the RGB table, writing
+        directly into the RGB buffer: no RGBA intermediate.
+        '''
+        assert self.data_zmapped is not None
+        assert self._cmap_lut is not None
+
+        shape = self.data_zmapped.shape
+        n_colors = self._cmap_lut.shape[0]
+
+        idx = self._get_buffer('cmap_idx', shape, np.intp)
+        # Truncating cast, like matplotlib. Out-of-range indices are taken care of by mode='clip'
+        np.multiply(self.data_zmapped, n_colors, out=idx, casting='unsafe')
+
+        rgb = self._get_buffer('rgb', (*shape, 3), np.uint8)
+        np.take(self._cmap_lut, idx, axis=0, out=rgb, mode='clip')
+
+        self.data_rgbimg = rgb
+
     def process_shortcut(self, mods: int, key: int) -> None:
         '''
         Main callback dispatch function.
@@ -531,8 +917,105 @@ ARROWS    : steer crop
 
         this_shortcut = buts.Shortcut(key=key, modifier_mask=mods)
         if this_shortcut in self.SHORTCUTS:
-            # Call the mapped callable
-            self.SHORTCUTS[this_shortcut]()
+            if self.is_worker_running():
+                # The worker owns the backend state, it'll call it between 2 frames.
+                self._shortcut_queue.put(this_shortcut)
+            else:
+                # Call the mapped callable
+                self.SHORTCUTS[this_shortcut]()
+                self.flag_reprocess = True
+
+    def is_worker_running(self) -> bool:
+        return self._worker is not None and self._worker.is_alive()
+
+    def start_worker(self) -> None:
+        '''
+        Threaded mode entry point.
+
+        Run data_iter continuously in a worker thread, blocking on the SHM semaphore
+        (so every frame gets processed, as far as the pipeline keeps up),
+        and publish the RGB frames to self.frame_publisher.
+        The frontend picks them up with get_published_frame, without blocking.
+        Shortcuts are queued by process_shortcut, and dispatched by the worker between frames.
+        '''
+        if self.is_worker_running():
+            return
+
+        self.flag_grab_wait = True
+        self._worker_exception = None
+        self._worker_event = threading.Event()
+        self._worker = HackedExitJoinThread(event=self._worker_event,
+                                            daemon=True,
+                                            target=self._worker_run_function)
+        self._worker.start()
+
+    def stop_worker(self) -> None:
+        if self._worker is None:
+            return
+
+        self._worker.join()  # Sets the event
+        self._worker = None
+        self._worker_event = None
+        self.flag_grab_wait = False
+
+        self._dispatch_queued_shortcuts()
+
+    def _dispatch_queued_shortcuts(self) -> None:
+        while True:
+            try:
+                shortcut = self._shortcut_queue.get_nowait()
+            except queue.Empty:
+                return
+            self.SHORTCUTS[shortcut]()
+            self.flag_reprocess = True
+
+    def run_plugin_actions(self) -> None:
+        '''
+        Threaded mode - frontend side.
+
+        The plugins' backend actions render labels and may touch pygame, so they
+        don't run in the worker: the frontend calls this once per loop, holding the state
+        lock, so the worker can't change the data under them.
+        They run if the worker processed anything since the last call - flag_new_frame
+        then tells whether that includes any new frame.
+        '''
+        with self.state_lock:
+            if not self._plugins_pending:
+                return
+            self.flag_new_frame = self._plugins_new_frame
+            self._plugins_pending = self._plugins_new_frame = False
+            self._inloop_plugin_action()
+
+    def _worker_run_function(self) -> None:
+        assert self._worker_event is not None
+
+        try:
+            while not self._worker_event.is_set():
+                with self.state_lock:
+                    self._dispatch_queued_shortcuts()
+
+                if self.flag_frozenframe:
+                    # No SHM semaphore to pace us.
+                    self._worker_event.wait(self.WORKER_IDLE_PERIOD)
+
+                if self.data_iter():
+                    assert self.data_rgbimg is not None
+                    self.frame_publisher.publish(self.data_rgbimg)
+        except BaseException as exc:
+            # Hand it over to the frontend thread, see get_published_frame
+            self._worker_exception = exc
+
+    def get_published_frame(self) -> tuple[np.ndarray | None, bool]:
+        '''
+        Threaded mode - frontend side.
+        Latest published RGB frame, and whether it is new since the last call.
+        Re-raises in the caller's thread if the worker died.
+        '''
+        if self._worker_exception is not None:
+            exc, self._worker_exception = self._worker_exception, None
+            raise exc
+
+        return self.frame_publisher.acquire()
 
     def _uncrop_coordinates_anyslice(self, coord: float, slice: slice) -> float:
         assert slice.step is None
@@ -3,10 +3,9 @@ from __future__ import annotations
 from typing import Dict, Callable, Optional as Op, TYPE_CHECKING
 if TYPE_CHECKING:
     from .pygame_viewer_frontend import PygameViewerFrontend
-    from .generic_viewer_backend import GenericViewerBackend
 
 from abc import abstractmethod
-import os, time
+import os
 import re
 
 _CORES = os.sched_getaffinity(0)  # AMD fix
@@ -18,6 +17,7 @@ from . import utils_backend as buts
 from . import utils_frontend as futs
 
 from .plugin_arch import OneShotActionPlugin
+from .frame_stack import FrameStack
 
 import numpy as np
 
@@ -26,9 +26,16 @@ class RefImageAcquirePlugin(OneShotActionPlugin):
     HELP_MSG = """:
 """
 
+    # Number of frames to stack, and how to combine them.
+    # MEAN only keeps a running sum; MEDIAN and CLIPPED_MEAN keep all n_frames frames in memory.
+    N_FRAMES: int = 100
+    STACK_MODE: buts.StackModeEnum = buts.StackModeEnum.MEAN
+
     def __init__(self, frontend_obj: PygameViewerFrontend,
                  key_onoff: int = pgmc.K_r, modifier_and: int = pgmc.KMOD_LCTRL,
-                 textbox: Op[futs.LabelMessage] = None):
+                 textbox: Op[futs.LabelMessage] = None,
+                 n_frames: Op[int] = None,
+                 stack_mode: Op[buts.StackModeEnum] = None):
 
         super().__init__(frontend_obj, key_onoff, modifier_and)
 
@@ -36,67 +43,78 @@ class RefImageAcquirePlugin(OneShotActionPlugin):
             assert re.match('%.*s', textbox.template_str)
         self.textbox = textbox
 
-        self.start_time = 0.0
-        self.averaging_counter = 0
-
-        self.averaged_data: Op[np.ndarray] = None
-
-    def register_backend(self,
-                         backend_obj: GenericViewerBackend) -> None:  # Override
-        super().register_backend(backend_obj)
+        self.n_frames = self.N_FRAMES if n_frames is None else n_frames
+        self.stack_mode = self.STACK_MODE if stack_mode is None else stack_mode
 
-        assert self.backend_obj is not None  # assigned in supercall
+        self.acquiring = False
+        self.stack: Op[FrameStack] = None  # Allocated on the first frame
 
-        self.averaged_data = np.zeros(self.backend_obj.shm_shape, np.float32)
+        self.averaged_data: Op[np.ndarray] = None  # Result of the last acquisition
 
     def do_action(self) -> None:  # abstract impl
-        assert self.averaged_data is not None
-
         if self.textbox:
             self.textbox.render(f"{'ACQUIRING REF IMG':^28s}",
                                 bg_col=futs.Colors.BLUE,
                                 fg_col=futs.Colors.WHITE)
 
-        self.averaged_data *= 0
-        self.averaging_counter = 0
-        self.start_time = time.time()
+        self.stack = None
+        self.acquiring = True
 
     def is_running(self) -> bool:  # abstract impl
-        # Run for 10 seconds from the starting point.
-        return time.time() - self.start_time <= 10.0
+        return self.acquiring
+
+    def _combine_stack(self) -> np.ndarray:
+        '''
+        End the acquisition, release the stack and return the combined frame.
+        '''
+        assert self.stack is not None
+
+        self.averaged_data = self.stack.combine(self.stack_mode)
+        self.stack = None
+        self.acquiring = False
+
+        return self.averaged_data
 
     def _complete_action(self) -> None:
         assert self.backend_obj is not None
-        assert self.averaged_data is not None
-        self.averaged_data /= self.averaging_counter
 
-        self.backend_obj.data_for_sub_ref = self.averaged_data
-        self.averaging_counter = 0  # Mark for reset.
+        self.backend_obj.data_for_sub_ref = self._combine_stack()
+        self.backend_obj.stats.invalidate()
 
         if self.textbox:
             self.textbox.render_whitespace()
             self.textbox.blit(self.frontend_obj.pg_screen)
-            self.frontend_obj.pg_updated_rects.append(self.textbox.rectangle)
+            self.frontend_obj.pg_updated_rects += \
+                self.textbox.take_update_rects()
 
     def frontend_action(self) -> None:  # abstract impl
         if self.is_running() and self.textbox:
             self.textbox.blit(self.frontend_obj.pg_screen)
-            self.frontend_obj.pg_updated_rects.append(self.textbox.rectangle)
+            self.frontend_obj.pg_updated_rects += \
+                self.textbox.take_update_rects()
 
     def backend_action(self) -> None:  # abstract impl
         assert self.backend_obj  # ...
 
-        # Trigger the finalization
-        if not self.is_running():
-            if self.averaging_counter > 0:
-                self._complete_action()
+        # Only stack fresh frames - the backend also reruns the pipeline on shortcuts.
+        if not (self.acquiring and self.backend_obj.flag_new_frame):
             return
 
-        # Don't use backend_obj.data_raw_uncrop cause it is subject to averaging/freezing.
-        # But we kinda want the ref to be what we're seeing??
-        self.averaged_data += self.backend_obj.data_raw_uncrop
-        #self.averaged_data += self.backend_obj.input_shm.get_data(False)
-        self.averaging_counter += 1
+        # Don't use backend_obj.data_raw_uncrop cause it is subject to averaging.
+        frame = self.backend_obj.data_raw_frame
+        assert frame is not None
+
+        if self.stack is None:
+            # Store frames in the SHM dtype, not the float32 of the pipeline.
+            shm_dtype = self.backend_obj.input_shm.get_data(copy=False).dtype
+            self.stack = FrameStack(
+                    frame.shape, self.n_frames, shm_dtype,
+                    keep_frames=self.stack_mode != buts.StackModeEnum.MEAN)
+
+        self.stack.push(frame)
+
+        if self.stack.n_filled >= self.n_frames:
+            self._complete_action()
 
 
 # Warning - abstract
@@ -138,20 +156,18 @@ class DarkAcquirePlugin(RefImageAcquirePlugin):
     def _complete_action(
             self) -> None:  # Override because we want to write in bias_image
         assert self.backend_obj
-        assert self.averaged_data is not None
 
         if self.block_was_moved_for_action:
             self.move_appropriate_block(False)
 
-        self.averaged_data /= self.averaging_counter
-
-        self.backend_obj.data_for_sub_dark = self.averaged_data  # FIXME reference_image exists?
-        self.averaging_counter = 0  # Mark for reset.
+        self.backend_obj.data_for_sub_dark = self._combine_stack()  # FIXME reference_image exists?
+        self.backend_obj.stats.invalidate()
 
         if self.textbox:
             self.textbox.render_whitespace()
             self.textbox.blit(self.frontend_obj.pg_screen)
-            self.frontend_obj.pg_updated_rects.append(self.textbox.rectangle)
+            self.frontend_obj.pg_updated_rects += \
+                self.textbox.take_update_rects()
 
     @abstractmethod
     def move_appropriate_block(self, in_true: bool) -> None:
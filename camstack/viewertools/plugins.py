@@ -87,7 +87,8 @@ Saturation: %.1f
     def backend_action(self) -> None:
         if not self.enabled or self.textbox is None:
             return
-        self.max = self.backend_obj.data_max
+        # Shared stats cache, computed once per frame by the backend.
+        self.max = self.backend_obj.stats.data_max
         if self.max >= self.sat_value:
             self.textbox.render(f"{'!!! SATURATING !!!':^28s}",
                                 bg_col=futs.COLOR_SATURATION,
@@ -105,7 +106,7 @@ Saturation: %.1f
             return
 
         self.textbox.blit(self.frontend_obj.pg_screen)
-        self.frontend_obj.pg_updated_rects.append(self.textbox.rectangle)
+        self.frontend_obj.pg_updated_rects += self.textbox.take_update_rects()
 
 
 class CrossHairPlugin(OnOffPlugin):
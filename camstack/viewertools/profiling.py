@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import typing as typ
+
+import time
+import math
+import json
+
+import numpy as np
+
+# Log-spaced duration bins: bin 0 is < HIST_MIN_NS, then HIST_BINS_PER_DECADE bins per decade
+# (12% wide) up to HIST_MIN_NS * 10**HIST_N_DECADES. The last bin catches anything longer.
+HIST_MIN_NS = 1_000  # 1 us
+HIST_N_DECADES = 7  # to 10 s
+HIST_BINS_PER_DECADE = 20
+HIST_N_BINS = HIST_N_DECADES * HIST_BINS_PER_DECADE + 2
+
+
+def _bin_index(dt_ns: int) -> int:
+    if dt_ns < HIST_MIN_NS:
+        return 0
+    return min(HIST_N_BINS - 1,
+               1 + int(math.log10(dt_ns / HIST_MIN_NS) * HIST_BINS_PER_DECADE))
+
+
+def _bin_value_ns(idx: int) -> float:
+    # Geometric center of the bin
+    if idx == 0:
+        return HIST_MIN_NS / 2
+    return HIST_MIN_NS * 10**((idx - 0.5) / HIST_BINS_PER_DECADE)
+
+
+def hist_percentile_ns(hist: np.ndarray, q: float) -> float:
+    '''
+    q-th percentile of a duration histogram, in ns. NaN if the histogram is empty.
+    '''
+    cdf = np.cumsum(hist)
+    if cdf[-1] == 0:
+        return math.nan
+    return _bin_value_ns(int(np.searchsorted(cdf, q / 100. * cdf[-1])))
+
+
+class StageHistogram:
+    '''
+    Durations of one stage: a ring of n_slots histograms, each covering slot_period_ns,
+    so that percentiles reflect the last n_slots * slot_period_ns only,
+    plus the session-wide histogram.
+    Fixed size, whatever the number of samples.
+    '''
+
+    def __init__(self, n_slots: int, slot_period_ns: int) -> None:
+        self.n_slots = n_slots
+        self.slot_period_ns = slot_period_ns
+
+        self.slots = np.zeros((n_slots, HIST_N_BINS), np.int64)
+        self.slot_start_ns = [0] * n_slots
+        self.idx_slot = 0
+
+        self.session = np.zeros(HIST_N_BINS, np.int64)
+        self.n_samples = 0
+        self.sum_ns = 0
+        self.max_ns = 0
+        self.last_ns = 0
+
+    def record(self, dt_ns: int, now_ns: int) -> None:
+        if now_ns - self.slot_start_ns[self.idx_slot] >= self.slot_period_ns:
+            self.idx_slot = (self.idx_slot + 1) % self.n_slots
+            self.slots[self.idx_slot] = 0
+            self.slot_start_ns[self.idx_slot] = now_ns
+
+        idx = _bin_index(dt_ns)
+        self.slots[self.idx_slot, idx] += 1
+        self.session[idx] += 1
+
+        self.n_samples += 1
+        self.sum_ns += dt_ns
+        self.max_ns = max(self.max_ns, dt_ns)
+        self.last_ns = dt_ns
+
+    def window(self) -> np.ndarray:
+        return self.slots.sum(axis=0)
+
+    def percentile_ms(self, q: float, session: bool = False) -> float:
+        hist = self.session if session else self.window()
+        # Bin centers can overshoot the longest sample
+        return min(hist_percentile_ns(hist, q), self.max_ns) * 1e-6
+
+    def rate_hz(self, now_ns: int | None = None) -> float:
+        '''
+        Samples per second over the ring window.
+        '''
+        now_ns = time.perf_counter_ns() if now_ns is None else now_ns
+        t_oldest = min((t for t in self.slot_start_ns if t > 0), default=0)
+        if t_oldest == 0 or now_ns <= t_oldest:
+            return 0.
+        return float(self.slots.sum()) / (now_ns - t_oldest) * 1e9
+
+
+class PipelineProfiler:
+    '''
+    Per-stage wall time recorder of the viewer (backend pipeline, plugins, frontend).
+
+    Stages are timed as laps of perf_counter_ns:
+        t = time.perf_counter_ns()
+        do_stuff()
+        t = profiler.lap('stuff', t)
+        do_more()
+        t = profiler.lap('more', t)
+    and tick() records the period between its calls, e.g. the display loop rate.
+
+    Stages are created on first use. Cheap enough (~1 us per lap) to stay always on.
+    show_overlay is for the frontend to read (see GenericViewerBackend.toggle_profiling_overlay).
+    '''
+
+    N_SLOTS = 10
+    SLOT_PERIOD = 1.0  # sec.
+
+    def __init__(self) -> None:
+        self.enabled = True
+        self.show_overlay = False
+
+        self.stages: dict[str, StageHistogram] = {}
+        self._last_tick_ns: dict[str, int] = {}
+
+        self.t_start = time.time()
+
+    def _get_stage(self, stage: str) -> StageHistogram:
+        hist = self.stages.get(stage)
+        if hist is None:
+            hist = self.stages.setdefault(
+                    stage,
+                    StageHistogram(self.N_SLOTS, int(self.SLOT_PERIOD * 1e9)))
+        return hist
+
+    def lap(self, stage: str, t_start_ns: int) -> int:
+        '''
+        Record now - t_start_ns for stage. Returns now, for chaining.
+        '''
+        now_ns = time.perf_counter_ns()
+        if self.enabled:
+            self._get_stage(stage).record(now_ns - t_start_ns, now_ns)
+        return now_ns
+
+    def tick(self, stage: str) -> None:
+        '''
+        Record the time since the last tick of stage.
+        '''
+        now_ns = time.perf_counter_ns()
+        last_ns = self._last_tick_ns.get(stage)
+        self._last_tick_ns[stage] = now_ns
+        if self.enabled and last_ns is not None:
+            self._get_stage(stage).record(now_ns - last_ns, now_ns)
+
+    def rate_hz(self, stage: str) -> float:
+        if stage not in self.stages:
+            return 0.
+        return self.stages[stage].rate_hz()
+
+    def summary(self, session: bool = False) -> list[tuple[str, float, float]]:
+        '''
+        [(stage, p50 ms, p99 ms)], over the ring window or the whole session.
+        '''
+        return [(name, hist.percentile_ms(50, session),
+                 hist.percentile_ms(99, session))
+                for name, hist in list(self.stages.items())]
+
+    def session_stats(self) -> dict[str, dict[str, float]]:
+        '''
+        {stage: {n, mean_ms, p50_ms, p90_ms, p99_ms, max_ms}}, over the whole session.
+        '''
+        stages = {}
+        for name, hist in list(self.stages.items()):
+            stages[name] = {
+                    'n': hist.n_samples,
+                    'mean_ms': hist.sum_ns / max(1, hist.n_samples) * 1e-6,
+                    'p50_ms': hist.percentile_ms(50, session=True),
+                    'p90_ms': hist.percentile_ms(90, session=True),
+                    'p99_ms': hist.percentile_ms(99, session=True),
+                    'max_ms': hist.max_ns * 1e-6,
+            }
+        return stages
+
+    def dump(self, filename: str, **metadata: typ.Any) -> None:
+        '''
+        Write the session statistics of all stages to filename, as JSON.
+        metadata: anything else worth saving (e.g. the requested fps).
+        '''
+        report = {
+                'start': self.t_start,
+                'duration_s': time.time() - self.t_start,
+                **metadata,
+                'stages': self.session_stats(),
+        }
+
+        with open(filename, 'w') as fp:
+            json.dump(report, fp, indent=2)
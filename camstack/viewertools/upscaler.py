@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import numpy as np
+
+
+def _nearest_index(n_in: int, n_out: int) -> np.ndarray:
+    # Sample at the output pixel centers - same as PIL's NEAREST.
+    return ((np.arange(n_out) + 0.5) * (n_in / n_out)).astype(np.intp)
+
+
+def integer_decimation(in_shape: tuple[int, int],
+                       out_shape: tuple[int, int]) -> tuple[slice, slice] | None:
+    '''
+    The slices that nearest-downscale in_shape to out_shape, if the ratios are integers.
+    Lets the caller decimate first, and work on fewer pixels.
+    '''
+    (r_in, c_in), (r_out, c_out) = in_shape[:2], out_shape[:2]
+    if r_in % r_out != 0 or c_in % c_out != 0:
+        return None
+    fr, fc = r_in // r_out, c_in // c_out
+    return (slice(fr // 2, None, fr), slice(fc // 2, None, fc))
+
+
+class NearestScaler:
+    '''
+    Nearest neighbour resampling of a (rows, cols, ...) array into a preallocated output,
+    e.g. a view of a pygame surface's pixels (pygame.surfarray.pixels2d) - no intermediate frame.
+
+    - Integer upscaling on both axes: a single broadcast write, through a
+      (rows, fr, cols, fc, ...) strided view of the output (what np.repeat does, without the copy).
+    - Integer downscaling on both axes: a strided slice of the input.
+    - Anything else: fancy indexing on precomputed index arrays (allocates one frame).
+
+    The plan only depends on the in and out shapes, and is made once.
+    '''
+
+    def __init__(self, in_shape: tuple[int, int],
+                 out_shape: tuple[int, int]) -> None:
+
+        self.in_shape = tuple(in_shape[:2])
+        self.out_shape = tuple(out_shape[:2])
+
+        (r_in, c_in), (r_out, c_out) = self.in_shape, self.out_shape
+
+        self.fac_up: tuple[int, int] | None = None
+        self.decimation = integer_decimation(self.in_shape, self.out_shape)
+        self.idx_rows: np.ndarray | None = None
+        self.idx_cols: np.ndarray | None = None
+
+        if r_out % r_in == 0 and c_out % c_in == 0:
+            self.fac_up = (r_out // r_in, c_out // c_in)
+            self.decimation = None  # Identity - both apply.
+        elif self.decimation is None:
+            self.idx_rows = _nearest_index(r_in, r_out)[:, None]
+            self.idx_cols = _nearest_index(c_in, c_out)[None, :]
+
+    def resample(self, data: np.ndarray, out: np.ndarray) -> None:
+        assert data.shape[:2] == self.in_shape
+        assert out.shape[:2] == self.out_shape
+
+        if self.fac_up is not None:
+            fr, fc = self.fac_up
+            r_in, c_in = self.in_shape
+            out_split = out.view()
+            # Splitting axes never requires a copy, so this works on any strided out.
+            # Setting .shape raises rather than silently copying, should that ever be false.
+            out_split.shape = (r_in, fr, c_in, fc) + out.shape[2:]
+            out_split[...] = data[:, None, :, None]
+        elif self.decimation is not None:
+            out[...] = data[self.decimation]
+        else:
+            out[...] = data[self.idx_rows, self.idx_cols]
@@ -3,10 +3,13 @@ from __future__ import annotations
 import typing as typ
 
 import os
+import threading
 
 import enum
 from dataclasses import dataclass
 
+import numpy as np
+
 _CORES = os.sched_getaffinity(0)  # AMD fix
 import pygame.constants as pgmc
 
@@ -19,6 +22,13 @@ class ZScaleEnum(enum.IntEnum):
     LOG = 2
 
 
+class StackModeEnum(enum.IntEnum):
+    MEAN = 0  # Windowed mean
+    EMA = 1  # Exponential moving average
+    MEDIAN = 2
+    CLIPPED_MEAN = 3  # Sigma-clipped mean
+
+
 NUMKEYS_0_9 = [
         pgmc.K_0, pgmc.K_1, pgmc.K_2, pgmc.K_3, pgmc.K_4, pgmc.K_5, pgmc.K_6,
         pgmc.K_7, pgmc.K_8, pgmc.K_9
@@ -59,3 +69,56 @@ class JoyKeyDirEnum(enum.Enum):
 class BackForthDirEnum(enum.Enum):
     LEFT = 0
     RIGHT = 0
+
+
+class FramePublisher:
+    '''
+    Lock-light hand-over of frames from a producer thread to a consumer thread.
+
+    Three slots, so that neither side ever waits on the other for more than a swap:
+        - back: being written by the producer
+        - ready: latest complete frame
+        - front: being read by the consumer
+    The producer overwrites ready if the consumer is lagging (frames are dropped, never queued).
+    '''
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._back: np.ndarray | None = None
+        self._ready: np.ndarray | None = None
+        self._front: np.ndarray | None = None
+        self._fresh = False
+
+        self.n_published = 0
+        self.n_acquired = 0
+
+    def publish(self, frame: np.ndarray) -> None:
+        '''
+        Producer side - copy frame into the back slot, then make it the ready one.
+        '''
+        if (self._back is None or self._back.shape != frame.shape or
+                    self._back.dtype != frame.dtype):
+            self._back = np.empty_like(frame)
+        np.copyto(self._back, frame)
+
+        with self._lock:
+            self._back, self._ready = self._ready, self._back
+            self._fresh = True
+            self.n_published += 1
+
+    def acquire(self) -> tuple[np.ndarray | None, bool]:
+        '''
+        Consumer side - never blocks on the producer.
+
+        Returns the latest frame (or None if nothing was ever published),
+        and whether it is new since the last call.
+        The returned array is owned by the consumer until the next call.
+        '''
+        with self._lock:
+            fresh = self._fresh
+            if fresh:
+                self._front, self._ready = self._ready, self._front
+                self._fresh = False
+                self.n_acquired += 1
+
+        return self._front, fresh
@@ -57,6 +57,13 @@ class FontBook:
 
 
 class LabelMessage:
+    '''
+    A one-line text label, retained mode:
+    the font only renders when the text or colors change - see render().
+
+    `changed` is set by every actual re-render, and consumed by take_update_rects(),
+    so that the display update can be limited to labels that did change.
+    '''
 
     def __init__(self, template_str: str, font: pygame.font.Font,
                  topleft: tuple[int, int] | None = None,
@@ -69,6 +76,11 @@ class LabelMessage:
         self.n_args = self.template_str.count('%')
 
         self.last_rendered = ''
+        self._last_colors: tuple[RGBType, RGBType] | None = None
+
+        self.changed = True  # Since the last take_update_rects
+        self._update_rect: pygame.Rect | None = None  # Old + new area, since the last take_update_rects
+        self._stale_rect: pygame.Rect | None = None  # Old area, to clear at the next blit
 
         self.font = font
         self.em_size = font.size('0')[1]
@@ -96,12 +108,36 @@ class LabelMessage:
 
     def render(self, format_args: tuple[typ.Any, ...],
                fg_col: RGBType | None = None, bg_col: RGBType | None = None,
-               blit_onto: pygame.surface.Surface | None = None) -> None:
+               blit_onto: pygame.surface.Surface | None = None) -> bool:
+        '''
+        Render the label, if the text or the colors changed.
+        blit_onto: blit anyway, changed or not.
+
+        Returns True iff the label was re-rendered.
+        '''
 
         fg_col = self.fg_col if fg_col is None else fg_col
         bg_col = self.bg_col if bg_col is None else bg_col
 
-        self.last_rendered = self.template_str % format_args
+        text = self.template_str % format_args
+        if (self.label is not None and text == self.last_rendered and
+                    (fg_col, bg_col) == self._last_colors):
+            if blit_onto is not None:
+                self.blit(blit_onto)
+            return False
+
+        self._rerender(text, fg_col, bg_col)
+
+        if blit_onto is not None:
+            self.blit(blit_onto)
+
+        return True
+
+    def _rerender(self, text: str, fg_col: RGBType, bg_col: RGBType) -> None:
+        old_rect = None if self.rectangle is None else self.rectangle.copy()
+
+        self.last_rendered = text
+        self._last_colors = (fg_col, bg_col)
         self.label = self.font.render(self.last_rendered, True, fg_col, bg_col)
 
         # Good time to check if the new rectangle is smaller than the old one.
@@ -117,29 +153,69 @@ class LabelMessage:
 
         setattr(self.rectangle, self.rect_alignment, self.rect_align_point)
 
-        if blit_onto is not None:
-            self.blit(blit_onto)
+        self.changed = True
+        if old_rect is not None:
+            self._stale_rect = old_rect if self._stale_rect is None else\
+                self._stale_rect.union(old_rect)
+        self._update_rect = self.rectangle.copy() if self._update_rect is None\
+            else self._update_rect.union(self.rectangle)
+        if old_rect is not None:
+            self._update_rect.union_ip(old_rect)
 
     def render_whitespace(self, blit_onto: pygame.surface.Surface | None = None
                           ) -> None:
+        if (self.label is not None and self.last_rendered == '' and
+                    self._last_colors == (self.fg_col, self.bg_col)):
+            # Blank already
+            if blit_onto is not None:
+                self.blit(blit_onto)
+            return
+
         # Because not all our fonts are monospaced:
         how_big_last_rendered = sum([
                 c[-1] for c in self.font.metrics(self.last_rendered)
         ])
         space_width = self.font.metrics(' ')[0][-1]
         n_char = how_big_last_rendered // space_width + 1
+        self._rerender(' ' * n_char, self.fg_col, self.bg_col)
         self.last_rendered = ''
-        self.label = self.font.render(' ' * n_char, True, self.fg_col,
-                                      self.bg_col)
 
         if blit_onto is not None:
             self.blit(blit_onto)
 
     def blit(self, pg_screen: pygame.surface.Surface) -> None:
         assert self.label  # mypy happy, label initialized.
+        assert self.rectangle is not None
+
+        # The label shrunk since it was last blitted: clear what it leaves behind.
+        if self._stale_rect is not None:
+            if not self.rectangle.contains(self._stale_rect):
+                pg_screen.fill(self.bg_col, self._stale_rect)
+            self._stale_rect = None
 
         pg_screen.blit(self.label, self.rectangle)
 
+    def take_update_rects(self) -> list[pygame.Rect]:
+        '''
+        The area to update on display, if the label changed since the last call, else nothing.
+        '''
+        if not self.changed:
+            return []
+        self.changed = False
+
+        assert self.rectangle is not None
+        rect = self.rectangle if self._update_rect is None else self._update_rect
+        self._update_rect = None
+
+        return [rect]
+
+
+def changed_label_rects(*labels: LabelMessage) -> list[pygame.Rect]:
+    '''
+    Display update rectangles for those of labels that changed (see LabelMessage.take_update_rects)
+    '''
+    return [rect for label in labels for rect in label.take_update_rects()]
+
 
 @dataclass
 class DrawingTransform:
@@ -0,0 +1,100 @@
+'''
+    Params SHM protocols of ParamsSHMCamera, against the Python stand-in taker.
+'''
+import typing as typ
+
+import pytest
+
+from camstack.cams.benchmarks import BenchParamsCamera
+from camstack.cams.params_shm_backend import (PARAMS_FB_REQ_SEQ,
+                                              PARAMS_FB_ACK_SEQ, PARAMS_FB_CAPS,
+                                              PARAMS_FB_CAP_SEQACK)
+from camstack.cams.params_shm_standin import (FakeParamsSHM,
+                                              ParamsSHMStandInTaker)
+
+PROPS = {1: 1.0, 2: 2.0, 3: 3.0}
+EXPTIME = 0.01  # sec.
+
+
+@pytest.fixture
+def storage() -> FakeParamsSHM:
+    return FakeParamsSHM()
+
+
+def make_camera(storage: FakeParamsSHM) -> BenchParamsCamera:
+    cam = BenchParamsCamera(storage.handle(), EXPTIME)
+    cam.PRM_TIMEOUT_BASE = 0.2  # Keep the timeout paths short
+    return cam
+
+
+@pytest.fixture
+def taker_factory(
+        storage: FakeParamsSHM
+) -> typ.Iterator[typ.Callable[..., ParamsSHMStandInTaker]]:
+    takers: typ.List[ParamsSHMStandInTaker] = []
+
+    def factory(**kwargs) -> ParamsSHMStandInTaker:
+        taker = ParamsSHMStandInTaker(storage.handle(), PROPS,
+                                      frame_period=EXPTIME, **kwargs)
+        taker.start()
+        takers.append(taker)
+        return taker
+
+    yield factory
+
+    for taker in takers:
+        taker.stop()
+
+
+def test_seqack_matches_sequence_numbers(storage, taker_factory) -> None:
+    taker = taker_factory(seqack=True)
+    cam = make_camera(storage)
+
+    for n in range(1, 4):
+        assert cam._prm_getmultivalue([None, None], [1, 3]) == [1.0, 3.0]
+        data = storage.data
+        assert data[PARAMS_FB_REQ_SEQ] == data[PARAMS_FB_ACK_SEQ] == n
+
+    assert cam._prm_setvalue(5.0, None, 2) == 5.0
+    assert taker.props[2] == 5.0
+
+    stats = cam.get_params_stats()
+    assert stats['exchanges'] == 4
+    assert stats['retries'] == 0
+    assert stats['legacy_exchanges'] == 0
+
+
+def test_seqack_retries_a_dropped_ack(storage, taker_factory) -> None:
+    taker = taker_factory(seqack=True, drop_acks=1)
+    cam = make_camera(storage)
+
+    assert cam._prm_getvalue(None, 2) == 2.0
+    assert taker.n_dropped_acks == 1
+    assert taker.n_serviced == 2  # Re-posted, serviced again
+    assert cam.get_params_stats()['retries'] == 1
+
+
+def test_seqack_times_out_after_retries(storage, taker_factory) -> None:
+    taker = taker_factory(seqack=True, drop_acks=1000)
+    cam = make_camera(storage)
+
+    with pytest.raises(TimeoutError):
+        cam._prm_getvalue(None, 2)
+    assert cam.get_params_stats()['retries'] == cam.PRM_RETRIES
+    assert taker.n_serviced == cam.PRM_RETRIES + 1
+
+
+def test_legacy_frame_sync_without_seqack_cap(storage, taker_factory) -> None:
+    taker = taker_factory(seqack=False)
+    cam = make_camera(storage)
+
+    assert not storage.data[PARAMS_FB_CAPS] & PARAMS_FB_CAP_SEQACK
+    assert cam._prm_getmultivalue([None, None], [1, 2]) == [1.0, 2.0]
+    assert taker.n_serviced == 1
+
+    stats = cam.get_params_stats()
+    assert stats['legacy_exchanges'] == 1
+    assert stats['retries'] == 0
+    # The handshake fields are left alone
+    assert storage.data[PARAMS_FB_REQ_SEQ] == storage.data[
+            PARAMS_FB_ACK_SEQ] == 0